@@ -1,15 +1,18 @@
 # app.py — betygsbaserad hårdhet (Del 1/4)
 
 import streamlit as st
+import os
 import random
 import json
-import pandas as pd
 from datetime import date, time, datetime, timedelta
 
 # ===== Moduler (måste finnas i samma mapp) =====
 from sheets_utils import (
     list_profiles, read_profile_settings, read_profile_data,
-    save_profile_settings, append_row_to_profile_data
+    save_profile_settings, append_row_to_profile_data,
+    set_offline_mode, is_offline, offline_reason,
+    pending_writes, sync_pending_writes, start_background_sync,
+    failed_writes, retry_failed_writes, discard_failed_writes,
 )
 
 # Beräkningar (din modul)
@@ -19,12 +22,23 @@ except Exception as e:
     st.error(f"Kunde inte importera beräkningar: {e}")
     st.stop()
 
-# Statistik (valfri modul)
-try:
-    from statistik import compute_stats
-    _HAS_STATS = True
-except Exception:
-    _HAS_STATS = False
+# Ekonomimotor (vektoriserad; används för live-raden och omprissättning av historik)
+from ekonomi import economy_for_row
+from scenario_gen import as_inputs, generate, hist_fields
+
+# Minnesmappad radhistorik (delas mellan sessioner för samma profil)
+from row_history import MappedRows
+
+# Typad, oföränderlig ögonblicksbild av CFG för beräkningarna
+from settings import coerce as coerce_settings, defaults as settings_defaults, snapshot
+
+# Live-panelen: vymodell (memoiserad på indata) + renderare
+from live_ui import build_live_view, render_live, tot_men_fallback
+
+# Tunga moduler (pandas, statistik, what-if, simulering, generering) importeras
+# först i sektionen som använder dem, så att inmatningsformuläret ritas direkt
+# vid kallstart. Mät med:  python -X importtime -m streamlit run app.py 2> import.log
+#                          python importprofil.py import.log
 
 # =========================
 # Grundinställningar
@@ -35,6 +49,10 @@ st.title("Malin – produktionsapp (profiler + Google Sheets)")
 # ======== State-nycklar ========
 CFG_KEY        = "CFG"           # alla config + etiketter
 ROWS_KEY       = "ROWS"          # sparade rader lokalt (list[dict])
+ROWS_VER_KEY   = "ROWS_VERSION"  # räknas upp vid varje ändring av ROWS (statistikcache)
+SESSION_ID_KEY = "SESSION_ID"    # slumpat id per session (del av statistikens dataversion)
+ROWS_SYNCED_KEY = "ROWS_SYNCED"  # (profil, lokala kopians data_state) när ROWS = kopian, annars None
+LIVE_HIST_KEY  = "LIVE_HISTORY"  # (radversion, (Nils-summa, senaste vila)) för liven
 HIST_MM_KEY    = "HIST_MINMAX"   # min/max per fält för slump
 SCENEINFO_KEY  = "CURRENT_SCENE" # (scen_nr, rad_datum, veckodag)
 SCENARIO_KEY   = "SCENARIO"      # rullist-valet
@@ -54,6 +72,15 @@ EXTRA_SLEEP_KEY   = "EXTRA_SLEEP_H"   # timmar
 # First-boot flagga (auto-laddning från Sheets)
 FIRST_BOOT_KEY = "FIRST_BOOT_DONE"
 
+# Offline-läge (lokal cache + skrivkö i sheets_utils/local_store)
+OFFLINE_KEY = "OFFLINE_MODE"
+
+# Radhistorik som delade minnesmappade kolumnfiler i stället för list[dict] per session
+ROWS_MMAP_KEY = "ROWS_MMAP"
+
+# Köade skrivningar synkas i bakgrunden när API:t svarar igen (en tråd per process)
+start_background_sync()
+
 # =========================
 # Input-ordning (EXAKT)
 # =========================
@@ -75,56 +102,8 @@ INPUT_ORDER = [
 # Init + Hjälpare
 # =========================
 def _init_cfg_defaults():
-    return {
-        # Basdatum
-        "startdatum":   date(1990,1,1),
-        "starttid":     time(7,0),
-        "fodelsedatum": date(1970,1,1),
-
-        # Ekonomi – styrbart
-        "avgift_usd":   30.0,     # Avgift per prenumerant
-        "ECON_COST_PER_HOUR": 15.0,         # Kostnad män (USD per person-timme)
-        "ECON_REVENUE_PER_KANNER": 30.0,    # Intäkt per "känner"-enhet
-        "ECON_WAGE_SHARE_PCT": 8.0,         # Lön % av Intäkt företag
-        "ECON_WAGE_MIN": 150.0,
-        "ECON_WAGE_MAX": 800.0,
-
-        # Betygssystem-parametrar
-        # Het betyg anges i sidopanelen (1–70). Ålder beräknas från startdatum–födelsedatum i live.
-        "HET_BETYG": 35,
-
-        # Personal-bas
-        "PROD_STAFF":   800,
-
-        # Bonus
-        BONUS_LEFT_KEY: 500,
-        "BONUS_PCT": 1.0,
-        "SUPER_BONUS_PCT": 0.1,
-        SUPER_ACC_KEY: 0,
-
-        # BMI (höjd kvar för UI, ej i beräkning)
-        "BMI_GOAL": 21.7,
-        "HEIGHT_CM": 164,
-
-        # Standard SÖMN efter scen (timmar)
-        EXTRA_SLEEP_KEY: 7,
-
-        # Eskilstuna-intervall (fallback om ingen historik)
-        "ESK_MIN": 20, "ESK_MAX": 40,
-
-        # Maxvärden (källor)
-        "MAX_PAPPAN": 100, "MAX_GRANNAR": 100,
-        "MAX_NILS_VANNER": 100, "MAX_NILS_FAMILJ": 100,
-        "MAX_BEKANTA": 100,
-
-        # Etiketter
-        "LBL_PAPPAN": "Pappans vänner",
-        "LBL_GRANNAR": "Grannar",
-        "LBL_NILS_VANNER": "Nils vänner",
-        "LBL_NILS_FAMILJ": "Nils familj",
-        "LBL_BEKANTA": "Bekanta",
-        "LBL_ESK": "Eskilstuna killar",
-    }
+    # Standardvärden + typer finns i settings.py
+    return settings_defaults()
 
 def _ensure_next_start_dt_exists():
     if NEXT_START_DT_KEY not in st.session_state:
@@ -172,67 +151,14 @@ def init_state():
     # First boot flag
     st.session_state.setdefault(FIRST_BOOT_KEY, False)
 
+    st.session_state.setdefault(ROWS_MMAP_KEY, os.environ.get("MALIN_ROWS_MMAP", "") == "1")
+
     if SCENEINFO_KEY not in st.session_state:
         st.session_state[SCENEINFO_KEY] = _current_scene_info()
 
 init_state()
 
 # ===== Hjälpare: typ-tvång från Sheets =====
-def _coerce_cfg_types(cfg: dict) -> dict:
-    """Gör om strängar från Sheets -> date/time/nummer, och behåll övrigt."""
-    out = dict(cfg)
-
-    def _to_date(v):
-        if isinstance(v, date): return v
-        if isinstance(v, str) and v.strip():
-            for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y"):
-                try: return datetime.strptime(v.strip(), fmt).date()
-                except Exception: pass
-        return out.get("startdatum", date(1990,1,1))  # fallback
-
-    def _to_time(v):
-        if isinstance(v, time): return v
-        if isinstance(v, str) and v.strip():
-            parts = v.strip().split(":")
-            try:
-                hh = int(parts[0]); mm = int(parts[1]) if len(parts) > 1 else 0
-                return time(hh, mm)
-            except Exception:
-                pass
-        return out.get("starttid", time(7,0))  # fallback
-
-    # Kända nycklar som kan komma som strängar
-    if "startdatum"   in out: out["startdatum"]   = _to_date(out["startdatum"])
-    if "fodelsedatum" in out: out["fodelsedatum"] = _to_date(out["fodelsedatum"])
-    if "starttid"     in out: out["starttid"]     = _to_time(out["starttid"])
-
-    # numeriska fält
-    float_keys = (
-        "avgift_usd","BONUS_PCT","SUPER_BONUS_PCT","BMI_GOAL",
-        "ECON_COST_PER_HOUR","ECON_REVENUE_PER_KANNER","ECON_WAGE_SHARE_PCT",
-        "ECON_WAGE_MIN","ECON_WAGE_MAX",
-    )
-    for k in float_keys:
-        if k in out:
-            try: out[k] = float(out[k])
-            except Exception: pass
-
-    int_keys = (
-        "HET_BETYG","PROD_STAFF","HEIGHT_CM","ESK_MIN","ESK_MAX",
-        "MAX_PAPPAN","MAX_GRANNAR","MAX_NILS_VANNER","MAX_NILS_FAMILJ","MAX_BEKANTA"
-    )
-    for k in int_keys:
-        if k in out:
-            try: out[k] = int(float(out[k]))
-            except Exception: pass
-
-    # sömn
-    if EXTRA_SLEEP_KEY in out:
-        try: out[EXTRA_SLEEP_KEY] = float(out[EXTRA_SLEEP_KEY])
-        except Exception: pass
-
-    return out
-
 def _recompute_next_start_from_rows(rows):
     """Gå igenom historiken och räkna fram tvingad NEXT_START_DT."""
     cfg = st.session_state[CFG_KEY]
@@ -290,30 +216,91 @@ def _hist_hi(colname: str) -> int:
     except Exception:
         return 0
 
-def _rand_pct_of_hi(hi: int, lo_pct: float=0.30, hi_pct: float=0.60) -> int:
-    hi = max(0, int(hi))
-    if hi <= 0:
-        return 0
-    lo_val = max(0, int(round(lo_pct * hi)))
-    hi_val = max(lo_val, int(round(hi_pct * hi)))
-    return random.randint(lo_val, hi_val) if hi_val > 0 else 0
+def _hist_aggregates() -> dict:
+    """Historik-aggregat för scenario_gen ur min/max-cachen (samma som history_aggregates)."""
+    CFG = st.session_state[CFG_KEY]
+    return {
+        "hi": {c: _hist_hi(c) for c in hist_fields(CFG)},
+        "has_dpp": _hist_hi("DPP") > 0,
+        "has_dap": _hist_hi("DAP") > 0,
+        "has_tap": _hist_hi("TAP") > 0,
+    }
+
+def _rows_frame():
+    import pandas as pd
+
+    rows = st.session_state[ROWS_KEY]
+    if isinstance(rows, MappedRows):
+        return rows.to_frame()
+    return pd.DataFrame(rows) if rows else pd.DataFrame()
+
+def _rows_changed(synced: bool = False):
+    """
+    Anropas efter varje ändring av ROWS -> ny dataversion för statistiken.
+    synced=True: samma rader skrevs även till profilens lokala kopia (sparning
+    till Sheets). Annars skiljer sig ROWS nu från kopian och dagsaggregaten
+    (rollup) får inte användas förrän nästa inläsning.
+    """
+    st.session_state[ROWS_VER_KEY] = st.session_state.get(ROWS_VER_KEY, 0) + 1
+    stamp = st.session_state.get(ROWS_SYNCED_KEY)
+    st.session_state[ROWS_SYNCED_KEY] = (
+        (stamp[0], (stamp[1][0], len(st.session_state[ROWS_KEY]))) if (synced and stamp) else None
+    )
 
-def _rand_esk(CFG):
-    lo = int(CFG.get("ESK_MIN", 0)); hi = int(CFG.get("ESK_MAX", lo))
-    if hi < lo: hi = lo
-    return random.randint(lo, hi) if hi>lo else lo
+def _rows_loaded(profile: str):
+    """Efter inläsning: ROWS motsvarar profilens lokala kopia (om antalet stämmer)."""
+    import local_store as LS
+
+    _rows_changed()
+    state = LS.data_state(profile)
+    if state is not None and state[1] == len(st.session_state[ROWS_KEY]):
+        st.session_state[ROWS_SYNCED_KEY] = (profile, state)
+
+def _rollup_fresh() -> bool:
+    """
+    Dagsaggregaten får användas: sessionens rader har bara ändrats via
+    sparningar som även gick till lokala kopian, och kopian har inte ändrats
+    av någon annan sedan dess (samma ersättningstid och antal rader).
+    """
+    import local_store as LS
+
+    stamp = st.session_state.get(ROWS_SYNCED_KEY)
+    prof = st.session_state.get(PROFILE_KEY, "")
+    if stamp is None or stamp[0] != prof or stamp[1][1] != len(st.session_state[ROWS_KEY]):
+        return False
+    return LS.data_state(prof) == stamp[1]
+
+def _rows_version():
+    """
+    Dataversion för statistikcachen: (session, profil, versionsräknare, antal
+    rader). Cachen delas av hela processen men raderna är sessionens egna, så
+    sessions-id:t hindrar att två sessioner med samma räknare delar resultat.
+    """
+    if SESSION_ID_KEY not in st.session_state:
+        import uuid
+
+        st.session_state[SESSION_ID_KEY] = uuid.uuid4().hex
+    return (st.session_state[SESSION_ID_KEY], st.session_state.get(PROFILE_KEY, ""),
+            st.session_state.get(ROWS_VER_KEY, 0), len(st.session_state[ROWS_KEY]))
 
 # =========================
 # Ladda profilens inställningar + data
 # =========================
+def _apply_profile_settings(prof_cfg: dict):
+    """Lägg in profilens inställningar i CFG (typade) och visa de som inte gick att tolka."""
+    # Problemen samlas ur de råa värdena – coerce() har redan bytt ut otolkbara mot standardvärden
+    problems = snapshot({**st.session_state[CFG_KEY], **prof_cfg}).problems
+    st.session_state[CFG_KEY].update(coerce_settings(prof_cfg))
+    for msg in problems:
+        st.warning(f"Inställning: {msg}")
+
 def _load_profile_settings_and_data(profile_name: str):
     """Läs in inställningar + data från Sheets, tvångskonvertera typer och uppdatera state."""
     # 1) Inställningar
     try:
         prof_cfg = read_profile_settings(profile_name)
         if prof_cfg:
-            coerced = _coerce_cfg_types(prof_cfg)
-            st.session_state[CFG_KEY].update(coerced)
+            _apply_profile_settings(prof_cfg)
         else:
             st.warning(f"Inga inställningar hittades för '{profile_name}'. Använder lokala defaults.")
     except Exception as e:
@@ -322,7 +309,12 @@ def _load_profile_settings_and_data(profile_name: str):
     # 2) Data
     try:
         df = read_profile_data(profile_name)
-        st.session_state[ROWS_KEY] = df.to_dict(orient="records") if (df is not None and not df.empty) else []
+        records = df.to_dict(orient="records") if (df is not None and not df.empty) else []
+        if st.session_state.get(ROWS_MMAP_KEY) and records:
+            st.session_state[ROWS_KEY] = MappedRows.open_or_publish(profile_name, records)
+        else:
+            st.session_state[ROWS_KEY] = records
+        _rows_loaded(profile_name)
         # Bygg min/max för slump
         st.session_state[HIST_MM_KEY] = {}
         CFG = st.session_state[CFG_KEY]
@@ -353,137 +345,13 @@ def apply_scenario_fill():
     CFG = st.session_state[CFG_KEY]
     s = st.session_state[SCENARIO_KEY]
 
-    # nollställ och behåll vissa standarder
-    keep_defaults = {
-        "in_tid_s":60,"in_tid_d":60,"in_vila":7,"in_dt_tid":60,"in_dt_vila":3,
-        "in_hander_aktiv":st.session_state.get("in_hander_aktiv",1),
-        "in_alskar":0,"in_sover":0,"in_nils":0,
-        "in_target_min_per_kille": float(st.session_state.get("in_target_min_per_kille", 7.0)),
-    }
-    for k in INPUT_ORDER:
-        st.session_state[k] = keep_defaults.get(k, 0)
-
-    # Hjälpare – slumpa fitta/rumpa från historikmax 1..hi
-    def _slumpa_sexfalt():
-        for f,key in [("Fitta","in_fitta"),("Rumpa","in_rumpa")]:
-            _, hi = _minmax_from_hist(f)
-            st.session_state[key] = 0 if hi<=0 else random.randint(1, int(hi))
-        # DP/DPP/DAP/TAP sätts separat enligt regler nedan
-
-    # Läs dynamiska etiketter
-    LBL_PAPPAN = CFG["LBL_PAPPAN"]; LBL_GRANNAR = CFG["LBL_GRANNAR"]
-    LBL_NV = CFG["LBL_NILS_VANNER"]; LBL_NF = CFG["LBL_NILS_FAMILJ"]
-    LBL_BEK = CFG["LBL_BEKANTA"];   LBL_ESK = CFG["LBL_ESK"]
-
-    # ===== Slump basfält (9 st) 30–60% av historiska max =====
-    def _slump_9_fields(vit: bool, svart: bool):
-        # Hämta hi från historik
-        hi_man  = _hist_hi("Män")
-        hi_svar = _hist_hi("Svarta")
-        hi_pap  = _hist_hi(LBL_PAPPAN)
-        hi_gra  = _hist_hi(LBL_GRANNAR)
-        hi_nv   = _hist_hi(LBL_NV)
-        hi_nf   = _hist_hi(LBL_NF)
-        hi_bek  = _hist_hi(LBL_BEK)
-        hi_pd   = _hist_hi("Personal deltagit")
-        hi_esk  = _hist_hi(LBL_ESK)
-
-        # Slumpa 30–60% av hi
-        v_man   = _rand_pct_of_hi(hi_man)
-        v_svar  = _rand_pct_of_hi(hi_svar)
-        v_pap   = _rand_pct_of_hi(hi_pap)
-        v_gra   = _rand_pct_of_hi(hi_gra)
-        v_nv    = _rand_pct_of_hi(hi_nv)
-        v_nf    = _rand_pct_of_hi(hi_nf)
-        v_bek   = _rand_pct_of_hi(hi_bek)
-        v_pd    = _rand_pct_of_hi(hi_pd)
-        v_esk   = _rand_pct_of_hi(hi_esk)
-
-        # Särregler
-        if vit:
-            v_svar = 0
-        if svart:
-            v_man = 0
-            # nollställ privata källor + personal
-            v_pap = v_gra = v_nv = v_nf = v_bek = v_pd = 0
-
-        # Sätt indata
-        st.session_state["in_man"] = int(v_man)
-        st.session_state["in_svarta"] = int(v_svar)
-        st.session_state["in_pappan"] = int(v_pap)
-        st.session_state["in_grannar"] = int(v_gra)
-        st.session_state["in_nils_vanner"] = int(v_nv)
-        st.session_state["in_nils_familj"] = int(v_nf)
-        st.session_state["in_bekanta"] = int(v_bek)
-        st.session_state["in_personal_deltagit"] = int(v_pd)
-        st.session_state["in_eskilstuna"] = int(v_esk)
-
-        total_bas = v_man + v_svar + v_pap + v_gra + v_nv + v_nf + v_bek + v_pd + v_esk
-        return int(total_bas)
-
-    # ===== Räkna DP/DPP/DAP/TAP enligt tidigare regler =====
-    def _col_sum(col: str) -> int:
-        s = 0
-        for r in st.session_state[ROWS_KEY]:
-            try:
-                s += int(float(r.get(col, 0) or 0))
-            except Exception:
-                pass
-        return s
-
-    def _satt_dp_suite(total_bas: int):
-        # DP = 60% av totalsumman (avrundat)
-        dp = int(round(0.60 * max(0, total_bas)))
-        dpp = dp if _col_sum("DPP") > 0 else 0
-        dap = dp if _col_sum("DAP") > 0 else 0
-        tap = int(round(0.40 * dp)) if _col_sum("TAP") > 0 else 0
-
-        st.session_state["in_dp"]  = int(dp)
-        st.session_state["in_dpp"] = int(dpp)
-        st.session_state["in_dap"] = int(dap)
-        st.session_state["in_tap"] = int(tap)
-
-    # === Branch per scenario
-    if s == "Ny scen":
-        pass
+    # Generatorn är ren (scenario_gen); här tas bara första raden in i formuläret
+    rows = generate(s, _hist_aggregates(), CFG, n=1, super_acc=int(CFG.get(SUPER_ACC_KEY, 0)))
+    st.session_state.update(as_inputs(rows, CFG))
 
-    elif s == "Slumpa scen vit":
-        _slumpa_sexfalt()
-        tot = _slump_9_fields(vit=True, svart=False)
-        _satt_dp_suite(tot)
-        st.session_state["in_alskar"] = 8
-        st.session_state["in_sover"]  = 1
-
-    elif s == "Slumpa scen svart":
-        _slumpa_sexfalt()
-        tot = _slump_9_fields(vit=False, svart=True)
-        _satt_dp_suite(tot)
-        st.session_state["in_alskar"] = 8
-        st.session_state["in_sover"]  = 1
-
-    elif s == "Vila på jobbet":
-        _slumpa_sexfalt()
-        tot = _slump_9_fields(vit=False, svart=False)
-        _satt_dp_suite(tot)
-        st.session_state["in_alskar"]=8
-        st.session_state["in_sover"]=1
-        # Män/Svarta alltid 0 på Vila
-        st.session_state["in_man"] = 0
-        st.session_state["in_svarta"] = 0
-
-    elif s == "Vila i hemmet (dag 1–7)":
-        _slumpa_sexfalt()
-        tot = _slump_9_fields(vit=False, svart=False)
-        _satt_dp_suite(tot)
-        st.session_state["in_alskar"]=6
-        st.session_state["in_sover"]=0
-        st.session_state["in_nils"]=0
-        # Män/Svarta alltid 0 på Vila
-        st.session_state["in_man"] = 0
-        st.session_state["in_svarta"] = 0
-
-    elif s == "Super bonus":
-        st.session_state["in_svarta"] = int(st.session_state[CFG_KEY].get(SUPER_ACC_KEY, 0))
+    # behåll radens val för händer + mål tid/kille
+    st.session_state["in_hander_aktiv"] = st.session_state.get("in_hander_aktiv", 1)
+    st.session_state["in_target_min_per_kille"] = float(st.session_state.get("in_target_min_per_kille", 7.0))
 
     st.session_state[SCENEINFO_KEY] = _current_scene_info()
 
@@ -626,8 +494,7 @@ with st.sidebar:
             try:
                 prof_cfg = read_profile_settings(selected_profile)
                 if prof_cfg:
-                    coerced = _coerce_cfg_types(prof_cfg)
-                    st.session_state[CFG_KEY].update(coerced)
+                    _apply_profile_settings(prof_cfg)
                     st.success(f"✅ Läste in inställningar för '{selected_profile}'.")
                 else:
                     st.warning(f"Inga inställningar hittades på bladet '{selected_profile}'.")
@@ -638,8 +505,46 @@ with st.sidebar:
         if st.button("📥 Läs in profilens data (allt)"):
             _load_profile_settings_and_data(selected_profile)
 
+    st.checkbox(
+        "Delad minnesmappad radhistorik (stora profiler)", key=ROWS_MMAP_KEY,
+        help="Raderna lagras som kolumnfiler på disk och delas read-only mellan sessioner. Gäller från nästa inläsning."
+    )
+
     st.caption(f"GOOGLE_CREDENTIALS: {'✅' if 'GOOGLE_CREDENTIALS' in st.secrets else '❌'} • SHEET_URL: {'✅' if 'SHEET_URL' in st.secrets else '❌'}")
 
+    # Offline-läge gäller hela processen (alla sessioner delar samma API-kvot)
+    st.checkbox(
+        "Offline-läge (lokal cache, köa skrivningar)", key=OFFLINE_KEY,
+        on_change=lambda: set_offline_mode(st.session_state[OFFLINE_KEY]),
+        help="Läser profiler/inställningar/data från lokal cache. Skrivningar köas och synkas när Sheets svarar."
+    )
+    if is_offline():
+        st.info(f"📴 Offline ({offline_reason()}) – data från lokal cache.")
+    n_pending = pending_writes()
+    if n_pending:
+        st.caption(f"⏳ {n_pending} skrivningar väntar på synk till Sheets.")
+        if st.button("🔄 Synka nu"):
+            synced = sync_pending_writes()
+            if synced:
+                st.success(f"Synkade {synced} skrivningar.")
+            else:
+                st.warning("Kunde inte nå Sheets – försöker igen i bakgrunden.")
+    failed = failed_writes()
+    if failed:
+        st.error(f"⚠️ {len(failed)} skrivningar kunde inte sparas till Sheets och har lagts åt sidan.")
+        with st.expander("Misslyckade skrivningar"):
+            for f in failed:
+                st.caption(f"#{f['id']} {f['kind']} '{f['profile']}' ({f['rows']} st, {f['attempts']} försök): {f['error']}")
+            colF1, colF2 = st.columns(2)
+            with colF1:
+                if st.button("↩️ Försök igen"):
+                    retry_failed_writes()
+                    st.rerun()
+            with colF2:
+                if st.button("🗑️ Släng"):
+                    discard_failed_writes()
+                    st.rerun()
+
     if st.button("💾 Spara inställningar till profil"):
         try:
             save_profile_settings(selected_profile, st.session_state[CFG_KEY])
@@ -785,101 +690,12 @@ def build_base_from_inputs():
 
 
 # =========================
-# Hårdhet enligt betygssystem
-# =========================
-def _alder_from_cfg(cfg: dict) -> int:
-    try:
-        sd = cfg["startdatum"]; fd = cfg["fodelsedatum"]
-        return sd.year - fd.year - ((sd.month, sd.day) < (fd.month, fd.day))
-    except Exception:
-        return 30
-
-def _hardhet_betyg(base: dict, preview: dict, CFG: dict) -> float:
-    """Ny hårdhet: slumpbidrag beroende på DP/DPP/DAP/TAP + (Het betyg / ålder).
-       OBS: 'slumpbidragen' är rena tal (ej %)."""
-    hard = 0.0
-    if int(base.get("DP",0))  > 0: hard += random.randint(10, 20)
-    if int(base.get("DPP",0)) > 0: hard += random.randint(11, 22)
-    if int(base.get("DAP",0)) > 0: hard += random.randint(13, 26)
-    if int(base.get("TAP",0)) > 0: hard += random.randint(15, 30)
-
-    het = int(CFG.get("HET_BETYG", 35))
-    alder = max(1, _alder_from_cfg(CFG))
-    hard += (het / float(alder))
-
-    # Vila = hårdhet noll
-    if "Vila" in str(base.get("Typ","")):
-        hard = 0.0
-
-    return float(hard)
-
-
-# =========================
-# Ekonomi + prenumeranter (på betygs-hårdhet)
+# Hårdhet (betyg) + ekonomi + prenumeranter – se ekonomi.py
 # =========================
-def _fallback_tot_men(base: dict, CFG: dict) -> int:
-    # Egen totalsiffra inkl alla fält (om beräkningsmodulen inte gav 'Totalt Män')
-    return (
-        int(base.get("Män",0)) + int(base.get("Svarta",0)) +
-        int(base.get(CFG["LBL_PAPPAN"],0)) + int(base.get(CFG["LBL_GRANNAR"],0)) +
-        int(base.get(CFG["LBL_NILS_VANNER"],0)) + int(base.get(CFG["LBL_NILS_FAMILJ"],0)) +
-        int(base.get(CFG["LBL_BEKANTA"],0)) + int(base.get(CFG["LBL_ESK"],0)) +
-        int(base.get("Bonus deltagit",0)) + int(base.get("Personal deltagit",0))
-    )
-
 def _econ_compute_betyg(base: dict, preview: dict, CFG: dict) -> dict:
-    out = {}
-    typ = str(base.get("Typ",""))
-    hardhet = _hardhet_betyg(base, preview, CFG)
-    out["Hårdhet"] = hardhet
-
-    # Totalt Män
-    tot_man = int(preview.get("Totalt Män", _fallback_tot_men(base, CFG)))
-
-    # Prenumeranter = (DP+DPP+DAP+TAP + Totalt Män) * hårdhet
-    if "Vila" in typ:
-        pren = 0
-    else:
-        base_count = int(base.get("DP",0)) + int(base.get("DPP",0)) + int(base.get("DAP",0)) + int(base.get("TAP",0)) + int(tot_man)
-        pren = int(round(base_count * hardhet))
-    out["Prenumeranter"] = int(max(0, pren))
-
-    # Intäkter
-    avg = float(CFG.get("avgift_usd", 0.0))
-    out["Intäkter"] = float(out["Prenumeranter"]) * avg
-
-    # Intäkt Känner
-    ksam = int(base.get("Känner", 0))
-    rev_per_kanner = float(CFG.get("ECON_REVENUE_PER_KANNER", 30.0))
-    out["Intäkt Känner"] = 0.0 if "Vila" in typ else float(ksam) * rev_per_kanner
-
-    # Kostnad män
-    if "Vila" in typ:
-        kost = 0.0
-    else:
-        timmar = float(preview.get("Summa tid (sek)", 0)) / 3600.0
-        bas_mann = (
-            int(base.get("Män",0)) + int(base.get("Svarta",0)) +
-            int(base.get(CFG["LBL_BEKANTA"],0)) + int(base.get(CFG["LBL_ESK"],0))
-        )
-        tot_personer = bas_mann + int(CFG.get("PROD_STAFF",0))
-        cost_per_hour = float(CFG.get("ECON_COST_PER_HOUR", 15.0))
-        kost = timmar * tot_personer * cost_per_hour
-    out["Kostnad män"] = float(kost)
-
-    # Intäkt företag, Lön, Vinst
-    out["Intäkt företag"] = float(out["Intäkter"]) - float(out["Kostnad män"]) - float(out["Intäkt Känner"])
-
-    # Lön Malin – styrbar via % och intervall
-    wage_share = float(CFG.get("ECON_WAGE_SHARE_PCT", 8.0)) / 100.0
-    wage_min   = float(CFG.get("ECON_WAGE_MIN", 150.0))
-    wage_max   = float(CFG.get("ECON_WAGE_MAX", 800.0))
-    base_wage  = max(wage_min, min(wage_max, wage_share * float(out["Intäkt företag"])))
-    lon = 0.0 if "Vila" in typ else base_wage
-    out["Lön Malin"] = float(lon)
-
-    out["Vinst"] = float(out["Intäkt företag"]) - float(out["Lön Malin"])
-    return out
+    """En rad genom den vektoriserade ekonomimotorn (samma regler som omprissättning av historiken)."""
+    tot_man = int(preview.get("Totalt Män", tot_men_fallback(base, CFG)))
+    return economy_for_row(base, preview, CFG, tot_man)
 
 
 # =========================
@@ -889,6 +705,7 @@ st.markdown("---")
 st.subheader("🔎 Live")
 
 CFG = st.session_state[CFG_KEY]
+SETTINGS = snapshot(CFG)  # typad ögonblicksbild efter sidopanelens ändringar
 base = build_base_from_inputs()
 
 # 1) Beräkna grund via berakningar.py (tid, totals, mm)
@@ -898,146 +715,40 @@ except TypeError:
     preview = calc_row_values(base, base["_rad_datum"], CFG["fodelsedatum"], CFG["starttid"])
 
 # 2) Ekonomi & hårdhet (betyg)
-econ = _econ_compute_betyg(base, preview, CFG)
+econ = _econ_compute_betyg(base, preview, SETTINGS)
 preview.update(econ)
 
-# 3) Mål tid/kille (exkl. händer) – föreslå extra sekunder till DP/DPP/DAP resp. TAP
-def _mmss(total_seconds: float) -> str:
+# 3) Vymodell för liven (tider, tvingad nästa start, mål tid/kille, ekonomi) – memoiserad på indata
+def _live_history():
+    """(summa Nils över sparade rader, senaste 'Vila i hemmet'), cachat per radversion."""
+    ver = _rows_version()
+    hit = st.session_state.get(LIVE_HIST_KEY)
+    if hit is not None and hit[0] == ver:
+        return hit[1]
+    rows = st.session_state.get(ROWS_KEY, [])
     try:
-        s = max(0, int(round(total_seconds))); m, s = divmod(s, 60); return f"{m}:{s:02d}"
-    except Exception: return "-"
-
-current_tpk_ex = float(preview.get("Tid per kille (sek)", 0.0))  # exkl händer
-target_min = float(base.get("Mål tid/kille (min)", 7.0))
-target_sec = max(0.0, target_min * 60.0)
-gap_sec = max(0.0, target_sec - current_tpk_ex)
-
-# Antaganden: +X s i "DP/DPP/DAP-tid" ger ca +2X s i tid/kille (exkl händer),
-# och +Y s i "TAP-tid" ger ca +3Y s i tid/kille.
-extra_sec_for_dp_like = int(round(gap_sec / 2.0)) if gap_sec > 0 else 0
-extra_sec_for_tap     = int(round(gap_sec / 3.0)) if gap_sec > 0 else 0
-
-# 4) Tvingad schemaläggning: beräkna slut + nästa start
-def _ceil_to_next_hour(dt: datetime) -> datetime:
-    if dt.minute==0 and dt.second==0 and dt.microsecond==0:
-        return dt
-    return dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-
-def _compute_end_and_next(start_dt: datetime, base: dict, preview: dict, sleep_h: float):
-    summa_sec = float(preview.get("Summa tid (sek)", 0.0))
-    alskar = int(base.get("Älskar",0)); sover = int(base.get("Sover med",0))
-    # Klockan = summa + 1h vila + 3h hångel
-    end_dt = start_dt + timedelta(seconds = summa_sec + 3600 + 10800)
-    # Klockan inkl älskar/sover
-    end_incl = end_dt + timedelta(seconds=(alskar+sover)*20*60)
-    # + sömn
-    end_sleep = end_incl + timedelta(hours=float(sleep_h))
-
-    # Nästa start (tvingad)
-    if end_sleep.date() > start_dt.date():
-        base7 = datetime.combine(end_sleep.date(), time(7,0))
-        next_start = base7 if end_sleep.time() <= time(7,0) else _ceil_to_next_hour(end_sleep)
-    else:
-        # Samma datum -> nästa dag 07:00
-        next_start = datetime.combine(start_dt.date() + timedelta(days=1), time(7,0))
-    return end_incl, end_sleep, next_start
+        nils = sum(int(r.get("Nils",0) or 0) for r in rows)
+    except Exception:
+        nils = 0
+    senaste_vila_datum = None
+    for rad in reversed(rows):
+        if str(rad.get("Typ", "")).strip().startswith("Vila i hemmet"):
+            try:
+                senaste_vila_datum = datetime.strptime(rad.get("Datum", ""), "%Y-%m-%d").date()
+                break
+            except Exception:
+                continue
+    st.session_state[LIVE_HIST_KEY] = (ver, (nils, senaste_vila_datum))
+    return nils, senaste_vila_datum
 
 start_dt = st.session_state[NEXT_START_DT_KEY]
-sleep_h  = float(CFG.get(EXTRA_SLEEP_KEY, 7))
-end_incl, end_sleep, forced_next = _compute_end_and_next(start_dt, base, preview, sleep_h)
-
-# Varning om extrem längd (>36h innan sömn)
-if (end_incl - start_dt) > timedelta(hours=36):
-    st.warning("Scenen har pågått väldigt länge (>36 timmar) innan sömn. Nästa start är tvingad enligt reglerna.")
+sleep_h  = SETTINGS.EXTRA_SLEEP_H
+_nils_hist, _last_vila = _live_history()
+live_view = build_live_view(base, preview, SETTINGS, start_dt, sleep_h, _nils_hist, _last_vila)
+forced_next = live_view["forced_next"]
 
 # ===== LIVE-UTDATA =====
-rowA = st.columns(3)
-with rowA[0]:
-    st.metric("Klockan", preview.get("Klockan","-"))
-with rowA[1]:
-    st.metric("Klockan + älskar/sover med", preview.get("Klockan inkl älskar/sover","-"))
-with rowA[2]:
-    st.metric("Sömn (h)", sleep_h)
-
-rowA2 = st.columns(3)
-with rowA2[0]:
-    st.metric("Start (tvingad)", start_dt.strftime("%Y-%m-%d %H:%M"))
-with rowA2[1]:
-    st.metric("Slut inkl älskar/sover", end_incl.strftime("%Y-%m-%d %H:%M"))
-with rowA2[2]:
-    st.metric("Nästa scen start (T V I N G A D)", forced_next.strftime("%Y-%m-%d %H:%M"))
-
-rowB = st.columns(3)
-with rowB[0]:
-    st.metric("Summa tid (timmar:minuter)", _mmss(float(preview.get("Summa tid (sek)",0))))
-with rowB[1]:
-    st.metric("Totalt män", int(preview.get("Totalt Män", _fallback_tot_men(base, CFG))))
-with rowB[2]:
-    st.metric("Hårdhet (betyg)", f"{float(preview.get('Hårdhet',0.0)):.2f}")
-
-# Tid/kille inkl händer (visning)
-hander_kille_sek = float(preview.get("Händer per kille (sek)", 0.0))
-inkl_hander = current_tpk_ex + (hander_kille_sek if int(base.get("Händer aktiv",1))==1 else 0)
-
-rowC = st.columns(3)
-with rowC[0]:
-    st.metric("Tid/kille ex händer", _mmss(current_tpk_ex))
-with rowC[1]:
-    st.metric("Tid/kille inkl händer", _mmss(inkl_hander))
-with rowC[2]:
-    st.metric("Mål tid/kille (min)", target_min)
-
-rowC2 = st.columns(2)
-with rowC2[0]:
-    st.metric("Behöver +sek (DP/DPP/DAP)", extra_sec_for_dp_like)
-with rowC2[1]:
-    st.metric("Behöver +sek (TAP)", extra_sec_for_tap)
-
-# Ekonomi
-st.markdown("**💵 Ekonomi (live)**")
-e1, e2, e3, e4 = st.columns(4)
-with e1:
-    st.metric("Prenumeranter (rad)", int(preview.get("Prenumeranter",0)))
-    st.metric("Intäkter", f"${float(preview.get('Intäkter',0)):,.2f}")
-with e2:
-    st.metric("Kostnad män", f"${float(preview.get('Kostnad män',0)):,.2f}")
-    st.metric("Intäkt Känner", f"${float(preview.get('Intäkt Känner',0)):,.2f}")
-with e3:
-    st.metric("Intäkt företag", f"${float(preview.get('Intäkt företag',0)):,.2f}")
-    st.metric("Lön Malin", f"${float(preview.get('Lön Malin',0)):,.2f}")
-with e4:
-    st.metric("Vinst", f"${float(preview.get('Vinst',0)):,.2f}")
-    st.metric("Super bonus ack", int(CFG.get(SUPER_ACC_KEY, 0)))
-
-# ===== Nils – längst ner i liven =====
-try:
-    nils_total = int(base.get("Nils",0)) + sum(int(r.get("Nils",0) or 0) for r in st.session_state[ROWS_KEY])
-except Exception:
-    nils_total = int(base.get("Nils",0))
-st.markdown("**👤 Nils (live)**")
-st.metric("Nils (total)", nils_total)
-
-# ===== Senaste "Vila i hemmet" – räkna dagar mot SIMULERAT 'idag' =====
-# Referensdatum = nuvarande scenens startdatum (tvingat schema), inte realtidens date.today()
-sim_today = st.session_state[NEXT_START_DT_KEY].date()
-senaste_vila_datum = None
-for rad in reversed(st.session_state.get(ROWS_KEY, [])):
-    if str(rad.get("Typ", "")).strip().startswith("Vila i hemmet"):
-        try:
-            senaste_vila_datum = datetime.strptime(rad.get("Datum", ""), "%Y-%m-%d").date()
-            break
-        except Exception:
-            continue
-
-if senaste_vila_datum:
-    dagar_sedan_vila = (sim_today - senaste_vila_datum).days
-    st.markdown(f"**🛏️ Senaste 'Vila i hemmet': {dagar_sedan_vila} dagar sedan (simulerat)**")
-    if dagar_sedan_vila >= 21:
-        st.error(f"⚠️ Dags för semester! Det var {dagar_sedan_vila} dagar sedan senaste 'Vila i hemmet'.")
-else:
-    st.info("Ingen 'Vila i hemmet' hittad ännu.")
-
-st.caption("Obs: Vila-scenarion genererar inga prenumeranter, intäkter, kostnader eller lön. Bonus kvar minskas dock med 'Bonus deltagit'.")
+render_live(live_view)
 
 # ==== Del 4/4 – Spara, kopiera ~365d, lokala rader, statistik ====
 import time as _time
@@ -1095,16 +806,17 @@ def _row_for_sheets(row_dict: dict) -> dict:
 def _after_save_housekeeping(preview_row: dict, is_vila: bool, is_superbonus: bool):
     """Bonus- och superbonuslogik + uppdatera ack i CFG och spara till profilbladet."""
     CFG = st.session_state[CFG_KEY]
+    cur = snapshot(CFG)
     pren = int(preview_row.get("Prenumeranter", 0))
-    bonus_pct = float(CFG.get("BONUS_PCT", 1.0)) / 100.0
-    sb_pct    = float(CFG.get("SUPER_BONUS_PCT", 0.1)) / 100.0
+    bonus_pct = cur.BONUS_PCT / 100.0
+    sb_pct    = cur.SUPER_BONUS_PCT / 100.0
 
     add_bonus = 0 if (is_vila or is_superbonus) else int(pren * bonus_pct)
     add_super = 0 if (is_vila or is_superbonus) else int(pren * sb_pct)
 
     minus_bonus = int(preview_row.get("Bonus deltagit", 0))
-    CFG[BONUS_LEFT_KEY] = max(0, int(CFG.get(BONUS_LEFT_KEY,0)) - minus_bonus + add_bonus)
-    CFG[SUPER_ACC_KEY]  = max(0, int(CFG.get(SUPER_ACC_KEY,0)) + add_super)
+    CFG[BONUS_LEFT_KEY] = max(0, cur.BONUS_AVAILABLE - minus_bonus + add_bonus)
+    CFG[SUPER_ACC_KEY]  = max(0, cur.SUPER_BONUS_ACC + add_super)
 
     # Persistera direkt till profilens inställningsblad
     try:
@@ -1133,6 +845,7 @@ with cL:
     if st.button("💾 Spara raden (lokalt)"):
         full_row = _prepare_row_for_save(preview, base, CFG)
         st.session_state[ROWS_KEY].append(full_row)
+        _rows_changed()
 
         # uppdatera min/max (för slump)
         for col in ["Män","Svarta","Fitta","Rumpa","DP","DPP","DAP","TAP",
@@ -1154,6 +867,7 @@ with cR:
 
             # spegla lokalt
             st.session_state[ROWS_KEY].append(full_row)
+            _rows_changed(synced=True)
             for col in ["Män","Svarta","Fitta","Rumpa","DP","DPP","DAP","TAP",
                         LBL_PAPPAN, LBL_GRANNAR, LBL_NV, LBL_NF, LBL_BEK, LBL_ESK]:
                 _add_hist_value(col, int(full_row.get(col,0)))
@@ -1277,6 +991,7 @@ if st.button("📚 Skapa kopior nu"):
 
             # lokalt
             st.session_state[ROWS_KEY].append(src)
+            _rows_changed()
             created += 1
 
             if do_save_sheets:
@@ -1303,6 +1018,9 @@ if st.button("📚 Skapa kopior nu"):
                     _add_hist_value(col, int(r.get(col,0) or 0))
                 except Exception:
                     pass
+        # Minnesmappad historik: publicera kopiorna till disk så sessionens minne hålls platt
+        if isinstance(st.session_state[ROWS_KEY], MappedRows):
+            st.session_state[ROWS_KEY].flush()
 
 # Extra: batch-spara ALLA lokala rader i efterhand (om du kopierat utan autospara)
 if st.button("📤 Spara ALLA lokala rader (batch)"):
@@ -1313,6 +1031,153 @@ if st.button("📤 Spara ALLA lokala rader (batch)"):
         all_rows = [_row_for_sheets(r) for r in st.session_state[ROWS_KEY]]
         _batch_append(profile, all_rows)
 
+# =========================
+# Räkna om ekonomin för hela historiken (efter ändrad avgift/kostnad/lön)
+# =========================
+st.markdown("---")
+st.subheader("🔁 Räkna om ekonomi (historik)")
+colR1, colR2 = st.columns([2,1])
+with colR1:
+    st.caption("Räknar om Hårdhet, Prenumeranter, Intäkter, Kostnad män, Lön Malin och Vinst "
+               "för alla lokala rader med nuvarande inställningar. Samma seed ger samma slumpbidrag.")
+with colR2:
+    reprice_seed = st.number_input("Seed", min_value=0, value=0, step=1, key="reprice_seed")
+
+if st.button("🔁 Räkna om lokala rader"):
+    rows = st.session_state[ROWS_KEY]
+    if not rows:
+        st.info("Inga lokala rader att räkna om.")
+    else:
+        import pandas as pd
+        from ekonomi import reprice_history
+
+        src_df = _rows_frame()
+        before = float(pd.to_numeric(src_df.get("Vinst", pd.Series(dtype=float)), errors="coerce").fillna(0).sum())
+        repriced = reprice_history(src_df, snapshot(CFG), seed=int(reprice_seed))
+        records = repriced.to_dict(orient="records")
+        if isinstance(rows, MappedRows):
+            # Omräkningen är bara lokal -> privat version, inte profilens delade
+            st.session_state[ROWS_KEY] = MappedRows.local(rows.profile, records)
+        else:
+            st.session_state[ROWS_KEY] = records
+        _rows_changed()
+        after = float(repriced["Vinst"].sum())
+        st.success(f"✅ Räknade om {len(records)} rader. Vinst – summa: {before:,.2f} → {after:,.2f} USD (endast lokalt).")
+
+with st.expander("🧪 What-if: omprissätt historiken för flera parameterval"):
+    from whatif import SWEEP_KEYS, expand_grid, parse_grid, sweep
+
+    st.caption("En rad per nyckel, t.ex. `ECON_WAGE_SHARE_PCT=8, 10, 12`. "
+               "Tillåtna nycklar: " + ", ".join(SWEEP_KEYS))
+    grid_text = st.text_area("Parametrar", value="ECON_WAGE_SHARE_PCT=8, 10", key="whatif_grid")
+    whatif_days = st.number_input("Endast sista N dagarna (0 = allt)", min_value=0, value=365, step=1, key="whatif_days")
+    if st.button("▶️ Kör what-if"):
+        rows = st.session_state[ROWS_KEY]
+        if not rows:
+            st.info("Inga lokala rader att räkna på.")
+        else:
+            try:
+                scenarios = [{}] + expand_grid(parse_grid(grid_text))
+                src_df = _rows_frame()
+                table = sweep(src_df, snapshot(CFG), scenarios, seed=int(reprice_seed), last_days=int(whatif_days) or None)
+                st.dataframe(table.T, use_container_width=True)
+            except Exception as e:
+                st.error(f"What-if misslyckades: {e}")
+
+with st.expander("🎲 Monte Carlo: simulera framtida scener"):
+    st.caption("Simulerar scensekvenser från nuvarande tvingade start med samma regler som 'Hämta värden', "
+               "beräkningar, ekonomi, schemaläggning och bonus. Vila i hemmet tvingas efter N dagar.")
+    mc1, mc2, mc3, mc4 = st.columns(4)
+    with mc1:
+        mc_sims = st.number_input("Simuleringar", min_value=10, max_value=100000, value=2000, step=100, key="mc_sims")
+    with mc2:
+        mc_scenes = st.number_input("Scener per simulering", min_value=1, max_value=2000, value=60, step=1, key="mc_scenes")
+    with mc3:
+        mc_force = st.number_input("Tvinga Vila i hemmet efter (dagar, 0 = aldrig)", min_value=0, value=21, step=1, key="mc_force")
+    with mc4:
+        mc_seed = st.number_input("Seed ", min_value=0, value=0, step=1, key="mc_seed")
+    if st.button("▶️ Kör simulering"):
+        from scenario_gen import history_aggregates
+        from simulering import simulate, summarize
+
+        rows = st.session_state[ROWS_KEY]
+        since_vila = 0
+        for rad in reversed(rows):
+            if str(rad.get("Typ", "")).strip().startswith("Vila i hemmet"):
+                try:
+                    d_v = datetime.strptime(str(rad.get("Datum", "")), "%Y-%m-%d").date()
+                    since_vila = max(0, (st.session_state[NEXT_START_DT_KEY].date() - d_v).days)
+                    break
+                except Exception:
+                    continue
+        try:
+            per_sim = simulate(
+                history_aggregates(_rows_frame(), CFG), CFG, st.session_state[NEXT_START_DT_KEY],
+                n_sims=int(mc_sims), n_scenes=int(mc_scenes),
+                force_vila_after_days=int(mc_force) or None, days_since_vila=since_vila,
+                seed=int(mc_seed), max_workers=os.cpu_count(),
+            )
+            st.dataframe(summarize(per_sim), use_container_width=True)
+        except Exception as e:
+            st.error(f"Simuleringen misslyckades: {e}")
+
+st.markdown("---")
+st.subheader("🏭 Generera och spara nya scener")
+st.caption("Skapar N nya scener i följd: slumpade indata (samma regler som 'Hämta värden'), beräkningar, "
+           "ekonomi, tvingat schema och bonus – som att trycka 'Hämta värden' + 'Spara' N gånger.")
+g1, g2, g3, g4 = st.columns(4)
+with g1:
+    gen_n = st.number_input("Antal scener", min_value=1, max_value=100000, value=100, step=10, key="gen_n")
+with g2:
+    gen_force = st.number_input("Tvinga Vila i hemmet efter (dagar, 0 = aldrig)", min_value=0, value=21, step=1, key="gen_force")
+with g3:
+    gen_seed = st.number_input("Seed (0 = slump)", min_value=0, value=0, step=1, key="gen_seed")
+with g4:
+    gen_sheets = st.checkbox("Spara till Google Sheets (batch)", value=True, key="gen_sheets")
+
+if st.button("⚙️ Generera och spara"):
+    from generering import generate_and_save
+
+    profile = st.session_state.get(PROFILE_KEY, "")
+    rows = st.session_state[ROWS_KEY]
+    since_vila = 0
+    for rad in reversed(rows):
+        if str(rad.get("Typ", "")).strip().startswith("Vila i hemmet"):
+            try:
+                d_v = datetime.strptime(str(rad.get("Datum", "")), "%Y-%m-%d").date()
+                since_vila = max(0, (st.session_state[NEXT_START_DT_KEY].date() - d_v).days)
+                break
+            except Exception:
+                continue
+    gen_bar = st.progress(0)
+    gen_info = st.empty()
+
+    def _gen_progress(done, total, secs):
+        gen_bar.progress(min(1.0, done / max(1, total)))
+        gen_info.info(f"{done}/{total} scener • {done / max(secs, 1e-9):,.0f} scener/s")
+
+    try:
+        res = generate_and_save(
+            profile, _hist_aggregates(), CFG, st.session_state[NEXT_START_DT_KEY], int(gen_n),
+            to_sheets=gen_sheets, chunk_size=BATCH_SIZE, progress=_gen_progress,
+            first_scen=len(rows) + 1, force_vila_after_days=int(gen_force) or None,
+            days_since_vila=since_vila, seed=int(gen_seed) or None,
+        )
+        st.session_state[ROWS_KEY].extend(res["rows"])
+        _rows_changed(synced=gen_sheets)
+        if isinstance(st.session_state[ROWS_KEY], MappedRows):
+            st.session_state[ROWS_KEY].flush()
+        for r in res["rows"]:
+            for col in ["Män","Svarta","Fitta","Rumpa","DP","DPP","DAP","TAP",
+                        LBL_PAPPAN, LBL_GRANNAR, LBL_NV, LBL_NF, LBL_BEK, LBL_ESK]:
+                _add_hist_value(col, int(r.get(col, 0)))
+        CFG[BONUS_LEFT_KEY] = res["cfg"][BONUS_LEFT_KEY]
+        CFG[SUPER_ACC_KEY] = res["cfg"][SUPER_ACC_KEY]
+        _update_forced_next_start_after_save(res["rows"][-1], res["next_start"])
+        st.success(f"✅ Genererade {len(res['rows'])} scener på {res['seconds']:.1f}s.")
+    except Exception as e:
+        st.error(f"Genereringen misslyckades: {e}")
+
 # =========================
 # Visa lokala rader + Statistik
 # =========================
@@ -1320,22 +1185,108 @@ st.markdown("---")
 st.subheader("📋 Lokala rader (förhandslagrade)")
 
 if st.session_state[ROWS_KEY]:
-    df = pd.DataFrame(st.session_state[ROWS_KEY])
+    df = _rows_frame()
     st.dataframe(df, use_container_width=True, height=380)
 else:
     st.info("Inga lokala rader ännu.")
 
 # (valfri) Statistik – använder statistik.py::compute_stats(rows_df, cfg)
+try:
+    from statistik import cached, compute_stats, format_frame, format_value, stats_by_period, window_stats
+    _HAS_STATS = True
+except Exception:
+    _HAS_STATS = False
+
+_STATS_VIEWS = {
+    "Totalt": None, "Senaste 7 dagarna": 7, "Senaste 30 dagarna": 30, "Senaste 365 dagarna": 365,
+    "Per vecka": "W", "Per månad": "M", "Per år": "Y",
+}
+
+def _compute_stats_view(sel, cfg):
+    """(mått eller periodtabell, övriga registrerade mått) för valt statistikläge."""
+    import rollup
+    import statistik_register as SR
+
+    # Dagsaggregaten (rollup.py) används bara när sessionens rader är lokala kopian
+    prof = st.session_state.get(PROFILE_KEY, "")
+    use_rollup = _rollup_fresh()
+    rows_df = None
+    if isinstance(sel, str):
+        res = rollup.stats_by_period(prof, cfg, sel) if use_rollup else None
+        if res is None:
+            rows_df = _rows_frame()
+            res = stats_by_period(rows_df, cfg, sel)
+        return res, {}
+    res = rollup.stats(prof, cfg, sel) if use_rollup else None
+    if res is None:
+        rows_df = _rows_frame()
+        res = window_stats(rows_df, cfg, sel) if sel else compute_stats(rows_df, cfg)
+    extra = {}
+    if sel is None and st.session_state[ROWS_KEY]:
+        # Övriga registrerade mått (statistik_register)
+        names = [m for m in SR.metrics() if not m.startswith("statistik.")]
+        extra = {SR.title(n): r for n, r in SR.run(rows_df if rows_df is not None else _rows_frame(),
+                                                  cfg, names=names).items() if r}
+    return res, extra
+
 if _HAS_STATS:
     try:
         st.markdown("---")
         st.subheader("📊 Statistik")
-        rows_df = pd.DataFrame(st.session_state[ROWS_KEY]) if st.session_state[ROWS_KEY] else pd.DataFrame()
-        stats = compute_stats(rows_df, CFG)
-        if isinstance(stats, dict) and stats:
-            for k,v in stats.items():
-                st.write(f"**{k}**: {v}")
+        view = st.selectbox("Period", list(_STATS_VIEWS), key="stats_view")
+        sel = _STATS_VIEWS[view]
+        # Cachat per radversion + statistikens CFG-nycklar: omritningar under
+        # inmatning (inga nya rader) räknar ingenting
+        stats, extra = cached(("vy", view), _rows_version(), SETTINGS, lambda: _compute_stats_view(sel, SETTINGS))
+        if isinstance(sel, str):
+            # En kolumn per period (senaste först), en rad per mått
+            if stats.empty:
+                st.caption("Inga rader med giltigt Datum ännu.")
+            else:
+                st.dataframe(format_frame(stats.iloc[::-1].T), use_container_width=True, height=600)
         else:
-            st.caption("Statistik-modulen returnerade inget att visa ännu.")
+            if isinstance(stats, dict) and stats:
+                for k,v in stats.items():
+                    st.write(f"**{k}**: {format_value(v)}")
+            else:
+                st.caption("Statistik-modulen returnerade inget att visa ännu.")
+            for title, res in extra.items():
+                st.markdown(f"**— {title} —**")
+                for k, v in res.items():
+                    st.write(f"**{k}**: {format_value(v)}")
     except Exception as e:
         st.error(f"Kunde inte beräkna statistik: {e}")
+
+# (valfri) Trender – nedsamplade tidsserier ur dagssummorna (trend.py)
+if _HAS_STATS:
+    try:
+        import trend
+
+        st.markdown("---")
+        st.subheader("📈 Trender")
+        tc1, tc2, tc3 = st.columns(3)
+        with tc1:
+            tr_names = st.multiselect("Serier", list(trend.SERIES), default=["Vinst (USD)"], key="trend_series")
+        with tc2:
+            tr_window = st.selectbox("Fönster", ["Allt", "Senaste 30 dagarna", "Senaste 90 dagarna", "Senaste 365 dagarna"],
+                                     key="trend_window")
+        with tc3:
+            tr_freq = st.selectbox("Upplösning", ["Dag", "Vecka", "Månad"], key="trend_freq")
+        tr_days = {"Allt": None, "Senaste 30 dagarna": 30, "Senaste 90 dagarna": 90, "Senaste 365 dagarna": 365}[tr_window]
+        tr_freq = {"Dag": "D", "Vecka": "W", "Månad": "M"}[tr_freq]
+        if st.session_state[ROWS_KEY]:
+            _ver = _rows_version()
+            _prof = st.session_state.get(PROFILE_KEY, "")
+            _use_rollup = _rollup_fresh()
+            for name in tr_names:
+                ser = trend.chart_series(_rows_frame, SETTINGS, name, tr_days, tr_freq, profile=_prof,
+                                         use_rollup=_use_rollup, version=_ver)
+                if ser.empty:
+                    st.caption(f"{name}: inga rader med giltigt Datum ännu.")
+                else:
+                    st.caption(f"{name} ({len(ser)} punkter)")
+                    st.line_chart(ser)
+        else:
+            st.caption("Inga lokala rader ännu.")
+    except Exception as e:
+        st.error(f"Kunde inte rita trender: {e}")
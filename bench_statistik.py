@@ -0,0 +1,124 @@
+# bench_statistik.py — mät statistikkärnan (statistik.compute_stats) på syntetiska rader
+#
+#   python bench_statistik.py [--rader 100000] [--upprepa 5] [--text] [--arbetare 4]
+#
+# Jämför kärnan (en tvångning per kolumn in i en float64-matris, termer som
+# matrisrader, en reduktion) med en kolumnvis pandas-referens (en Series per
+# term, som statistiken räknades före kärnan). Kontrollerar också att båda ger
+# samma termsummor. --text lagrar talen som text (som vid läsning från Sheets).
+# --arbetare N mäter även compute_stats med sektionerna i tråd- och processpool.
+
+from __future__ import annotations
+import argparse
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import statistik as S
+
+_INT_COLS = ("Män", "Svarta", "Bonus deltagit", "Personal deltagit", "Pappans vänner", "Grannar",
+             "Nils vänner", "Nils familj", "Bekanta", "Eskilstuna killar", "Älskar", "Sover med",
+             "Händer aktiv", "Nils", "DP", "DPP", "DAP", "TAP", "Prenumeranter")
+_FLOAT_COLS = ("Summa tid (sek)", "Tid D", "Tid per kille (sek)", "Händer per kille (sek)",
+               "Hångel (sek/kille)", "Intäkter", "Kostnad män", "Intäkt Känner", "Intäkt företag",
+               "Lön Malin", "Vinst")
+_CFG = {"MAX_PAPPAN": 10, "MAX_GRANNAR": 10, "MAX_NILS_VANNER": 10, "MAX_NILS_FAMILJ": 10, "MAX_BEKANTA": 10}
+
+
+def make_rows(n: int, seed: int = 0, text: bool = False) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    d: Dict[str, np.ndarray] = {c: rng.integers(0, 20, n) * rng.integers(0, 2, n) for c in _INT_COLS}
+    d.update({c: rng.random(n) * 10000 for c in _FLOAT_COLS})
+    df = pd.DataFrame(d)
+    df["Datum"] = (pd.Timestamp("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 2000, n)), unit="D")).strftime("%Y-%m-%d")
+    if text:
+        df[list(_INT_COLS + _FLOAT_COLS)] = df[list(_INT_COLS + _FLOAT_COLS)].astype(str)
+    return df
+
+
+def _pandas_reference(rows_df: pd.DataFrame, cfg: dict) -> Dict[str, float]:
+    """Termsummorna med en pandas-Series per term (referens för jämförelsen)."""
+    zero = pd.Series(0.0, index=rows_df.index)
+
+    def _col(name: str) -> pd.Series:
+        if name not in rows_df.columns:
+            return zero
+        return pd.to_numeric(rows_df[name].fillna(0), errors="coerce").fillna(0).astype(float)
+
+    L = S._labels(cfg)
+    M = _col("Män"); SV = _col("Svarta")
+    src = {"BD": _col("Bonus deltagit"), "PD": _col("Personal deltagit"), "P": _col(L["P"]), "G": _col(L["G"]),
+           "NV": _col(L["NV"]), "NF": _col(L["NF"]), "BE": _col(L["BE"]), "ES": _col(L["ES"])}
+    TID = _col("Summa tid (sek)"); TPK = _col("Tid per kille (sek)")
+    HAND = _col("Händer per kille (sek)"); HA = _col("Händer aktiv")
+    man_all = M + SV + sum(src.values())
+    tot = _col("Totalt Män") if "Totalt Män" in rows_df.columns else man_all
+    gb = M > 0
+    privat = (M == 0) & ((src["P"] > 0) | (src["G"] > 0) | (src["NV"] > 0) | (src["NF"] > 0))
+    has_ha = "Händer aktiv" in rows_df.columns
+    t = {
+        "n": zero + 1.0, "man_all": man_all, "tot": tot,
+        "cnt_gb": (gb | (SV > 0)), "cnt_privat": privat, "cnt_gb_vita": gb & (SV == 0),
+        "cnt_gb_svarta": (SV > 0) & (M == 0), "cnt_gb_blandat": gb & (SV > 0), "cnt_m": gb,
+        "cnt_scen": tot > 0, "sum_S": SV, "black_extra": (src["ES"] + src["BD"]).where(SV > 0, 0.0),
+        "alskar": _col("Älskar"), "sover": _col("Sover med"), "nils": _col("Nils"),
+        "ha_on": (HA > 0) if has_ha else zero, "ha_off": (HA <= 0) if has_ha else zero,
+        "tid": TID, "tid_d": _col("Tid D"), "tpk": TPK, "tpk_incl": TPK + HAND.where(HA > 0, 0.0),
+        "hak": _col("Hångel (sek/kille)"), "tot_gb": tot.where(gb, 0.0), "tot_privat": tot.where(privat, 0.0),
+        "tid_gb": TID.where(gb, 0.0), "tid_privat": TID.where(privat, 0.0),
+    }
+    for k, ser in src.items():
+        t[f"sum_{k}"] = ser
+        t[f"cnt_{k}"] = ser > 0
+    for name in S._SUMMED:
+        t[f"sum_{name}"] = _col(name)
+    return {k: float(v.sum()) for k, v in t.items()}
+
+
+def _best(fn: Callable[[], object], repeat: int) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark för statistikkärnan.")
+    p.add_argument("--rader", type=int, default=100_000)
+    p.add_argument("--upprepa", type=int, default=5)
+    p.add_argument("--text", action="store_true", help="Tal lagrade som text (som från Sheets)")
+    p.add_argument("--arbetare", type=int, default=0, help="Sektioner parallellt med N arbetare")
+    a = p.parse_args(argv)
+
+    df = make_rows(a.rader, text=a.text)
+    ref = _pandas_reference(df, _CFG)
+    ker = S._totals(df, _CFG)
+    bad = [k for k in S.TERMS if not np.isclose(ref[k], ker[k], rtol=1e-9, atol=1e-6)]
+    if bad:
+        print(f"Avvikande termer: {', '.join(bad)}")
+        return 1
+
+    t_ref = _best(lambda: _pandas_reference(df, _CFG), a.upprepa)
+    t_ker = _best(lambda: S._totals(df, _CFG), a.upprepa)
+    t_all = _best(lambda: S.compute_stats(df, _CFG, max_workers=1), a.upprepa)
+    print(f"{a.rader} rader{' (text)' if a.text else ''}, bästa av {a.upprepa}:")
+    print(f"  pandas-referens (termsummor)  {t_ref * 1000:9.1f} ms")
+    print(f"  kärna (termsummor)            {t_ker * 1000:9.1f} ms   ({t_ref / t_ker:.1f}x)")
+    print(f"  compute_stats (alla mått)    {t_all * 1000:9.1f} ms")
+    if a.arbetare > 1:
+        seq = S.compute_stats(df, _CFG, max_workers=1)
+        for label, kw in (("trådar", {}), ("processer", {"processes": True})):
+            if S.compute_stats(df, _CFG, max_workers=a.arbetare, **kw) != seq:
+                print(f"Avvikande resultat ({label})")
+                return 1
+            t_par = _best(lambda: S.compute_stats(df, _CFG, max_workers=a.arbetare, **kw), a.upprepa)
+            print(f"  compute_stats, {a.arbetare} {label:<10}{t_par * 1000:9.1f} ms   ({t_all / t_par:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
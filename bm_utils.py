@@ -1,6 +1,8 @@
 # bm_utils.py
 from typing import Dict, Any
 
+from settings import Settings
+
 def _to_float(x, default: float) -> float:
     """Robust konvertering: stöder '164', '1,64', 1.64, 164, None."""
     if x is None:
@@ -18,7 +20,11 @@ def compute_bm_fields(cfg: Dict[str, Any]) -> Dict[str, Any]:
     Returnerar {'BM mål', 'Mål vikt (kg)', 'Super bonus ack'} baserat på cfg.
     - Längd anges i cm (t.ex. 164). Om användaren råkar ange meter (<=3) konverteras det.
     - BM mål hämtas från cfg['BMI_GOAL'] och tillåter str/komma.
+    En Settings har värdena redan tolkade och målvikten förberäknad.
     """
+    if isinstance(cfg, Settings):
+        return {"BM mål": cfg.BMI_GOAL, "Mål vikt (kg)": cfg.target_weight, "Super bonus ack": cfg.SUPER_BONUS_ACC}
+
     # Längd
     height_cm = _to_float(cfg.get("HEIGHT_CM", 164), 164.0)
     if height_cm <= 3.0:  # användaren har angett meter (t.ex. 1.64)
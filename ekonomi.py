@@ -0,0 +1,172 @@
+# ekonomi.py — vektoriserad ekonomimotor (hårdhet, prenumeranter, intäkter, kostnad, lön, vinst)
+#
+# Samma regler som tidigare låg radvis i app.py (_hardhet_betyg/_econ_compute_betyg),
+# men beräknade för en hel DataFrame i ett svep. Slumpbidragen till hårdheten
+# dras från en seedad NumPy-RNG så att en omprissättning går att upprepa.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import numpy as np
+
+from settings import Settings
+
+if TYPE_CHECKING:
+    import pandas as pd  # laddas först när en hel DataFrame räknas (live-raden behöver den inte)
+
+ECON_COLS = [
+    "Hårdhet", "Prenumeranter", "Intäkter", "Intäkt Känner",
+    "Kostnad män", "Intäkt företag", "Lön Malin", "Vinst",
+]
+
+# (kolumn, randint-intervall inkl. övre gräns) – bidrag om kolumnen > 0
+_HARD_RAND = (("DP", 10, 20), ("DPP", 11, 22), ("DAP", 13, 26), ("TAP", 15, 30))
+
+
+def alder_from_cfg(cfg: dict) -> int:
+    try:
+        sd = cfg["startdatum"]; fd = cfg["fodelsedatum"]
+        return sd.year - fd.year - ((sd.month, sd.day) < (fd.month, fd.day))
+    except Exception:
+        return 30
+
+
+def _econ_params(cfg: dict) -> tuple:
+    """(het, ålder, avgift, intäkt/känner, personal, kostnad/h, lönandel, lön min, lön max) – tolkade en gång."""
+    if isinstance(cfg, Settings):  # redan typad och validerad
+        return (cfg.HET_BETYG, cfg.age, cfg.avgift_usd, cfg.ECON_REVENUE_PER_KANNER, cfg.PROD_STAFF,
+                cfg.ECON_COST_PER_HOUR, cfg.ECON_WAGE_SHARE_PCT / 100.0, cfg.ECON_WAGE_MIN, cfg.ECON_WAGE_MAX)
+    return (int(cfg.get("HET_BETYG", 35)), max(1, alder_from_cfg(cfg)), float(cfg.get("avgift_usd", 0.0)),
+            float(cfg.get("ECON_REVENUE_PER_KANNER", 30.0)), int(cfg.get("PROD_STAFF", 0)),
+            float(cfg.get("ECON_COST_PER_HOUR", 15.0)), float(cfg.get("ECON_WAGE_SHARE_PCT", 8.0)) / 100.0,
+            float(cfg.get("ECON_WAGE_MIN", 150.0)), float(cfg.get("ECON_WAGE_MAX", 800.0)))
+
+
+def _num(df: pd.DataFrame, name: str) -> np.ndarray:
+    import pandas as pd
+
+    if name not in df.columns:
+        return np.zeros(len(df), dtype=np.float64)
+    return pd.to_numeric(df[name], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+def economy_arrays(c: Dict[str, np.ndarray], is_vila: np.ndarray, cfg: dict, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Kärnan: alla in-/utdata är arrayer av samma längd. c innehåller DP, DPP,
+    DAP, TAP, Känner, Summa tid (sek), Män, Svarta, Bekanta, Esk och Totalt Män.
+    """
+    n = len(is_vila)
+    het, alder, avgift, rev_kanner, staff, cost_h, wage_share, wage_min, wage_max = _econ_params(cfg)
+
+    # Hårdhet = slumpbidrag (DP/DPP/DAP/TAP) + Het betyg / ålder; Vila = 0
+    hard = np.zeros(n, dtype=np.float64)
+    for col, lo, hi in _HARD_RAND:
+        draw = rng.integers(lo, hi + 1, size=n)
+        hard += np.where(c[col] > 0, draw, 0)
+    hard += het / float(alder)
+    hard = np.where(is_vila, 0.0, hard)
+
+    # Prenumeranter = (DP+DPP+DAP+TAP + Totalt Män) * hårdhet (round = bankers som Python)
+    base_count = c["DP"] + c["DPP"] + c["DAP"] + c["TAP"] + c["Totalt Män"]
+    pren = np.where(is_vila, 0.0, np.round(base_count * hard))
+    pren = np.maximum(0.0, pren)
+
+    intakter = pren * avgift
+    intakt_kanner = np.where(is_vila, 0.0, c["Känner"] * rev_kanner)
+
+    timmar = c["Summa tid (sek)"] / 3600.0
+    tot_personer = c["Män"] + c["Svarta"] + c["Bekanta"] + c["Esk"] + staff
+    kost = np.where(is_vila, 0.0, timmar * tot_personer * cost_h)
+
+    intakt_ftg = intakter - kost - intakt_kanner
+
+    # max(min, min(max, x)) – inte np.clip, som ger max om min > max
+    lon = np.maximum(wage_min, np.minimum(wage_max, wage_share * intakt_ftg))
+    lon = np.where(is_vila, 0.0, lon)
+
+    return {
+        "Hårdhet": hard,
+        "Prenumeranter": pren.astype(np.int64),
+        "Intäkter": intakter,
+        "Intäkt Känner": intakt_kanner,
+        "Kostnad män": kost,
+        "Intäkt företag": intakt_ftg,
+        "Lön Malin": lon,
+        "Vinst": intakt_ftg - lon,
+    }
+
+
+def _rng(rng: Optional[np.random.Generator], seed: Optional[int]) -> np.random.Generator:
+    return rng if rng is not None else np.random.default_rng(seed)
+
+
+def compute_economy(df: pd.DataFrame, cfg: dict, seed: Optional[int] = None, rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
+    """
+    Beräkna ekonomikolumnerna (ECON_COLS) för alla rader i df i ett svep.
+    Kräver radkolumnerna som sparas av appen (DP/DPP/DAP/TAP, Typ, Känner,
+    Summa tid (sek), Män, Svarta, källetiketter; 'Totalt Män' om den finns).
+    """
+    import pandas as pd
+
+    n = 0 if df is None else len(df)
+    if n == 0:
+        return pd.DataFrame(columns=ECON_COLS)
+
+    lbl_bek = cfg.get("LBL_BEKANTA", "Bekanta")
+    lbl_esk = cfg.get("LBL_ESK", "Eskilstuna killar")
+    c = {k: _num(df, k) for k in ("DP", "DPP", "DAP", "TAP", "Känner", "Summa tid (sek)", "Män", "Svarta")}
+    c["Bekanta"] = _num(df, lbl_bek)
+    c["Esk"] = _num(df, lbl_esk)
+
+    # Totalt Män från raden, annars summan av alla fält (som _fallback_tot_men)
+    fallback = (
+        c["Män"] + c["Svarta"] + c["Bekanta"] + c["Esk"]
+        + _num(df, cfg.get("LBL_PAPPAN", "Pappans vänner")) + _num(df, cfg.get("LBL_GRANNAR", "Grannar"))
+        + _num(df, cfg.get("LBL_NILS_VANNER", "Nils vänner")) + _num(df, cfg.get("LBL_NILS_FAMILJ", "Nils familj"))
+        + _num(df, "Bonus deltagit") + _num(df, "Personal deltagit")
+    )
+    if "Totalt Män" in df.columns:
+        tm = pd.to_numeric(df["Totalt Män"], errors="coerce").to_numpy(dtype=np.float64)
+        c["Totalt Män"] = np.where(np.isnan(tm), fallback, tm)
+    else:
+        c["Totalt Män"] = fallback
+
+    typ = df["Typ"].astype(str) if "Typ" in df.columns else pd.Series([""] * n)
+    is_vila = typ.str.contains("Vila", regex=False).to_numpy()
+
+    out = economy_arrays(c, is_vila, cfg, _rng(rng, seed))
+    return pd.DataFrame(out, index=df.index, columns=ECON_COLS)
+
+
+def reprice_history(rows_df: pd.DataFrame, cfg: dict, seed: Optional[int] = None) -> pd.DataFrame:
+    """Kopia av rows_df med ekonomikolumnerna omräknade efter nuvarande cfg."""
+    if rows_df is None or rows_df.empty:
+        import pandas as pd
+
+        return pd.DataFrame() if rows_df is None else rows_df.copy()
+    out = rows_df.copy()
+    econ = compute_economy(out, cfg, seed=seed)
+    for col in ECON_COLS:
+        out[col] = econ[col]
+    return out
+
+
+def economy_for_row(base: Dict[str, Any], preview: Dict[str, Any], cfg: dict, tot_man: int, rng: Optional[np.random.Generator] = None) -> Dict[str, Any]:
+    """En rad (live-förhandsvisning) genom samma motor. Returnerar python-skalärer."""
+    def _i(d, k):
+        try:
+            return float(int(d.get(k, 0)))
+        except Exception:
+            return 0.0
+
+    c = {k: np.array([_i(base, k)]) for k in ("DP", "DPP", "DAP", "TAP", "Känner", "Män", "Svarta")}
+    c["Bekanta"] = np.array([_i(base, cfg["LBL_BEKANTA"])])
+    c["Esk"] = np.array([_i(base, cfg["LBL_ESK"])])
+    c["Summa tid (sek)"] = np.array([float(preview.get("Summa tid (sek)", 0))])
+    c["Totalt Män"] = np.array([float(int(tot_man))])
+    is_vila = np.array(["Vila" in str(base.get("Typ", ""))])
+
+    out = economy_arrays(c, is_vila, cfg, _rng(rng, None))
+    res = {k: float(v[0]) for k, v in out.items()}
+    res["Prenumeranter"] = int(out["Prenumeranter"][0])
+    return res
@@ -0,0 +1,179 @@
+# generering.py — generera och spara N nya scener i ett svep (utan Streamlit)
+#
+# Kedjan per scen är densamma som "Hämta värden" → "Spara" i appen:
+#   scenario_gen (indata) -> berakningar.calc_row_values (tider/summor)
+#   -> ekonomi (hårdhet/prenumeranter/lön) -> tvingad schemaläggning
+#   -> bonus-/superbonus-ackumulering
+# Indata slumpas vektoriserat per chunk; schema och bonus stegas radvis eftersom
+# varje scen beror på föregående. Färdiga chunkar strömmas (valfritt) till
+# Sheets via batch-append; annars finns raderna bara i det som returneras.
+
+from __future__ import annotations
+import time as _time
+from datetime import datetime, time, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import sheets_utils as SU
+from berakningar import calc_row_values
+from ekonomi import economy_for_row
+from scenario_gen import DEFAULT_MIX, SCENARIOS, VILA_HEMMA, generate
+
+_VECKODAGAR = ["Måndag", "Tisdag", "Onsdag", "Torsdag", "Fredag", "Lördag", "Söndag"]
+_LBL_KEYS = ("LBL_PAPPAN", "LBL_GRANNAR", "LBL_NILS_VANNER", "LBL_NILS_FAMILJ", "LBL_BEKANTA", "LBL_ESK")
+_MAX_KEYS = ("MAX_PAPPAN", "MAX_GRANNAR", "MAX_NILS_VANNER", "MAX_NILS_FAMILJ", "MAX_BEKANTA")
+
+
+def next_start(start_dt: datetime, summa_sec: float, alskar: int, sover: int, sleep_h: float) -> datetime:
+    """Tvingad nästa start (samma regel som _compute_end_and_next i appen)."""
+    end_incl = start_dt + timedelta(seconds=summa_sec + 3600 + 10800 + (alskar + sover) * 20 * 60)
+    end_sleep = end_incl + timedelta(hours=float(sleep_h))
+    if end_sleep.date() > start_dt.date():
+        if end_sleep.time() <= time(7, 0):
+            return datetime.combine(end_sleep.date(), time(7, 0))
+        if end_sleep.minute == 0 and end_sleep.second == 0 and end_sleep.microsecond == 0:
+            return end_sleep
+        return end_sleep.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return datetime.combine(start_dt.date() + timedelta(days=1), time(7, 0))
+
+
+def _base_row(inp: Dict[str, int], typ: str, scen: int, start_dt: datetime, profile: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Som build_base_from_inputs, men från en genererad rad i stället för formuläret."""
+    d = start_dt.date()
+    base: Dict[str, Any] = {"Profil": profile, "Datum": d.isoformat(), "Veckodag": _VECKODAGAR[d.weekday()], "Scen": scen, "Typ": typ}
+    base.update(inp)
+    base["Händer aktiv"] = 1
+    base["Avgift"] = float(cfg.get("avgift_usd", 0.0))
+    base["PROD_STAFF"] = int(cfg.get("PROD_STAFF", 0))
+    for k in _MAX_KEYS:
+        base[k] = int(cfg.get(k, 0))
+    for k in _LBL_KEYS:
+        base[k] = cfg[k]
+    base["Mål tid/kille (min)"] = 7.0
+    base["Känner"] = (
+        int(inp[cfg["LBL_PAPPAN"]]) + int(inp[cfg["LBL_GRANNAR"]]) +
+        int(inp[cfg["LBL_NILS_VANNER"]]) + int(inp[cfg["LBL_NILS_FAMILJ"]])
+    )
+    return base
+
+
+def _pick(rows: Dict[str, np.ndarray], i: int) -> Dict[str, int]:
+    return {k: int(v[i]) for k, v in rows.items()}
+
+
+def generate_scenes(
+    hist: Dict[str, Any],
+    cfg: Dict[str, Any],
+    start_dt: datetime,
+    n: int,
+    profile: str = "",
+    first_scen: int = 1,
+    mix: Optional[Dict[str, float]] = None,
+    force_vila_after_days: Optional[int] = None,
+    days_since_vila: int = 0,
+    seed: Optional[int] = None,
+    chunk_size: int = 500,
+) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Generera n kompletta rader (som 'Spara raden' bygger dem), i chunkar.
+    Yieldar (rader, läge) där läge = {"next_start", BONUS_AVAILABLE, SUPER_BONUS_ACC}
+    efter chunken. cfg ändras inte.
+    """
+    mix = dict(mix or DEFAULT_MIX)
+    bad = [k for k in mix if k not in SCENARIOS]
+    if bad:
+        raise ValueError(f"Okända scenarion: {', '.join(bad)}")
+    names = list(mix)
+    probs = np.array([mix[k] for k in names], dtype=np.float64)
+    probs = probs / probs.sum()
+
+    rng = np.random.default_rng(seed)
+    sleep_h = float(cfg.get("EXTRA_SLEEP_H", 7))
+    fodelsedatum = cfg["fodelsedatum"]
+    bonus_pct = float(cfg.get("BONUS_PCT", 1.0)) / 100.0
+    sb_pct = float(cfg.get("SUPER_BONUS_PCT", 0.1)) / 100.0
+    bonus_left = int(cfg.get("BONUS_AVAILABLE", 0))
+    super_acc = int(cfg.get("SUPER_BONUS_ACC", 0))
+
+    cur = start_dt
+    last_vila = start_dt.date() - timedelta(days=int(days_since_vila))
+    scen = int(first_scen)
+    done = 0
+    while done < n:
+        m = min(int(chunk_size), n - done)
+        # Indata för hela chunken per scenario; Vila i hemmet separat för tvingade scener
+        types = rng.choice(names, size=m, p=probs)
+        fills = {t: generate(t, hist, cfg, rng, n=m) for t in set(types.tolist()) | {VILA_HEMMA}}
+
+        out: List[Dict[str, Any]] = []
+        for i in range(m):
+            typ = str(types[i])
+            if force_vila_after_days and (cur.date() - last_vila).days >= int(force_vila_after_days):
+                typ = VILA_HEMMA
+            inp = _pick(fills[typ], i)
+            if typ == "Super bonus":
+                inp["Svarta"] = super_acc
+
+            base = _base_row(inp, typ, scen, cur, profile, cfg)
+            preview = calc_row_values(base, cur.date(), fodelsedatum, cur.time())
+            preview.update(economy_for_row(base, preview, cfg, int(preview.get("Totalt Män", 0)), rng=rng))
+
+            row = dict(base)
+            row.update(preview)
+            row["Sömn (h)"] = sleep_h
+            out.append(row)
+
+            # _after_save_housekeeping
+            is_vila = "Vila" in typ
+            pren = int(row.get("Prenumeranter", 0))
+            add_bonus = 0 if (is_vila or typ == "Super bonus") else int(pren * bonus_pct)
+            add_super = 0 if (is_vila or typ == "Super bonus") else int(pren * sb_pct)
+            bonus_left = max(0, bonus_left - int(row.get("Bonus deltagit", 0)) + add_bonus)
+            super_acc = max(0, super_acc + add_super)
+
+            if typ == VILA_HEMMA:
+                last_vila = cur.date()
+            cur = next_start(cur, float(preview.get("Summa tid (sek)", 0)), int(base["Älskar"]), int(base["Sover med"]), sleep_h)
+            scen += 1
+
+        done += m
+        yield out, {"next_start": cur, "BONUS_AVAILABLE": bonus_left, "SUPER_BONUS_ACC": super_acc}
+
+
+def generate_and_save(
+    profile: str,
+    hist: Dict[str, Any],
+    cfg: Dict[str, Any],
+    start_dt: datetime,
+    n: int,
+    to_sheets: bool = True,
+    chunk_size: int = 200,
+    progress: Optional[Callable[[int, int, float], None]] = None,
+    **gen_kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Generera n scener och strömma dem till lagringen chunk för chunk:
+      to_sheets=True  -> append_rows_to_profile_data_batch (köas offline, speglas lokalt)
+      to_sheets=False -> ingenting skrivs; raderna finns bara i resultatet (som
+                         "Spara raden (lokalt)" – anroparen håller dem i sessionen)
+    progress(klara, totalt, sekunder) anropas efter varje chunk.
+    Bonus/superbonus sparas till profilens inställningar på slutet.
+    Returnerar {"rows", "next_start", "cfg", "seconds"} där rows är de skapade raderna.
+    """
+    t0 = _time.perf_counter()
+    created: List[Dict[str, Any]] = []
+    state: Dict[str, Any] = {"next_start": start_dt}
+    for chunk, state in generate_scenes(hist, cfg, start_dt, n, profile=profile, chunk_size=chunk_size, **gen_kwargs):
+        if to_sheets:
+            SU.append_rows_to_profile_data_batch(profile, chunk, chunk_size=chunk_size)
+        created.extend(chunk)
+        if progress is not None:
+            progress(len(created), n, _time.perf_counter() - t0)
+
+    new_cfg = dict(cfg)
+    new_cfg["BONUS_AVAILABLE"] = state.get("BONUS_AVAILABLE", cfg.get("BONUS_AVAILABLE", 0))
+    new_cfg["SUPER_BONUS_ACC"] = state.get("SUPER_BONUS_ACC", cfg.get("SUPER_BONUS_ACC", 0))
+    if created and profile:
+        SU.save_profile_settings(profile, new_cfg)
+    return {"rows": created, "next_start": state["next_start"], "cfg": new_cfg, "seconds": _time.perf_counter() - t0}
@@ -0,0 +1,51 @@
+# importprofil.py — sammanfatta ett "python -X importtime"-logg (kallstart av appen)
+#
+#   python -X importtime -m streamlit run app.py 2> import.log
+#   python importprofil.py import.log [--topp 25] [--alla]
+#
+# Visar de moduler som kostar mest (kumulativ tid). Utan --alla visas bara
+# moduler på toppnivå (de som importeras direkt, inte deras underberoenden).
+
+from __future__ import annotations
+import argparse
+import re
+from typing import List, Optional, Tuple
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse(path: str) -> List[Tuple[str, int, int, int]]:
+    """-> [(modul, self_us, kumulativ_us, djup)]"""
+    out = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m = _LINE.match(line)
+            if not m:
+                continue
+            self_us, cum_us, indent, name = m.groups()
+            out.append((name, int(self_us), int(cum_us), (len(indent) - 1) // 2))
+    return out
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Topplista över importtid från python -X importtime.")
+    p.add_argument("logg")
+    p.add_argument("--topp", type=int, default=25)
+    p.add_argument("--alla", action="store_true", help="Ta med underberoenden")
+    a = p.parse_args(argv)
+
+    rows = parse(a.logg)
+    if not a.alla:
+        rows = [r for r in rows if r[3] == 0]
+    total_ms = sum(r[2] for r in parse(a.logg) if r[3] == 0) / 1000.0
+    rows.sort(key=lambda r: r[2], reverse=True)
+
+    print(f"{'modul':<45} {'kumulativ ms':>13} {'egen ms':>9}")
+    for name, self_us, cum_us, _ in rows[: a.topp]:
+        print(f"{name:<45} {cum_us / 1000.0:>13.1f} {self_us / 1000.0:>9.1f}")
+    print(f"\nTotalt (toppnivå): {total_ms:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
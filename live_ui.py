@@ -1,10 +1,29 @@
-# live_ui.py
+# live_ui.py — live-panelen: vymodell (build_live_view) + renderare (render_live)
+#
+# build_live_view räknar fram allt panelen visar EN gång ur förhandsraden,
+# basraden och CFG: tider, tvingad nästa start, mål tid/kille, totalsiffror och
+# färdigformaterade värden. Resultatet memoiseras på indata (hash av de fält som
+# används), så en omritning utan ändrade inmatningar bara slår upp vymodellen.
+# render_live läser bara vymodellen och kan därför köras om fristående (t.ex. i
+# ett st.fragment) utan att något räknas om.
 from __future__ import annotations
-from typing import Dict, Any, Optional
-from datetime import datetime, date
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, date, time, timedelta
 
 import streamlit as st
 
+# hash av indata -> vymodell (delas, får inte muteras)
+_VIEWS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_VIEWS_MAX = 64
+_LOCK = threading.Lock()
+
+# Källfälten (etikettnycklar i CFG) som räknas in i "Totalt män" när beräkningen saknar det
+_SOURCE_LBL = ("LBL_PAPPAN", "LBL_GRANNAR", "LBL_NILS_VANNER", "LBL_NILS_FAMILJ", "LBL_BEKANTA", "LBL_ESK")
+
 
 def _safe_int(x, default=0) -> int:
     try:
@@ -23,151 +42,177 @@ def _safe_float(x, default=0.0) -> float:
         return default
 
 
-def _compute_age(on_date: date, birth_date: date) -> int:
+def _mmss(total_seconds: float) -> str:
     try:
-        return on_date.year - birth_date.year - (
-            (on_date.month, on_date.day) < (birth_date.month, birth_date.day)
-        )
-    except Exception:
-        return 0
+        s = max(0, int(round(total_seconds))); m, s = divmod(s, 60); return f"{m}:{s:02d}"
+    except Exception: return "-"
 
 
-def _parse_iso_date(s: str) -> Optional[date]:
-    try:
-        return datetime.fromisoformat(s).date()
-    except Exception:
-        return None
+def _usd(x) -> str:
+    return f"${_safe_float(x):,.2f}"
+
 
+def tot_men_fallback(base: Dict[str, Any], cfg: Dict[str, Any]) -> int:
+    """Egen totalsiffra inkl alla fält (om beräkningsmodulen inte gav 'Totalt Män')."""
+    keys = ["Män", "Svarta", "Bonus deltagit", "Personal deltagit"] + [cfg[k] for k in _SOURCE_LBL]
+    return sum(_safe_int(base.get(k, 0)) for k in keys)
 
-def render_live(base: Dict[str, Any], preview: Dict[str, Any], cfg: Dict[str, Any], rows_df=None) -> None:
+
+# =============================
+# Tvingad schemaläggning
+# =============================
+
+def _ceil_to_next_hour(dt: datetime) -> datetime:
+    if dt.minute==0 and dt.second==0 and dt.microsecond==0:
+        return dt
+    return dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+def compute_end_and_next(start_dt: datetime, base: dict, preview: dict, sleep_h: float):
+    """(slut inkl älskar/sover, slut inkl sömn, nästa tvingade start)."""
+    summa_sec = float(preview.get("Summa tid (sek)", 0.0))
+    alskar = int(base.get("Älskar",0)); sover = int(base.get("Sover med",0))
+    # Klockan = summa + 1h vila + 3h hångel
+    end_dt = start_dt + timedelta(seconds = summa_sec + 3600 + 10800)
+    # Klockan inkl älskar/sover
+    end_incl = end_dt + timedelta(seconds=(alskar+sover)*20*60)
+    # + sömn
+    end_sleep = end_incl + timedelta(hours=float(sleep_h))
+
+    # Nästa start (tvingad)
+    if end_sleep.date() > start_dt.date():
+        base7 = datetime.combine(end_sleep.date(), time(7,0))
+        next_start = base7 if end_sleep.time() <= time(7,0) else _ceil_to_next_hour(end_sleep)
+    else:
+        # Samma datum -> nästa dag 07:00
+        next_start = datetime.combine(start_dt.date() + timedelta(days=1), time(7,0))
+    return end_incl, end_sleep, next_start
+
+
+# =============================
+# Vymodell
+# =============================
+
+# Fält ur basrad/förhandsrad som vymodellen läser (styr memoiseringen)
+_BASE_FIELDS = ("Män", "Svarta", "Bonus deltagit", "Personal deltagit", "Älskar", "Sover med",
+                "Händer aktiv", "Nils", "Mål tid/kille (min)")
+_PREVIEW_FIELDS = ("Klockan", "Klockan inkl älskar/sover", "Summa tid (sek)", "Totalt Män", "Hårdhet",
+                   "Tid per kille (sek)", "Händer per kille (sek)", "Prenumeranter", "Intäkter",
+                   "Kostnad män", "Intäkt Känner", "Intäkt företag", "Lön Malin", "Vinst")
+
+
+def _view_key(base, preview, cfg, start_dt, sleep_h, nils_history, last_vila) -> str:
+    src = [base.get(cfg[k], 0) for k in _SOURCE_LBL]
+    parts = ([base.get(k) for k in _BASE_FIELDS], src, [preview.get(k) for k in _PREVIEW_FIELDS],
+             cfg.get("SUPER_BONUS_ACC", 0), start_dt, sleep_h, nils_history, last_vila)
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+Metric = Tuple[str, Any]
+
+
+def build_live_view(base: Dict[str, Any], preview: Dict[str, Any], cfg: Dict[str, Any], start_dt: datetime,
+                    sleep_h: float, nils_history: int = 0, last_vila: Optional[date] = None) -> Dict[str, Any]:
     """
-    Ritar upp liven. Kräver:
+    Vymodellen för live-panelen. Kräver:
       - base: rå-inputrad (med käll-etiketter redan mappade till labels)
-      - preview: resultatet från calc_row_values(...)
-      - cfg: nuvarande inställningar (inkl etiketter, BM-mål, Mål vikt, BONUS osv.)
-      - rows_df: valfri DataFrame med samtliga rader (används ej här men finns för framtida behov)
+      - preview: calc_row_values(...) + ekonomi (economy_for_row)
+      - cfg: nuvarande inställningar (etiketter, SUPER_BONUS_ACC)
+      - start_dt / sleep_h: tvingad start och sömn efter scenen
+      - nils_history: summa Nils över sparade rader
+      - last_vila: datum för senaste 'Vila i hemmet' (None = ingen)
+    Nycklar: sections (rubrik, rader av kolumner av (etikett, värde)), warning,
+    end_incl, end_sleep, forced_next, nils_total, vila_days.
     """
-
-    # ------ Etiketter från cfg (med fallback) ------
-    LBL_PAPPAN = str(cfg.get("LBL_PAPPAN", "Pappans vänner"))
-    LBL_GRANNAR = str(cfg.get("LBL_GRANNAR", "Grannar"))
-    LBL_NV = str(cfg.get("LBL_NILS_VANNER", "Nils vänner"))
-    LBL_NF = str(cfg.get("LBL_NILS_FAMILJ", "Nils familj"))
-    LBL_BEK = str(cfg.get("LBL_BEKANTA", "Bekanta"))
-    LBL_ESK = str(cfg.get("LBL_ESK", "Eskilstuna killar"))
-
-    # ------ Datum / Ålder ------
-    rad_datum_str = preview.get("Datum", base.get("Datum", ""))
-    veckodag = preview.get("Veckodag", "-")
-
-    if isinstance(rad_datum_str, str):
-        _d = _parse_iso_date(rad_datum_str) or date.today()
-    elif isinstance(rad_datum_str, date):
-        _d = rad_datum_str
+    key = _view_key(base, preview, cfg, start_dt, sleep_h, nils_history, last_vila)
+    with _LOCK:
+        hit = _VIEWS.get(key)
+        if hit is not None:
+            _VIEWS.move_to_end(key)
+            return hit
+
+    end_incl, end_sleep, forced_next = compute_end_and_next(start_dt, base, preview, sleep_h)
+
+    # Mål tid/kille (exkl. händer) – föreslå extra sekunder till DP/DPP/DAP resp. TAP.
+    # Antaganden: +X s i "DP/DPP/DAP-tid" ger ca +2X s i tid/kille (exkl händer),
+    # och +Y s i "TAP-tid" ger ca +3Y s i tid/kille.
+    tpk_ex = _safe_float(preview.get("Tid per kille (sek)", 0.0))
+    target_min = _safe_float(base.get("Mål tid/kille (min)", 7.0), 7.0)
+    gap_sec = max(0.0, max(0.0, target_min * 60.0) - tpk_ex)
+    hander = _safe_float(preview.get("Händer per kille (sek)", 0.0))
+    tpk_incl = tpk_ex + (hander if _safe_int(base.get("Händer aktiv", 1), 1) == 1 else 0)
+    tot_men = _safe_int(preview["Totalt Män"]) if "Totalt Män" in preview else tot_men_fallback(base, cfg)
+
+    sections: List[Tuple[Optional[str], List[List[List[Metric]]]]] = [
+        (None, [
+            [[("Klockan", preview.get("Klockan", "-"))],
+             [("Klockan + älskar/sover med", preview.get("Klockan inkl älskar/sover", "-"))],
+             [("Sömn (h)", sleep_h)]],
+            [[("Start (tvingad)", start_dt.strftime("%Y-%m-%d %H:%M"))],
+             [("Slut inkl älskar/sover", end_incl.strftime("%Y-%m-%d %H:%M"))],
+             [("Nästa scen start (T V I N G A D)", forced_next.strftime("%Y-%m-%d %H:%M"))]],
+            [[("Summa tid (timmar:minuter)", _mmss(_safe_float(preview.get("Summa tid (sek)", 0))))],
+             [("Totalt män", tot_men)],
+             [("Hårdhet (betyg)", f"{_safe_float(preview.get('Hårdhet', 0.0)):.2f}")]],
+            [[("Tid/kille ex händer", _mmss(tpk_ex))],
+             [("Tid/kille inkl händer", _mmss(tpk_incl))],
+             [("Mål tid/kille (min)", target_min)]],
+            [[("Behöver +sek (DP/DPP/DAP)", int(round(gap_sec / 2.0)) if gap_sec > 0 else 0)],
+             [("Behöver +sek (TAP)", int(round(gap_sec / 3.0)) if gap_sec > 0 else 0)]],
+        ]),
+        ("💵 Ekonomi (live)", [[
+            [("Prenumeranter (rad)", _safe_int(preview.get("Prenumeranter", 0))), ("Intäkter", _usd(preview.get("Intäkter", 0)))],
+            [("Kostnad män", _usd(preview.get("Kostnad män", 0))), ("Intäkt Känner", _usd(preview.get("Intäkt Känner", 0)))],
+            [("Intäkt företag", _usd(preview.get("Intäkt företag", 0))), ("Lön Malin", _usd(preview.get("Lön Malin", 0)))],
+            [("Vinst", _usd(preview.get("Vinst", 0))), ("Super bonus ack", _safe_int(cfg.get("SUPER_BONUS_ACC", 0)))],
+        ]]),
+    ]
+
+    view = {
+        "sections": sections,
+        "warning": ("Scenen har pågått väldigt länge (>36 timmar) innan sömn. Nästa start är tvingad enligt reglerna."
+                    if (end_incl - start_dt) > timedelta(hours=36) else None),
+        "end_incl": end_incl, "end_sleep": end_sleep, "forced_next": forced_next,
+        "nils_total": _safe_int(base.get("Nils", 0)) + int(nils_history),
+        # Dagar räknas mot SIMULERAT 'idag' = scenens tvingade startdatum
+        "vila_days": (start_dt.date() - last_vila).days if last_vila else None,
+    }
+    with _LOCK:
+        _VIEWS[key] = view
+        while len(_VIEWS) > _VIEWS_MAX:
+            _VIEWS.popitem(last=False)
+    return view
+
+
+# =============================
+# Renderare
+# =============================
+
+def render_live(view: Dict[str, Any]) -> None:
+    """Ritar upp liven ur build_live_view(); räknar ingenting själv."""
+    if view["warning"]:
+        st.warning(view["warning"])
+
+    for title, rows in view["sections"]:
+        if title:
+            st.markdown(f"**{title}**")
+        for row in rows:
+            for col, metrics in zip(st.columns(len(row)), row):
+                with col:
+                    for label, value in metrics:
+                        st.metric(label, value)
+
+    # ===== Nils – längst ner i liven =====
+    st.markdown("**👤 Nils (live)**")
+    st.metric("Nils (total)", view["nils_total"])
+
+    # ===== Senaste "Vila i hemmet" =====
+    days = view["vila_days"]
+    if days is not None:
+        st.markdown(f"**🛏️ Senaste 'Vila i hemmet': {days} dagar sedan (simulerat)**")
+        if days >= 21:
+            st.error(f"⚠️ Dags för semester! Det var {days} dagar sedan senaste 'Vila i hemmet'.")
     else:
-        _d = date.today()
-
-    fd = cfg.get("fodelsedatum", date(1970, 1, 1))
-    alder = _compute_age(_d, fd)
-
-    st.markdown(f"**Datum/Veckodag:** {rad_datum_str} / {veckodag} &nbsp;•&nbsp; **Ålder:** {alder} år")
-
-    # ------ “Totalt män inkl allt” (kontroll) ------
-    tot_men_including = (
-        _safe_int(base.get("Män", 0))
-        + _safe_int(base.get("Svarta", 0))
-        + _safe_int(base.get(LBL_PAPPAN, 0))
-        + _safe_int(base.get(LBL_GRANNAR, 0))
-        + _safe_int(base.get(LBL_NV, 0))
-        + _safe_int(base.get(LBL_NF, 0))
-        + _safe_int(base.get(LBL_BEK, 0))
-        + _safe_int(base.get(LBL_ESK, 0))
-        + _safe_int(base.get("Bonus deltagit", 0))
-        + _safe_int(base.get("Personal deltagit", 0))
-    )
-
-    # ------ Överkant: Tid/Klocka/Män ------
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        st.metric("Summa tid", preview.get("Summa tid", "-"))
-        st.metric("Summa tid (sek)", _safe_int(preview.get("Summa tid (sek)", 0)))
-    with c2:
-        st.metric("Tid/kille", preview.get("Tid per kille", "-"))  # mm:ss
-        st.metric("Tid/kille (sek)", _safe_int(preview.get("Tid per kille (sek)", 0)))
-    with c3:
-        st.metric("Klockan", preview.get("Klockan", "-"))
-        st.metric("Totalt män (beräkningar)", _safe_int(preview.get("Totalt Män", 0)))
-
-    # ------ Hångel / Suger / Händer ------
-    c4, c5, c6 = st.columns(3)
-    with c4:
-        st.metric("Hångel (m:s/kille)", preview.get("Hångel (m:s/kille)", "-"))
-        st.metric("Hångel (sek/kille)", _safe_int(preview.get("Hångel (sek/kille)", 0)))
-    with c5:
-        st.metric("Suger/kille (sek)", _safe_float(preview.get("Suger per kille (sek)", 0)))
-        st.metric("Händer aktiv", "Ja" if _safe_int(preview.get("Händer aktiv", 0)) else "Nej")
-    with c6:
-        st.metric("Händer/kille (sek)", _safe_float(preview.get("Händer per kille (sek)", 0)))
-        st.metric("Totalt män (inkl. källor/bonus/personal/Eskilstuna)", tot_men_including)
-
-    # ------ Ekonomi ------
-    st.markdown("**💵 Ekonomi (live)**")
-    e1, e2, e3, e4 = st.columns(4)
-    with e1:
-        st.metric("Prenumeranter", _safe_int(preview.get("Prenumeranter", 0)))
-        st.metric("Hårdhet", _safe_int(preview.get("Hårdhet", 0)))
-    with e2:
-        st.metric("Intäkter", f"${_safe_float(preview.get('Intäkter', 0.0)):,.2f}")
-        st.metric("Intäkt Känner", f"${_safe_float(preview.get('Intäkt Känner', 0.0)):,.2f}")
-    with e3:
-        # Kostnad män kan heta "Kostnad män" (ny) eller "Utgift män" (gammalt)
-        kostnad_man = preview.get("Kostnad män", preview.get("Utgift män", 0.0))
-        st.metric("Kostnad män", f"${_safe_float(kostnad_man):,.2f}")
-        st.metric("Lön Malin", f"${_safe_float(preview.get('Lön Malin', 0.0)):,.2f}")
-    with e4:
-        # Visar både “Intäkt företag” och “Vinst”
-        st.metric("Intäkt företag", f"${_safe_float(preview.get('Intäkt företag', 0.0)):,.2f}")
-        st.metric("Vinst", f"${_safe_float(preview.get('Vinst', 0.0)):,.2f}")
-
-    # ------ BM-mål / Mål vikt ------
-    st.markdown("**🧮 BM & mål**")
-    bm1, bm2, bm3 = st.columns(3)
-    with bm1:
-        bm_mal = cfg.get("BM-mål", cfg.get("BM_MAL", None))
-        st.metric("BM-mål (snitt)", f"{_safe_float(bm_mal):.2f}" if bm_mal is not None else "-")
-    with bm2:
-        mv = cfg.get("Mål vikt", cfg.get("MAL_VIKT", None))
-        st.metric("Mål vikt (kg)", f"{_safe_float(mv):.2f}" if mv is not None else "-")
-    with bm3:
-        st.metric("Älskar (sek)", _safe_int(preview.get("Tid Älskar (sek)", 0)))
-
-    # ------ Bonus / Super bonus ------
-    st.markdown("**🎯 Bonus & Super bonus**")
-    b1, b2, b3, b4 = st.columns(4)
-    with b1:
-        st.metric("Bonus kvar", _safe_int(cfg.get("BONUS_AVAILABLE", 0)))
-    with b2:
-        st.metric("Bonus % (decimal)", _safe_float(cfg.get("BONUS_PCT", 0.0)))
-    with b3:
-        st.metric("Super bonus ack", _safe_int(cfg.get("SUPER_BONUS_ACC", 0)))
-    with b4:
-        st.metric("Super bonus % (decimal)", _safe_float(cfg.get("SUPER_BONUS_PCT", 0.0)))
-
-    # ------ Källor (etiketter) ------
-    st.markdown("**👥 Källor (live)**")
-    k1, k2, k3, k4, k5, k6 = st.columns(6)
-    with k1:
-        st.metric(LBL_PAPPAN, _safe_int(base.get(LBL_PAPPAN, 0)))
-    with k2:
-        st.metric(LBL_GRANNAR, _safe_int(base.get(LBL_GRANNAR, 0)))
-    with k3:
-        st.metric(LBL_NV, _safe_int(base.get(LBL_NV, 0)))
-    with k4:
-        st.metric(LBL_NF, _safe_int(base.get(LBL_NF, 0)))
-    with k5:
-        st.metric(LBL_BEK, _safe_int(base.get(LBL_BEK, 0)))
-    with k6:
-        st.metric(LBL_ESK, _safe_int(base.get(LBL_ESK, 0)))
-
-    st.caption("Obs: Älskar/Sover-med-tider ingår inte i scenens 'Summa tid', men påverkar klockan. "
-               "Händer per kille visas separat och påverkar inte 'Tid/kille' i denna vy.")
+        st.info("Ingen 'Vila i hemmet' hittad ännu.")
+
+    st.caption("Obs: Vila-scenarion genererar inga prenumeranter, intäkter, kostnader eller lön. Bonus kvar minskas dock med 'Bonus deltagit'.")
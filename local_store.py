@@ -0,0 +1,455 @@
+# local_store.py — lokal cache (SQLite) för profiler, inställningar, data + skrivkö
+#
+# Används av sheets_utils som write-through-cache och som källa i offline-läge.
+# Skrivningar som inte når Sheets läggs i 'outbox' och synkas senare i ordning.
+# Katalog: env MALIN_CACHE_DIR, annars .malin_cache/ bredvid appen.
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+_LOCK = threading.RLock()
+_CONN: Optional[sqlite3.Connection] = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (pos INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (profile TEXT PRIMARY KEY, payload TEXT NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS data_rows (
+    profile TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL,
+    PRIMARY KEY (profile, seq)
+);
+CREATE TABLE IF NOT EXISTS data_meta (profile TEXT PRIMARY KEY, synced REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL, profile TEXT NOT NULL, payload TEXT NOT NULL,
+    created REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS outbox_dead (
+    id INTEGER PRIMARY KEY, kind TEXT NOT NULL, profile TEXT NOT NULL, payload TEXT NOT NULL,
+    created REAL NOT NULL, attempts INTEGER NOT NULL, last_error TEXT, dropped REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS row_index (
+    sheet TEXT NOT NULL, title TEXT NOT NULL, profile TEXT NOT NULL,
+    start INTEGER NOT NULL, stop INTEGER NOT NULL,
+    PRIMARY KEY (sheet, title, profile, start)
+);
+CREATE TABLE IF NOT EXISTS rollup (
+    profile TEXT NOT NULL, layout TEXT NOT NULL, day TEXT NOT NULL, payload TEXT NOT NULL,
+    PRIMARY KEY (profile, layout, day)
+);
+CREATE TABLE IF NOT EXISTS rollup_meta (
+    profile TEXT NOT NULL, layout TEXT NOT NULL, labels TEXT NOT NULL, upto INTEGER NOT NULL,
+    PRIMARY KEY (profile, layout)
+);
+CREATE TABLE IF NOT EXISTS row_index_meta (
+    sheet TEXT NOT NULL, title TEXT NOT NULL, scanned INTEGER NOT NULL, grid INTEGER NOT NULL,
+    PRIMARY KEY (sheet, title)
+);
+"""
+
+
+def cache_dir() -> str:
+    d = os.environ.get("MALIN_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".malin_cache")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _conn() -> sqlite3.Connection:
+    global _CONN
+    with _LOCK:
+        if _CONN is None:
+            c = sqlite3.connect(os.path.join(cache_dir(), "store.sqlite3"), check_same_thread=False, timeout=30)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.executescript(_SCHEMA)
+            _CONN = c
+        return _CONN
+
+
+def _dumps(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False, default=str)
+
+
+# =============================
+# Profiler
+# =============================
+
+def put_profiles(names: List[str]) -> None:
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute("DELETE FROM profiles")
+            c.executemany("INSERT INTO profiles(pos, name) VALUES (?, ?)", list(enumerate(names)))
+
+
+def get_profiles() -> List[str]:
+    with _LOCK:
+        return [r[0] for r in _conn().execute("SELECT name FROM profiles ORDER BY pos")]
+
+
+# =============================
+# Inställningar (lagras JSON-skrivbart; typning görs av anroparen)
+# =============================
+
+def put_settings(profile: str, cfg: Dict[str, Any]) -> None:
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute(
+                "INSERT OR REPLACE INTO settings(profile, payload, updated) VALUES (?, ?, ?)",
+                (profile, _dumps(cfg), time.time()),
+            )
+
+
+def get_settings(profile: str) -> Optional[Dict[str, Any]]:
+    with _LOCK:
+        r = _conn().execute("SELECT payload FROM settings WHERE profile = ?", (profile,)).fetchone()
+    return json.loads(r[0]) if r else None
+
+
+# =============================
+# Data-rader
+# =============================
+
+def replace_rows(profile: str, records: List[Dict[str, Any]]) -> None:
+    """Ersätt profilens lokala kopia med en full läsning från Sheets."""
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute("DELETE FROM data_rows WHERE profile = ?", (profile,))
+            # Raderna byts ut -> dagsaggregaten byggs om vid nästa läsning
+            c.execute("DELETE FROM rollup WHERE profile = ?", (profile,))
+            c.execute("DELETE FROM rollup_meta WHERE profile = ?", (profile,))
+            c.executemany(
+                "INSERT INTO data_rows(profile, seq, payload) VALUES (?, ?, ?)",
+                [(profile, i, _dumps(r)) for i, r in enumerate(records)],
+            )
+            c.execute("INSERT OR REPLACE INTO data_meta(profile, synced) VALUES (?, ?)", (profile, time.time()))
+
+
+def append_rows(profile: str, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    with _LOCK:
+        c = _conn()
+        with c:
+            start = c.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM data_rows WHERE profile = ?", (profile,)).fetchone()[0]
+            c.executemany(
+                "INSERT INTO data_rows(profile, seq, payload) VALUES (?, ?, ?)",
+                [(profile, start + i, _dumps(r)) for i, r in enumerate(rows)],
+            )
+
+
+def row_count(profile: str) -> int:
+    """Antal lokala rader (= nästa seq; raderna skrivs bara i slutet)."""
+    with _LOCK:
+        return int(_conn().execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM data_rows WHERE profile = ?", (profile,)).fetchone()[0])
+
+
+def data_state(profile: str) -> Optional[Tuple[float, int]]:
+    """(tid för senaste fulla ersättning, antal rader) eller None om kopia saknas."""
+    with _LOCK:
+        c = _conn()
+        r = c.execute("SELECT synced FROM data_meta WHERE profile = ?", (profile,)).fetchone()
+        if r is None:
+            return None
+        return float(r[0]), row_count(profile)
+
+
+def get_rows_since(profile: str, seq: int) -> List[Dict[str, Any]]:
+    with _LOCK:
+        cur = _conn().execute(
+            "SELECT payload FROM data_rows WHERE profile = ? AND seq >= ? ORDER BY seq", (profile, int(seq))
+        )
+        return [json.loads(r[0]) for r in cur]
+
+
+def has_rows(profile: str) -> bool:
+    with _LOCK:
+        return _conn().execute("SELECT 1 FROM data_meta WHERE profile = ?", (profile,)).fetchone() is not None
+
+
+def get_rows(profile: str, tail: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Alla rader i ordning, eller endast de sista 'tail' raderna."""
+    with _LOCK:
+        c = _conn()
+        if tail is None:
+            cur = c.execute("SELECT payload FROM data_rows WHERE profile = ? ORDER BY seq", (profile,))
+            return [json.loads(r[0]) for r in cur]
+        cur = c.execute(
+            "SELECT payload FROM data_rows WHERE profile = ? ORDER BY seq DESC LIMIT ?",
+            (profile, max(0, int(tail))),
+        )
+        return [json.loads(r[0]) for r in cur][::-1]
+
+
+# =============================
+# Skrivkö (outbox)
+# =============================
+
+def enqueue(kind: str, profile: str, payload: Any) -> int:
+    with _LOCK:
+        c = _conn()
+        with c:
+            cur = c.execute(
+                "INSERT INTO outbox(kind, profile, payload, created) VALUES (?, ?, ?, ?)",
+                (kind, profile, _dumps(payload), time.time()),
+            )
+            return int(cur.lastrowid)
+
+
+def pending(limit: int = 100) -> List[Tuple[int, str, str, Any]]:
+    """Äldsta först: [(id, kind, profile, payload), ...]."""
+    with _LOCK:
+        cur = _conn().execute("SELECT id, kind, profile, payload FROM outbox ORDER BY id LIMIT ?", (int(limit),))
+        return [(r[0], r[1], r[2], json.loads(r[3])) for r in cur]
+
+
+def pending_count(profile: Optional[str] = None, kind: Optional[str] = None) -> int:
+    """Antal köade skrivningar (alla, eller bara profilens / av viss sort)."""
+    sql, args = "SELECT COUNT(*) FROM outbox WHERE 1 = 1", []
+    if profile is not None:
+        sql += " AND profile = ?"
+        args.append(profile)
+    if kind is not None:
+        sql += " AND kind = ?"
+        args.append(kind)
+    with _LOCK:
+        return int(_conn().execute(sql, args).fetchone()[0])
+
+
+def mark_done(entry_id: int) -> None:
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+
+def shrink_entry(entry_id: int, payload: Any) -> None:
+    """Ersätt en köad skrivnings payload (t.ex. med raderna som ännu inte skrivits)."""
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute("UPDATE outbox SET payload = ? WHERE id = ?", (_dumps(payload), entry_id))
+
+
+def mark_failed(entry_id: int, error: str) -> int:
+    """Räkna upp försöken; returnerar antal försök hittills."""
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (str(error)[:500], entry_id),
+            )
+            r = c.execute("SELECT attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+    return int(r[0]) if r else 0
+
+
+# Skrivningar som permanent misslyckats (felaktig payload, borttaget blad …)
+# flyttas hit så att de inte blockerar kön. De visas i appen och kan läggas
+# tillbaka i kön eller slängas.
+
+def move_to_dead(entry_id: int) -> None:
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute(
+                "INSERT OR REPLACE INTO outbox_dead(id, kind, profile, payload, created, attempts, last_error, dropped) "
+                "SELECT id, kind, profile, payload, created, attempts, last_error, ? FROM outbox WHERE id = ?",
+                (time.time(), entry_id),
+            )
+            c.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+
+def dead_letters(limit: int = 100) -> List[Dict[str, Any]]:
+    """Äldsta först: [{"id", "kind", "profile", "rows", "attempts", "error", "created"}, ...]."""
+    with _LOCK:
+        cur = _conn().execute(
+            "SELECT id, kind, profile, payload, attempts, last_error, created FROM outbox_dead ORDER BY id LIMIT ?",
+            (int(limit),),
+        )
+        out = []
+        for r in cur:
+            payload = json.loads(r[3])
+            out.append({"id": r[0], "kind": r[1], "profile": r[2],
+                        "rows": len(payload) if isinstance(payload, list) else 1,
+                        "attempts": r[4], "error": r[5] or "", "created": r[6]})
+        return out
+
+
+def dead_count() -> int:
+    with _LOCK:
+        return int(_conn().execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0])
+
+
+def drop_dead(entry_id: Optional[int] = None) -> None:
+    """Släng en (eller alla) permanent misslyckade skrivningar."""
+    with _LOCK:
+        c = _conn()
+        with c:
+            if entry_id is None:
+                c.execute("DELETE FROM outbox_dead")
+            else:
+                c.execute("DELETE FROM outbox_dead WHERE id = ?", (entry_id,))
+
+
+def requeue_dead(entry_id: Optional[int] = None) -> None:
+    """Lägg tillbaka en (eller alla) i kön med nollställda försök (hamnar sist)."""
+    where, args = ("", ()) if entry_id is None else (" WHERE id = ?", (entry_id,))
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute(
+                "INSERT INTO outbox(kind, profile, payload, created) "
+                "SELECT kind, profile, payload, created FROM outbox_dead" + where + " ORDER BY id",
+                args,
+            )
+            c.execute("DELETE FROM outbox_dead" + where, args)
+
+
+# =============================
+# Radintervall-index för delade datablad (profil -> [(start, stop)], 1-baserade rader)
+# =============================
+
+def _merge_segments(segs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Slå ihop överlappande/angränsande intervall."""
+    out: List[Tuple[int, int]] = []
+    for a, b in sorted(segs):
+        if out and a <= out[-1][1] + 1:
+            out[-1] = (out[-1][0], max(out[-1][1], b))
+        else:
+            out.append((a, b))
+    return out
+
+
+def get_row_index_meta(sheet: str, title: str) -> Optional[Tuple[int, int]]:
+    """(senast skannade rad, bladets radantal vid skanningen) eller None."""
+    with _LOCK:
+        r = _conn().execute("SELECT scanned, grid FROM row_index_meta WHERE sheet = ? AND title = ?", (sheet, title)).fetchone()
+    return (int(r[0]), int(r[1])) if r else None
+
+
+def get_row_segments(sheet: str, title: str, profile: str) -> List[Tuple[int, int]]:
+    with _LOCK:
+        cur = _conn().execute(
+            "SELECT start, stop FROM row_index WHERE sheet = ? AND title = ? AND profile = ? ORDER BY start",
+            (sheet, title, profile),
+        )
+        return [(int(a), int(b)) for a, b in cur]
+
+
+def update_row_index(sheet: str, title: str, assignments: List[Tuple[int, str]], scanned: int, grid: int, replace: bool = False) -> None:
+    """
+    Lägg in (rad, profil)-par och slå ihop till sammanhängande intervall.
+    Idempotent (samma rad två gånger ger samma index). replace=True bygger om från noll.
+    """
+    by_profile: Dict[str, List[int]] = {}
+    for row, profile in assignments:
+        by_profile.setdefault(profile, []).append(int(row))
+    with _LOCK:
+        c = _conn()
+        with c:
+            if replace:
+                c.execute("DELETE FROM row_index WHERE sheet = ? AND title = ?", (sheet, title))
+            for profile, rows in by_profile.items():
+                old = [] if replace else [
+                    (int(a), int(b)) for a, b in c.execute(
+                        "SELECT start, stop FROM row_index WHERE sheet = ? AND title = ? AND profile = ?",
+                        (sheet, title, profile),
+                    )
+                ]
+                c.execute("DELETE FROM row_index WHERE sheet = ? AND title = ? AND profile = ?", (sheet, title, profile))
+                c.executemany(
+                    "INSERT INTO row_index(sheet, title, profile, start, stop) VALUES (?, ?, ?, ?, ?)",
+                    [(sheet, title, profile, a, b) for a, b in _merge_segments(old + [(r, r) for r in rows])],
+                )
+            c.execute(
+                "INSERT OR REPLACE INTO row_index_meta(sheet, title, scanned, grid) VALUES (?, ?, ?, ?)",
+                (sheet, title, int(scanned), int(grid)),
+            )
+
+
+def drop_row_index(sheet: str, title: str) -> None:
+    with _LOCK:
+        c = _conn()
+        with c:
+            c.execute("DELETE FROM row_index WHERE sheet = ? AND title = ?", (sheet, title))
+            c.execute("DELETE FROM row_index_meta WHERE sheet = ? AND title = ?", (sheet, title))
+
+
+# =============================
+# Dagsaggregat (rollup): profil + layout -> {dag: {term: värde}}
+# =============================
+# layout = etikettuppsättningen aggregaten räknades med (se rollup.py).
+# 'upto' = antal datarader (seq) som ingår. Nycklar "min:…"/"max:…" slås ihop
+# med min/max, övriga summeras.
+
+def _merge_day(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    out = dict(a)
+    for k, v in b.items():
+        if k not in out:
+            out[k] = v
+        elif k.startswith("min:"):
+            out[k] = min(out[k], v)
+        elif k.startswith("max:"):
+            out[k] = max(out[k], v)
+        else:
+            out[k] = out[k] + v
+    return out
+
+
+def rollup_layouts(profile: str) -> List[Tuple[str, Dict[str, str], int]]:
+    """[(layout, etiketter, upto)] för profilens sparade aggregat."""
+    with _LOCK:
+        cur = _conn().execute("SELECT layout, labels, upto FROM rollup_meta WHERE profile = ?", (profile,))
+        return [(r[0], json.loads(r[1]), int(r[2])) for r in cur]
+
+
+def get_rollup(profile: str, layout: str) -> Optional[Tuple[int, Dict[str, Dict[str, float]]]]:
+    """(upto, {dag: aggregat}) eller None om aggregaten saknas."""
+    with _LOCK:
+        c = _conn()
+        meta = c.execute("SELECT upto FROM rollup_meta WHERE profile = ? AND layout = ?", (profile, layout)).fetchone()
+        if meta is None:
+            return None
+        cur = c.execute("SELECT day, payload FROM rollup WHERE profile = ? AND layout = ?", (profile, layout))
+        return int(meta[0]), {r[0]: json.loads(r[1]) for r in cur}
+
+
+def add_rollup(profile: str, layout: str, labels: Dict[str, str], days: Dict[str, Dict[str, float]],
+               upto: int, since: Optional[int] = None) -> bool:
+    """
+    Slå in dagsaggregat för raderna since..upto-1. since=None bygger om från noll.
+    Returnerar False (utan att skriva) om aggregaten inte längre står på 'since'
+    (någon annan hann före) – anroparen läser då om.
+    """
+    with _LOCK:
+        c = _conn()
+        with c:
+            if since is None:
+                c.execute("DELETE FROM rollup WHERE profile = ? AND layout = ?", (profile, layout))
+            else:
+                meta = c.execute("SELECT upto FROM rollup_meta WHERE profile = ? AND layout = ?", (profile, layout)).fetchone()
+                if meta is None or int(meta[0]) != int(since):
+                    return False
+            for day, agg in days.items():
+                if since is not None:
+                    old = c.execute(
+                        "SELECT payload FROM rollup WHERE profile = ? AND layout = ? AND day = ?", (profile, layout, day)
+                    ).fetchone()
+                    if old is not None:
+                        agg = _merge_day(json.loads(old[0]), agg)
+                c.execute(
+                    "INSERT OR REPLACE INTO rollup(profile, layout, day, payload) VALUES (?, ?, ?, ?)",
+                    (profile, layout, day, _dumps(agg)),
+                )
+            c.execute(
+                "INSERT OR REPLACE INTO rollup_meta(profile, layout, labels, upto) VALUES (?, ?, ?, ?)",
+                (profile, layout, _dumps(labels), int(upto)),
+            )
+    return True
@@ -0,0 +1,146 @@
+# rollup.py — dagsaggregat (rollup) av profilens rader, persisterade i local_store
+#
+# Per dag (Datum) sparas summorna av statistikens radtermer (statistik._row_terms:
+# antal rader, kolumnsummor, maskräkningar, maskade summor) plus min/max för
+# några måttkolumner. Totalt och fönster (senaste N dagar, vecka/månad/år) kan
+# då räknas ur ~365 rader per år i stället för ur alla rader.
+#
+# Aggregaten hålls aktuella inkrementellt: sheets_utils anropar fold() när rader
+# speglas till lokala lagret (spara, kopiera, batch-generering), och daily()
+# viker in eventuella saknade rader innan det svarar. När lokala kopian byts ut
+# (full läsning från Sheets) rensar local_store aggregaten och de byggs om.
+# Rader utan giltigt Datum hamnar på dagen "" (räknas i totalen, inte i fönster).
+# Aggregaten beskriver lokala kopian, inte sessionens rader: appen använder dem
+# bara när sessionens rader är kopian (se _rollup_fresh i app.py).
+
+from __future__ import annotations
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+import local_store as LS
+import statistik as S
+
+_VERSION = 1  # höj när radtermerna ändras -> gamla aggregat byggs om
+
+# Kolumner med min/max per dag
+MINMAX_COLUMNS = ("Män", "Totalt Män", "Summa tid (sek)", "Prenumeranter", "Intäkter",
+                  "Intäkt företag", "Lön Malin", "Vinst")
+
+
+def _layout(cfg: Dict[str, Any]) -> tuple:
+    """(nyckel, etiketter) – termerna beror på källetiketterna i CFG."""
+    labels = dict(zip(S.LBL_KEYS, S._labels(cfg).values()))
+    key = hashlib.sha1(json.dumps([_VERSION, labels], ensure_ascii=False, sort_keys=True).encode()).hexdigest()[:16]
+    return key, labels
+
+
+def day_aggregates(rows: List[Dict[str, Any]], cfg: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """{dag (ISO): {term: summa, "min:kolumn": …, "max:kolumn": …}} för raderna."""
+    if not rows:
+        return {}
+    df = pd.DataFrame(rows)
+    if "Datum" in df.columns:
+        day = pd.to_datetime(df["Datum"], errors="coerce").dt.strftime("%Y-%m-%d").fillna("").to_numpy()
+    else:
+        day = [""] * len(df)
+    out = {d: {k: float(v) for k, v in sums.items()}
+           for d, sums in S._row_terms(df, cfg).groupby(day).sum().to_dict(orient="index").items()}
+    for col in MINMAX_COLUMNS:
+        if col not in df.columns:
+            continue
+        mm = pd.to_numeric(df[col], errors="coerce").groupby(day).agg(["min", "max"])
+        for d, lo, hi in zip(mm.index, mm["min"], mm["max"]):
+            if lo == lo:  # NaN = inga tal den dagen
+                out[d][f"min:{col}"] = float(lo)
+                out[d][f"max:{col}"] = float(hi)
+    return out
+
+
+def fold(profile: str) -> None:
+    """Vik in nya lokala rader i profilens befintliga aggregat (alla layouter)."""
+    for layout, labels, upto in LS.rollup_layouts(profile):
+        rows = LS.get_rows_since(profile, upto)
+        if rows:
+            LS.add_rollup(profile, layout, labels, day_aggregates(rows, labels), upto + len(rows), since=upto)
+
+
+def daily(profile: str, cfg: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """
+    Dagsaggregaten som DataFrame (index = dag, sorterat), aktuella mot lokala
+    raderna. None om profilen saknar full lokal kopia.
+    """
+    if not LS.has_rows(profile):
+        return None
+    layout, labels = _layout(cfg)
+    for _ in range(3):
+        n = LS.row_count(profile)
+        got = LS.get_rollup(profile, layout)
+        if got is not None and got[0] == n:
+            break
+        if got is None or got[0] > n:
+            rows = LS.get_rows(profile)
+            LS.add_rollup(profile, layout, labels, day_aggregates(rows, cfg), len(rows))
+        else:
+            rows = LS.get_rows_since(profile, got[0])
+            LS.add_rollup(profile, layout, labels, day_aggregates(rows, cfg), got[0] + len(rows), since=got[0])
+    got = LS.get_rollup(profile, layout)
+    if not got or not got[1]:
+        return pd.DataFrame()
+    frame = pd.DataFrame.from_dict(got[1], orient="index").sort_index()
+    sums = _sum_columns(frame)
+    frame[sums] = frame[sums].fillna(0.0)
+    return frame
+
+
+def _sum_columns(frame: pd.DataFrame) -> List[str]:
+    return [c for c in frame.columns if not c.startswith(("min:", "max:"))]
+
+
+def _last_days(frame: pd.DataFrame, days: int) -> pd.DataFrame:
+    dated = frame[frame.index != ""]
+    if dated.empty:
+        return dated
+    cut = (pd.Timestamp(dated.index.max()) - timedelta(days=int(days) - 1)).strftime("%Y-%m-%d")
+    return dated[dated.index >= cut]
+
+
+def stats(profile: str, cfg: Dict[str, Any], days: Optional[int] = None) -> Optional[dict]:
+    """
+    Som statistik.compute_stats (days=None) eller window_stats (senaste N
+    dagar), men ur dagsaggregaten. None om aggregat inte kan byggas.
+    """
+    frame = daily(profile, cfg)
+    if frame is None:
+        return None
+    if days and not frame.empty:
+        frame = _last_days(frame, days)
+    totals = frame[_sum_columns(frame)].sum().to_dict() if not frame.empty else {}
+    return S._stats_from_totals(totals, cfg)
+
+
+def stats_by_period(profile: str, cfg: Dict[str, Any], freq: str = "M") -> Optional[pd.DataFrame]:
+    """Som statistik.stats_by_period, men ur dagsaggregaten."""
+    if freq not in S._FREQS:
+        raise ValueError(f"Okänd period: {freq} (välj bland {', '.join(S._FREQS)})")
+    frame = daily(profile, cfg)
+    if frame is None:
+        return None
+    dated = frame[frame.index != ""]
+    if dated.empty:
+        return pd.DataFrame()
+    per = pd.to_datetime(dated.index).to_period(S._FREQS[freq])
+    return S._frame_of_stats(dated[_sum_columns(dated)].groupby(per).sum(), cfg)
+
+
+def extremes(profile: str, cfg: Dict[str, Any], column: str, days: Optional[int] = None) -> Optional[tuple]:
+    """(min, max) för en kolumn i MINMAX_COLUMNS över hela historiken eller senaste N dagar."""
+    frame = daily(profile, cfg)
+    if frame is None or frame.empty or f"min:{column}" not in frame.columns:
+        return None
+    if days:
+        frame = _last_days(frame, days)
+    return float(frame[f"min:{column}"].min()), float(frame[f"max:{column}"].max())
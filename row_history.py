@@ -0,0 +1,333 @@
+# row_history.py — minnesmappad radhistorik (delas read-only mellan sessioner)
+#
+# Profilens rader skrivs som en kolumnfil (.npy) per kolumn under
+#   <cache>/rows/<profil>/v<version>/
+# och öppnas med np.load(mmap_mode="r"). Alla sessioner för samma profil i
+# processen delar samma mappning (och mellan processer delar OS:ets page cache),
+# så varje session håller bara sina egna nya rader i minnet.
+#
+# MappedRows beter sig som list[dict] (len, index, slice, iteration, append)
+# så att app.py kan använda den där ROWS_KEY tidigare var en lista.
+#
+# Bara rader lästa ur Sheets publiceras som delad version (CURRENT). Sessionens
+# egna, osparade ändringar (nya rader via flush(), omräknad historik via
+# MappedRows.local) skrivs som privata versioner under <profil>/local/ och
+# påverkar aldrig vad andra sessioner öppnar.
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+import local_store as LS
+
+_LOCK = threading.RLock()
+_OPEN: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # versionskatalog -> {"meta", "cols"}
+_MAX_OPEN = 16
+_LOCAL_MAX_AGE_S = 24 * 3600  # privata versioner äldre än så städas bort
+
+
+def _profile_dir(profile: str) -> str:
+    safe = re.sub(r"[^\w\-]+", "_", profile) or "_"
+    d = os.path.join(LS.cache_dir(), "rows", safe)
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _fingerprint(arrays: Dict[str, np.ndarray], n: int) -> str:
+    """Fingeravtryck av hela innehållet: antal + varje kolumns namn, typ och data."""
+    h = hashlib.sha1(str(int(n)).encode())
+    for c, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        h.update(json.dumps([c, a.dtype.str], ensure_ascii=False).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def _is_blank(v: Any) -> bool:
+    return v is None or (isinstance(v, float) and v != v) or (isinstance(v, str) and not v.strip())
+
+
+def _columns_of(rows: List[Dict[str, Any]]) -> List[str]:
+    seen: Dict[str, None] = {}
+    for r in rows:
+        for k in r.keys():
+            seen.setdefault(k, None)
+    return list(seen)
+
+
+def _to_array(values: List[Any]) -> np.ndarray:
+    """Numerisk kolumn -> float64 (NaN = tomt); annars fast bredd unicode."""
+    if all(_is_blank(v) or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        return np.array([np.nan if _is_blank(v) else float(v) for v in values], dtype=np.float64)
+    strs = ["" if _is_blank(v) else str(v) for v in values]
+    width = max(1, max((len(x) for x in strs), default=1))
+    return np.array(strs, dtype=f"<U{width}")
+
+
+def _cell(arr: np.ndarray, i: int) -> Any:
+    v = arr[i]
+    if arr.dtype.kind == "f":
+        f = float(v)
+        if f != f:
+            return ""
+        return int(f) if f.is_integer() else f
+    return str(v)
+
+
+# =============================
+# Publicera / öppna versioner
+# =============================
+
+def _current_version(profile: str) -> Optional[str]:
+    p = os.path.join(_profile_dir(profile), "CURRENT")
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    d = os.path.join(_profile_dir(profile), name)
+    return d if name and os.path.isdir(d) else None
+
+
+def _rows_to_arrays(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    return {c: _to_array([r.get(c, "") for r in rows]) for c in _columns_of(rows)}
+
+
+def publish(profile: str, rows: List[Dict[str, Any]]) -> Optional[str]:
+    """Skriv list[dict] som ny delad version (se _publish_arrays)."""
+    if not rows:
+        return None
+    arrays = _rows_to_arrays(rows)
+    return _publish_arrays(profile, arrays, len(rows), _fingerprint(arrays, len(rows)))
+
+
+def _write_version(tmp: str, arrays: Dict[str, np.ndarray], n: int, fingerprint: str) -> None:
+    cols = list(arrays)
+    files = []
+    for i, c in enumerate(cols):
+        fn = f"c{i}.npy"
+        np.save(os.path.join(tmp, fn), np.ascontiguousarray(arrays[c]))
+        files.append(fn)
+    meta = {"n": int(n), "columns": cols, "files": files, "fingerprint": fingerprint}
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def _publish_local(profile: str, arrays: Dict[str, np.ndarray], n: int) -> Optional[str]:
+    """
+    Skriv kolumnarrayer som privat version (en katalog per anrop under
+    <profil>/local/). CURRENT rörs inte. Privata versioner äldre än
+    _LOCAL_MAX_AGE_S tas bort.
+    """
+    if n == 0:
+        return None
+    base = os.path.join(_profile_dir(profile), "local")
+    os.makedirs(base, exist_ok=True)
+    now = time.time()
+    for d in os.listdir(base):
+        p = os.path.join(base, d)
+        try:
+            if now - os.path.getmtime(p) > _LOCAL_MAX_AGE_S:
+                shutil.rmtree(p, ignore_errors=True)
+        except OSError:
+            pass
+    vdir = tempfile.mkdtemp(prefix=f"l{int(now * 1000)}-", dir=base)
+    _write_version(vdir, arrays, n, _fingerprint(arrays, n))
+    return vdir
+
+
+def _drop_local(vdir: Optional[str]) -> None:
+    """Ta bort en privat version (befintliga mappningar fortsätter fungera)."""
+    if vdir and os.path.basename(os.path.dirname(vdir)) == "local":
+        with _LOCK:
+            _OPEN.pop(vdir, None)
+        shutil.rmtree(vdir, ignore_errors=True)
+
+
+def _publish_arrays(profile: str, arrays: Dict[str, np.ndarray], n: int, fingerprint: str) -> Optional[str]:
+    """
+    Skriv kolumnarrayer som ny delad version (egen katalog via mkdtemp, så
+    samtidiga publiceringar aldrig krockar) och peka om CURRENT (atomiskt via
+    rename). Äldre versioner utom den närmast föregående (efter mtime) tas
+    bort – sessioner som fortfarande mappar dem behåller sina mappningar tills
+    de stängs. Kataloger utan meta.json skrivs fortfarande och lämnas kvar.
+    """
+    if n == 0:
+        return None
+    base = _profile_dir(profile)
+    final = tempfile.mkdtemp(prefix=f"v{int(time.time() * 1000):015d}-", dir=base)
+    _write_version(final, arrays, n, fingerprint)
+    name = os.path.basename(final)
+
+    fd, tmp_cur = tempfile.mkstemp(prefix=".CURRENT-", dir=base)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp_cur, os.path.join(base, "CURRENT"))
+
+    now = time.time()
+    versions = []
+    for d in os.listdir(base):
+        p = os.path.join(base, d)
+        if not d.startswith("v") or d == name or not os.path.isdir(p):
+            continue
+        try:
+            mtime = os.path.getmtime(p)
+        except OSError:
+            continue
+        if os.path.exists(os.path.join(p, "meta.json")) or now - mtime > _LOCAL_MAX_AGE_S:
+            versions.append((mtime, p))
+    for _, old in sorted(versions)[:-1]:
+        shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+def _open_version(vdir: str) -> Dict[str, Any]:
+    """Delad (process-vid) read-only mappning av en version."""
+    with _LOCK:
+        hit = _OPEN.get(vdir)
+        if hit is not None:
+            _OPEN.move_to_end(vdir)
+            return hit
+        with open(os.path.join(vdir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        cols = {c: np.load(os.path.join(vdir, fn), mmap_mode="r") for c, fn in zip(meta["columns"], meta["files"])}
+        hit = {"meta": meta, "cols": cols}
+        _OPEN[vdir] = hit
+        while len(_OPEN) > _MAX_OPEN:
+            _OPEN.popitem(last=False)
+        return hit
+
+
+# =============================
+# List-lik vy
+# =============================
+
+class MappedRows(Sequence):
+    """
+    list[dict]-lik radhistorik: delad minnesmappad bas + sessionens egna nya rader.
+    Rader materialiseras som dict först när de indexeras.
+    """
+
+    __slots__ = ("profile", "_vdir", "_n", "_cols", "_tail")
+
+    def __init__(self, profile: str, vdir: Optional[str] = None):
+        self.profile = profile
+        self._tail: List[Dict[str, Any]] = []
+        self._attach(vdir)
+
+    def _attach(self, vdir: Optional[str]) -> None:
+        self._vdir = vdir
+        if vdir:
+            v = _open_version(vdir)
+            self._n = int(v["meta"]["n"])
+            self._cols = v["cols"]
+        else:
+            self._n = 0
+            self._cols = {}
+
+    @classmethod
+    def open_or_publish(cls, profile: str, rows: List[Dict[str, Any]]) -> "MappedRows":
+        """
+        Rader lästa ur Sheets: återanvänd aktuell delad version om innehållet
+        är identiskt, annars publicera ny.
+        """
+        arrays = _rows_to_arrays(rows) if rows else {}
+        fp = _fingerprint(arrays, len(rows))
+        with _LOCK:
+            vdir = _current_version(profile)
+            if vdir is None or _open_version(vdir)["meta"].get("fingerprint") != fp:
+                vdir = _publish_arrays(profile, arrays, len(rows), fp)
+        return cls(profile, vdir)
+
+    @classmethod
+    def local(cls, profile: str, rows: List[Dict[str, Any]]) -> "MappedRows":
+        """Sessionens egna rader (t.ex. omräknad historik) som privat version."""
+        return cls(profile, _publish_local(profile, _rows_to_arrays(rows), len(rows)) if rows else None)
+
+    # --- Sequence ---
+    def __len__(self) -> int:
+        return self._n + len(self._tail)
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        if i >= self._n:
+            return self._tail[i - self._n]
+        return {c: _cell(a, i) for c, a in self._cols.items()}
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._row(i) for i in range(*idx.indices(len(self)))]
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError("MappedRows index out of range")
+        return self._row(idx)
+
+    # --- list-lika mutationer (endast sessionens svans) ---
+    def append(self, row: Dict[str, Any]) -> None:
+        self._tail.append(row)
+
+    def extend(self, rows) -> None:
+        self._tail.extend(rows)
+
+    # --- snabba vägar ---
+    def column(self, name: str) -> np.ndarray:
+        """Hela kolumnen som array (bas mappad + svans), utan att bygga dict-rader."""
+        base = self._cols.get(name)
+        if base is None:
+            base = np.full(self._n, np.nan)
+        if not self._tail:
+            return base
+        vals = [r.get(name, "") for r in self._tail]
+        tail = _to_array(vals)
+        if base.dtype.kind == "f" and tail.dtype.kind == "f":
+            return np.concatenate([base, tail])
+        # Blandat -> text för hela kolumnen
+        base_txt = np.array([str(_cell(base, i)) for i in range(len(base))], dtype=str) if base.dtype.kind == "f" else np.asarray(base)
+        tail_txt = np.array(["" if _is_blank(v) else str(v) for v in vals], dtype=str)
+        return np.concatenate([base_txt, tail_txt])
+
+    def to_frame(self) -> pd.DataFrame:
+        import pandas as pd
+
+        frames = []
+        if self._n:
+            frames.append(pd.DataFrame({c: np.asarray(a) for c, a in self._cols.items()}))
+        if self._tail:
+            frames.append(pd.DataFrame(self._tail))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def flush(self) -> None:
+        """
+        Skriv bas + svans som privat version och släpp svansen ur minnet.
+        Den delade versionen (CURRENT) rörs inte – svansen är sessionens egen.
+        """
+        if not self._tail:
+            return
+        cols = list(self._cols)
+        for r in self._tail:
+            for k in r.keys():
+                if k not in self._cols and k not in cols:
+                    cols.append(k)
+        arrays = {c: self.column(c) for c in cols}
+        old = self._vdir
+        vdir = _publish_local(self.profile, arrays, len(self))
+        self._tail = []
+        self._attach(vdir)
+        _drop_local(old)
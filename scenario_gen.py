@@ -0,0 +1,207 @@
+# scenario_gen.py — ren scenariogenerator (ingen Streamlit, inget st.session_state)
+#
+# Samma regler som "Hämta värden" (apply_scenario_fill) i appen:
+#   - Fitta/Rumpa 1..historiskt max, övriga basfält 30–60 % av historiskt max
+#   - vit -> inga svarta; svart -> inga män/privata källor/personal
+#   - DP = 60 % av basfälten, DPP/DAP = DP och TAP = 40 % av DP om de förekommit i historiken
+#   - Vila: män/svarta = 0; Super bonus: svarta = ackumulerad superbonus
+# Indata: historik-aggregat (history_aggregates), CFG och en seedad NumPy-RNG.
+# Utdata: N rader som arrayer nycklade på radkolumnerna – appen tar den första,
+# simulering/bulkgenerering tar alla.
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SCENARIOS = ["Ny scen", "Slumpa scen vit", "Slumpa scen svart", "Vila på jobbet", "Vila i hemmet (dag 1–7)", "Super bonus"]
+VILA_HEMMA = "Vila i hemmet (dag 1–7)"
+
+DEFAULT_MIX = {
+    "Slumpa scen vit": 0.4,
+    "Slumpa scen svart": 0.3,
+    "Vila på jobbet": 0.2,
+    VILA_HEMMA: 0.1,
+}
+
+# =============================
+# Historik-aggregat
+# =============================
+
+def hist_fields(cfg: Dict[str, Any]) -> List[str]:
+    """Fälten vars historiska max styr slumpen (källor på sina etiketter)."""
+    return [
+        "Män", "Svarta", "Fitta", "Rumpa", "Personal deltagit",
+        cfg.get("LBL_PAPPAN", "Pappans vänner"), cfg.get("LBL_GRANNAR", "Grannar"),
+        cfg.get("LBL_NILS_VANNER", "Nils vänner"), cfg.get("LBL_NILS_FAMILJ", "Nils familj"),
+        cfg.get("LBL_BEKANTA", "Bekanta"), cfg.get("LBL_ESK", "Eskilstuna killar"),
+    ]
+
+
+def history_aggregates(rows, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Det scenario-fill behöver ur historiken: max per fält + om DPP/DAP/TAP
+    någonsin förekommit. Källfälten nycklas på sina etiketter i cfg.
+    """
+    import pandas as pd
+
+    if isinstance(rows, pd.DataFrame):
+        df = rows
+    else:
+        df = pd.DataFrame(list(rows)) if rows is not None and len(rows) else pd.DataFrame()
+    fields = hist_fields(cfg)
+
+    def _ser(c):
+        if c not in df.columns:
+            return pd.Series([], dtype=float)
+        return pd.to_numeric(df[c], errors="coerce").fillna(0)
+
+    hi = {c: int(_ser(c).max()) if c in df.columns and len(df) else 0 for c in fields}
+    return {
+        "hi": hi,
+        "has_dpp": float(_ser("DPP").sum()) > 0,
+        "has_dap": float(_ser("DAP").sum()) > 0,
+        "has_tap": float(_ser("TAP").sum()) > 0,
+    }
+
+
+# =============================
+# Vektoriserad scenario-fill
+# =============================
+
+def rand_pct_of_hi(rng: np.random.Generator, hi: int, n: int, lo_pct: float = 0.30, hi_pct: float = 0.60) -> np.ndarray:
+    hi = max(0, int(hi))
+    if hi <= 0:
+        return np.zeros(n, dtype=np.int64)
+    lo_val = max(0, int(round(lo_pct * hi)))
+    hi_val = max(lo_val, int(round(hi_pct * hi)))
+    if hi_val <= 0:
+        return np.zeros(n, dtype=np.int64)
+    return rng.integers(lo_val, hi_val + 1, size=n)
+
+
+def fill_scenes(types: np.ndarray, hist: Dict[str, Any], cfg: Dict[str, Any], super_acc: np.ndarray, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Indatafält för n scener (en per element i 'types'), enligt apply_scenario_fill.
+    Returnerar arrayer nycklade på radkolumnerna (källor på sina etiketter).
+    """
+    n = len(types)
+    hi = hist["hi"]
+    L = {k: cfg.get(k, d) for k, d in (
+        ("LBL_PAPPAN", "Pappans vänner"), ("LBL_GRANNAR", "Grannar"), ("LBL_NILS_VANNER", "Nils vänner"),
+        ("LBL_NILS_FAMILJ", "Nils familj"), ("LBL_BEKANTA", "Bekanta"), ("LBL_ESK", "Eskilstuna killar"))}
+
+    vit = types == "Slumpa scen vit"
+    svart = types == "Slumpa scen svart"
+    jobb = types == "Vila på jobbet"
+    hemma = types == VILA_HEMMA
+    sb = types == "Super bonus"
+    slump = vit | svart | jobb | hemma
+
+    def _fitta_rumpa(col):
+        h = int(hi.get(col, 0))
+        return rng.integers(1, h + 1, size=n) if h > 0 else np.zeros(n, dtype=np.int64)
+
+    fitta = np.where(slump, _fitta_rumpa("Fitta"), 0)
+    rumpa = np.where(slump, _fitta_rumpa("Rumpa"), 0)
+
+    man = rand_pct_of_hi(rng, hi.get("Män", 0), n)
+    svar = rand_pct_of_hi(rng, hi.get("Svarta", 0), n)
+    pap = rand_pct_of_hi(rng, hi.get(L["LBL_PAPPAN"], 0), n)
+    gra = rand_pct_of_hi(rng, hi.get(L["LBL_GRANNAR"], 0), n)
+    nv = rand_pct_of_hi(rng, hi.get(L["LBL_NILS_VANNER"], 0), n)
+    nf = rand_pct_of_hi(rng, hi.get(L["LBL_NILS_FAMILJ"], 0), n)
+    bek = rand_pct_of_hi(rng, hi.get(L["LBL_BEKANTA"], 0), n)
+    pd_ = rand_pct_of_hi(rng, hi.get("Personal deltagit", 0), n)
+    esk = rand_pct_of_hi(rng, hi.get(L["LBL_ESK"], 0), n)
+
+    # Särregler: vit -> inga svarta; svart -> inga män/privata/personal
+    svar = np.where(vit, 0, svar)
+    man = np.where(svart, 0, man)
+    pap, gra, nv, nf, bek, pd_ = (np.where(svart, 0, a) for a in (pap, gra, nv, nf, bek, pd_))
+
+    total_bas = man + svar + pap + gra + nv + nf + bek + pd_ + esk
+    dp = np.round(0.60 * np.maximum(0, total_bas)).astype(np.int64)
+    dpp = dp if hist.get("has_dpp") else np.zeros(n, dtype=np.int64)
+    dap = dp if hist.get("has_dap") else np.zeros(n, dtype=np.int64)
+    tap = np.round(0.40 * dp).astype(np.int64) if hist.get("has_tap") else np.zeros(n, dtype=np.int64)
+
+    # Vila: män/svarta alltid 0 (efter att DP-sviten räknats)
+    man = np.where(jobb | hemma, 0, man)
+    svar = np.where(jobb | hemma, 0, svar)
+
+    def _only(mask, a):
+        return np.where(mask, a, 0).astype(np.int64)
+
+    out = {
+        "Män": _only(slump, man),
+        "Svarta": np.where(sb, super_acc, _only(slump, svar)).astype(np.int64),
+        "Fitta": fitta.astype(np.int64), "Rumpa": rumpa.astype(np.int64),
+        "DP": _only(slump, dp), "DPP": _only(slump, dpp), "DAP": _only(slump, dap), "TAP": _only(slump, tap),
+        "Tid S": np.full(n, 60), "Tid D": np.full(n, 60), "Vila": np.full(n, 7),
+        "DT tid (sek/kille)": np.full(n, 60), "DT vila (sek/kille)": np.full(n, 3),
+        "Älskar": np.select([vit | svart | jobb, hemma], [8, 6], 0).astype(np.int64),
+        "Sover med": np.where(vit | svart | jobb, 1, 0).astype(np.int64),
+        L["LBL_PAPPAN"]: _only(slump, pap), L["LBL_GRANNAR"]: _only(slump, gra),
+        L["LBL_NILS_VANNER"]: _only(slump, nv), L["LBL_NILS_FAMILJ"]: _only(slump, nf),
+        L["LBL_BEKANTA"]: _only(slump, bek), L["LBL_ESK"]: _only(slump, esk),
+        "Bonus deltagit": np.zeros(n, dtype=np.int64),
+        "Personal deltagit": _only(slump, pd_),
+        "Nils": np.zeros(n, dtype=np.int64),
+    }
+    return out
+
+
+# =============================
+# Publikt API
+# =============================
+
+def rand_esk(cfg: Dict[str, Any], rng: np.random.Generator, n: int = 1) -> np.ndarray:
+    """Eskilstuna-killar inom [ESK_MIN, ESK_MAX]."""
+    lo = int(cfg.get("ESK_MIN", 0)); hi = int(cfg.get("ESK_MAX", lo))
+    if hi < lo:
+        hi = lo
+    return rng.integers(lo, hi + 1, size=n) if hi > lo else np.full(n, lo, dtype=np.int64)
+
+
+def generate(
+    scenario: str,
+    hist: Dict[str, Any],
+    cfg: Dict[str, Any],
+    rng: Optional[np.random.Generator] = None,
+    n: int = 1,
+    super_acc: int = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    N indatarader för ett scenario (SCENARIOS). Samma RNG-seed -> samma rader.
+    Returnerar arrayer (längd n) nycklade på radkolumnerna.
+    """
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Okänt scenario: {scenario}")
+    rng = rng if rng is not None else np.random.default_rng()
+    types = np.full(int(n), scenario, dtype=object)
+    return fill_scenes(types, hist, cfg, np.full(int(n), int(super_acc), dtype=np.int64), rng)
+
+
+# Radkolumn -> inputnyckel i appen (källorna slås upp via etiketterna i cfg)
+_INPUT_KEYS = {
+    "Män": "in_man", "Svarta": "in_svarta", "Fitta": "in_fitta", "Rumpa": "in_rumpa",
+    "DP": "in_dp", "DPP": "in_dpp", "DAP": "in_dap", "TAP": "in_tap",
+    "Tid S": "in_tid_s", "Tid D": "in_tid_d", "Vila": "in_vila",
+    "DT tid (sek/kille)": "in_dt_tid", "DT vila (sek/kille)": "in_dt_vila",
+    "Älskar": "in_alskar", "Sover med": "in_sover",
+    "LBL_PAPPAN": "in_pappan", "LBL_GRANNAR": "in_grannar",
+    "LBL_NILS_VANNER": "in_nils_vanner", "LBL_NILS_FAMILJ": "in_nils_familj",
+    "LBL_BEKANTA": "in_bekanta", "LBL_ESK": "in_eskilstuna",
+    "Bonus deltagit": "in_bonus_deltagit", "Personal deltagit": "in_personal_deltagit",
+    "Nils": "in_nils",
+}
+
+
+def as_inputs(rows: Dict[str, np.ndarray], cfg: Dict[str, Any], i: int = 0) -> Dict[str, int]:
+    """Rad i ur generate() som appens inputnycklar (in_*) -> int."""
+    out: Dict[str, int] = {}
+    for col, key in _INPUT_KEYS.items():
+        src = cfg.get(col, col) if col.startswith("LBL_") else col
+        out[key] = int(rows[src][i])
+    return out
@@ -0,0 +1,248 @@
+# settings.py — typad, oföränderlig ögonblicksbild av profilens inställningar (CFG)
+#
+# CFG i appen är en vanlig dict som sidopanelen skriver i. Beräkningsmodulerna
+# (ekonomi, statistik, live, what-if) läser i stället en Settings: alla kända
+# nycklar tvingas till rätt typ och valideras EN gång, härledda värden
+# (etikettlista, summa MAX, målvikt, ålder) räknas i förväg och content_hash
+# (hash av innehållet) kan användas som cachenyckel. Settings beter sig som en
+# skrivskyddad dict (Mapping), så den kan skickas dit en cfg-dict förväntas.
+# snapshot(cfg) memoiserar på innehållet, så samma CFG ger samma objekt.
+
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import types
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterator, List, Tuple
+
+# nyckel -> (typ, standardvärde); ordningen = visningsordningen i defaults()
+_FIELDS: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict([
+    # Basdatum
+    ("startdatum",   ("date", date(1990, 1, 1))),
+    ("starttid",     ("time", time(7, 0))),
+    ("fodelsedatum", ("date", date(1970, 1, 1))),
+
+    # Ekonomi – styrbart
+    ("avgift_usd",              ("float", 30.0)),    # Avgift per prenumerant
+    ("ECON_COST_PER_HOUR",      ("float", 15.0)),    # Kostnad män (USD per person-timme)
+    ("ECON_REVENUE_PER_KANNER", ("float", 30.0)),    # Intäkt per "känner"-enhet
+    ("ECON_WAGE_SHARE_PCT",     ("float", 8.0)),     # Lön % av Intäkt företag
+    ("ECON_WAGE_MIN",           ("float", 150.0)),
+    ("ECON_WAGE_MAX",           ("float", 800.0)),
+
+    # Betygssystem-parametrar
+    # Het betyg anges i sidopanelen (1–70). Ålder beräknas från startdatum–födelsedatum i live.
+    ("HET_BETYG", ("int", 35)),
+
+    # Personal-bas
+    ("PROD_STAFF", ("int", 800)),
+
+    # Bonus
+    ("BONUS_AVAILABLE", ("int", 500)),
+    ("BONUS_PCT",       ("float", 1.0)),
+    ("SUPER_BONUS_PCT", ("float", 0.1)),
+    ("SUPER_BONUS_ACC", ("int", 0)),
+
+    # BMI (höjd kvar för UI, ej i beräkning)
+    ("BMI_GOAL",  ("float", 21.7)),
+    ("HEIGHT_CM", ("float", 164.0)),
+
+    # Standard SÖMN efter scen (timmar)
+    ("EXTRA_SLEEP_H", ("float", 7.0)),
+
+    # Eskilstuna-intervall (fallback om ingen historik)
+    ("ESK_MIN", ("int", 20)), ("ESK_MAX", ("int", 40)),
+
+    # Maxvärden (källor)
+    ("MAX_PAPPAN", ("int", 100)), ("MAX_GRANNAR", ("int", 100)),
+    ("MAX_NILS_VANNER", ("int", 100)), ("MAX_NILS_FAMILJ", ("int", 100)),
+    ("MAX_BEKANTA", ("int", 100)),
+
+    # Etiketter
+    ("LBL_PAPPAN",      ("str", "Pappans vänner")),
+    ("LBL_GRANNAR",     ("str", "Grannar")),
+    ("LBL_NILS_VANNER", ("str", "Nils vänner")),
+    ("LBL_NILS_FAMILJ", ("str", "Nils familj")),
+    ("LBL_BEKANTA",     ("str", "Bekanta")),
+    ("LBL_ESK",         ("str", "Eskilstuna killar")),
+])
+
+LBL_KEYS = ("LBL_PAPPAN", "LBL_GRANNAR", "LBL_NILS_VANNER", "LBL_NILS_FAMILJ", "LBL_BEKANTA", "LBL_ESK")
+# Källornas max (summan = "Summa MAX" i statistiken; Bekanta räknas inte in)
+SOURCE_MAX_KEYS = ("MAX_PAPPAN", "MAX_GRANNAR", "MAX_NILS_VANNER", "MAX_NILS_FAMILJ")
+_NON_NEGATIVE = SOURCE_MAX_KEYS + ("MAX_BEKANTA", "ESK_MIN", "ESK_MAX", "PROD_STAFF", "avgift_usd",
+                                   "ECON_COST_PER_HOUR", "ECON_WAGE_MIN", "ECON_WAGE_MAX", "EXTRA_SLEEP_H")
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y")
+
+_SNAPSHOTS: "OrderedDict[str, Settings]" = OrderedDict()
+_SNAPSHOTS_MAX = 16
+_LOCK = threading.Lock()
+
+
+def defaults() -> Dict[str, Any]:
+    """Standardinställningar (ny dict)."""
+    return {k: default for k, (_, default) in _FIELDS.items()}
+
+
+def _parse(kind: str, v: Any) -> Any:
+    """Värdet tvingat till `kind`; ValueError om det inte går."""
+    if kind == "date":
+        if isinstance(v, datetime):
+            return v.date()
+        if isinstance(v, date):
+            return v
+        s = str(v).strip()
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(s, fmt).date()
+            except ValueError:
+                pass
+        raise ValueError(s)
+    if kind == "time":
+        if isinstance(v, time):
+            return v
+        parts = str(v).strip().split(":")
+        return time(int(parts[0]), int(parts[1]) if len(parts) > 1 else 0, int(parts[2]) if len(parts) > 2 else 0)
+    if kind == "float":
+        return float(str(v).strip().replace(",", ".")) if isinstance(v, str) else float(v)
+    if kind == "int":
+        return int(float(str(v).strip().replace(",", "."))) if isinstance(v, str) else int(float(v))
+    return str(v)
+
+
+def coerce(cfg: Mapping) -> Dict[str, Any]:
+    """
+    Kända nycklar i cfg tvingade till rätt typ (okända behålls orörda). Värden
+    som inte går att tolka ersätts tyst med standardvärdet – ta snapshot() av
+    de råa värdena först om problemen ska visas.
+    """
+    out = dict(cfg)
+    for k, v in cfg.items():
+        spec = _FIELDS.get(k)
+        if spec is None:
+            continue
+        try:
+            out[k] = _parse(spec[0], v)
+        except Exception:
+            out[k] = spec[1]
+    return out
+
+
+def _age(on: date, birth: date) -> int:
+    return on.year - birth.year - ((on.month, on.day) < (birth.month, birth.day))
+
+
+class Settings(Mapping):
+    """
+    Oföränderliga, typade inställningar. Kända nycklar finns som attribut
+    (s.MAX_PAPPAN, s.startdatum …) och via s["…"]/s.get; okända nycklar
+    följer med orörda i mappningen. Härlett:
+      labels         etiketterna (LBL_*) i ordning
+      label_map      {"P", "G", "NV", "NF", "BE", "ES"} -> etikett (skrivskyddad)
+      source_max     MAX för P/G/NV/NF (float)
+      max_sum        summan av source_max
+      age            ålder vid startdatum (år, minst 1)
+      height_m       längd i meter (HEIGHT_CM ≤ 3 tolkas som meter)
+      target_weight  målvikt = BMI_GOAL * längd² (kg, 1 decimal)
+      content_hash   sha1 av innehållet (cachenyckel)
+      problems       nycklar som inte gick att tolka / var ogiltiga (text)
+    """
+
+    __slots__ = tuple(_FIELDS) + ("_data", "labels", "label_map", "source_max", "max_sum", "age",
+                                  "height_m", "target_weight", "content_hash", "problems")
+
+    def __init__(self, cfg: Mapping = ()):
+        problems: List[str] = []
+        data = dict(cfg)
+        for k, (kind, default) in _FIELDS.items():
+            if k not in data or data[k] is None or data[k] == "":
+                data[k] = default
+                continue
+            try:
+                data[k] = _parse(kind, data[k])
+            except Exception:
+                problems.append(f"{k}: kunde inte tolka {data[k]!r}, använder {default!r}")
+                data[k] = default
+        for k in _NON_NEGATIVE:
+            if data[k] < 0:
+                problems.append(f"{k}: negativt värde {data[k]!r}, använder 0")
+                data[k] = type(data[k])(0)
+        for lo, hi in (("ESK_MIN", "ESK_MAX"), ("ECON_WAGE_MIN", "ECON_WAGE_MAX")):
+            if data[lo] > data[hi]:
+                problems.append(f"{lo} ({data[lo]}) är större än {hi} ({data[hi]})")
+
+        set_ = object.__setattr__
+        for k in _FIELDS:
+            set_(self, k, data[k])
+        # Skrivskyddade vyer – samma Settings delas mellan sessioner via snapshot()
+        set_(self, "_data", types.MappingProxyType(data))
+        set_(self, "problems", tuple(problems))
+
+        labels = tuple(data[k] for k in LBL_KEYS)
+        set_(self, "labels", labels)
+        set_(self, "label_map", types.MappingProxyType(dict(zip(("P", "G", "NV", "NF", "BE", "ES"), labels))))
+        source_max = tuple(float(data[k]) for k in SOURCE_MAX_KEYS)
+        set_(self, "source_max", source_max)
+        set_(self, "max_sum", sum(source_max))
+        try:
+            age = _age(data["startdatum"], data["fodelsedatum"])
+        except Exception:
+            age = 30
+        set_(self, "age", max(1, age))
+        height_cm = data["HEIGHT_CM"] * 100.0 if data["HEIGHT_CM"] <= 3.0 else data["HEIGHT_CM"]
+        set_(self, "height_m", height_cm / 100.0)
+        set_(self, "target_weight", round(data["BMI_GOAL"] * (height_cm / 100.0) ** 2, 1))
+        set_(self, "content_hash", _content_hash(data))
+
+    # --- oföränderlig ---
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Settings är oföränderlig – ändra CFG och ta en ny snapshot()")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Settings är oföränderlig – ändra CFG och ta en ny snapshot()")
+
+    def __reduce__(self):
+        return (Settings, (dict(self._data),))
+
+    # --- Mapping ---
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"Settings({self.content_hash[:12]})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Typad kopia som vanlig (muterbar) dict."""
+        return dict(self._data)
+
+
+def _content_hash(data: Mapping) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str, ensure_ascii=False).encode()).hexdigest()
+
+
+def snapshot(cfg: Mapping) -> Settings:
+    """Settings för cfg (samma innehåll -> samma objekt). En Settings returneras som den är."""
+    if isinstance(cfg, Settings):
+        return cfg
+    key = _content_hash(cfg)
+    with _LOCK:
+        hit = _SNAPSHOTS.get(key)
+        if hit is not None:
+            _SNAPSHOTS.move_to_end(key)
+            return hit
+    s = Settings(cfg)
+    with _LOCK:
+        _SNAPSHOTS[key] = s
+        while len(_SNAPSHOTS) > _SNAPSHOTS_MAX:
+            _SNAPSHOTS.popitem(last=False)
+    return s
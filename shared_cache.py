@@ -0,0 +1,123 @@
+# shared_cache.py — processvid cache för profilinställningar/data (delas av alla sessioner)
+#
+# Nyckel: (kalkylark, profil, typ, version, token). Versionen räknas upp när
+# någon session i processen skriver till profilens blad (bump), så en skrivning
+# ogiltigförklarar alla sessioners kopior på en gång. Token är bladens
+# fingeravtryck från ändringsproben i sheets_utils (fångar ändringar gjorda av
+# andra processer/användare). Utrymmet begränsas av uppskattad minnesstorlek
+# (LRU), inte antal poster.
+#
+# Värdena delas mellan sessioner och får inte muteras – get_or_load() lämnar ut en
+# egen kopia: DataFrame djupt (utan pandas copy-on-write delar en grund kopia
+# databuffertar, så en ändring på plats skulle synas i alla sessioner),
+# dict/list grunt så att nyckeländringar stannar lokalt.
+
+from __future__ import annotations
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MAX_BYTES = int(float(os.environ.get("MALIN_CACHE_MB", "256")) * 1024 * 1024)
+
+_LOCK = threading.RLock()
+_ENTRIES: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()  # nyckel -> (värde, bytes)
+_VERSIONS: Dict[Tuple[str, str, str], int] = {}
+_STATS = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+def _sizeof(value: Any) -> int:
+    """Uppskattad minnesstorlek (DataFrame exakt, övrigt via JSON-längd)."""
+    mu = getattr(value, "memory_usage", None)
+    if callable(mu):
+        try:
+            return int(mu(deep=True).sum())
+        except Exception:
+            pass
+    try:
+        return len(json.dumps(value, default=str).encode("utf-8")) * 2
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _session_copy(value: Any) -> Any:
+    if hasattr(value, "copy") and hasattr(value, "columns"):
+        return value.copy(deep=True)
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+# =============================
+# Versioner
+# =============================
+
+def version(sheet: str, profile: str, kind: str) -> int:
+    with _LOCK:
+        return _VERSIONS.get((sheet, profile, kind), 0)
+
+
+def bump(sheet: str, profile: str, kind: str) -> int:
+    """Ny version för (kalkylark, profil, typ); äldre poster rensas direkt."""
+    with _LOCK:
+        v = _VERSIONS.get((sheet, profile, kind), 0) + 1
+        _VERSIONS[(sheet, profile, kind)] = v
+        for key in [k for k in _ENTRIES if k[:3] == (sheet, profile, kind)]:
+            _drop(key)
+        return v
+
+
+# =============================
+# LRU efter storlek
+# =============================
+
+def _drop(key: Hashable) -> None:
+    _, size = _ENTRIES.pop(key)
+    _STATS["bytes"] -= size
+
+
+def get_or_load(sheet: str, profile: str, kind: str, loader: Callable[[], Any], token: Optional[str] = None) -> Any:
+    """
+    Delad kopia för aktuell version + token, annars loader() (utan lås, så
+    långsamma läsningar inte blockerar andra profiler). En skrivning under
+    laddningen höjer versionen och resultatet sparas då inte. En ny token
+    ersätter äldre poster för samma (kalkylark, profil, typ).
+    """
+    with _LOCK:
+        v = _VERSIONS.get((sheet, profile, kind), 0)
+        key = (sheet, profile, kind, v, token)
+        hit = _ENTRIES.get(key)
+        if hit is not None:
+            _ENTRIES.move_to_end(key)
+            _STATS["hits"] += 1
+            return _session_copy(hit[0])
+        _STATS["misses"] += 1
+
+    value = loader()
+    size = _sizeof(value)
+
+    with _LOCK:
+        if _VERSIONS.get((sheet, profile, kind), 0) == v and size <= _MAX_BYTES:
+            for old in [k for k in _ENTRIES if k[:3] == (sheet, profile, kind)]:
+                _drop(old)
+            _ENTRIES[key] = (value, size)
+            _STATS["bytes"] += size
+            while _STATS["bytes"] > _MAX_BYTES and _ENTRIES:
+                _drop(next(iter(_ENTRIES)))
+                _STATS["evictions"] += 1
+    return _session_copy(value)
+
+
+def clear() -> None:
+    with _LOCK:
+        _ENTRIES.clear()
+        _STATS["bytes"] = 0
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        return dict(_STATS, entries=len(_ENTRIES), max_bytes=_MAX_BYTES)
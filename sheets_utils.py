@@ -1,16 +1,44 @@
 # sheets_utils.py — robust 429/backoff + cachead Spreadsheet-handle
 
 from __future__ import annotations
+import hashlib
 import json
-from typing import Any, Dict, List, Optional
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from collections.abc import Mapping
+import threading
 import time
 
 import streamlit as st
-import gspread
-import pandas as pd
-from gspread import Spreadsheet, Worksheet
-from gspread.exceptions import APIError, WorksheetNotFound
+
+import local_store as LS
+import shared_cache as SC
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from gspread import Client, Spreadsheet, Worksheet
+
+
+# =============================
+# Lat import av gspread (+ google-auth) och pandas
+# =============================
+# gspread drar in google-auth/requests/cryptography och tar märkbar tid vid
+# kallstart. Modulen laddas först när Sheets faktiskt används (_gspread()).
+# Innan dess kan inga gspread-fel uppstå, så platshållarna nedan matchar aldrig
+# i except-satserna; _gspread() byter ut dem mot de riktiga klasserna.
+
+class _NotLoaded(Exception):
+    """Platshållare för gspread-undantag innan gspread laddats."""
+
+APIError: type = _NotLoaded
+WorksheetNotFound: type = _NotLoaded
+
+def _gspread():
+    global APIError, WorksheetNotFound
+    import gspread
+    from gspread.exceptions import APIError as _APIError, WorksheetNotFound as _WorksheetNotFound
+    APIError, WorksheetNotFound = _APIError, _WorksheetNotFound
+    return gspread
 
 
 # =============================
@@ -23,12 +51,14 @@ def _normalize_private_key(creds: Dict[str, Any]) -> Dict[str, Any]:
         creds["private_key"] = pk.replace("\\n", "\n")
     return creds
 
+@st.cache_resource(show_spinner=False)
 def _load_google_credentials_dict() -> Dict[str, Any]:
     """
     Stöder GOOGLE_CREDENTIALS som:
       - TOML-tabell / dict
       - JSON-sträng
       - bytes (JSON)
+    Tolkas en gång per process (delas av alla sessioner; ändra inte dicten).
     """
     if "GOOGLE_CREDENTIALS" not in st.secrets:
         raise RuntimeError("GOOGLE_CREDENTIALS saknas i st.secrets.")
@@ -56,8 +86,9 @@ def _load_google_credentials_dict() -> Dict[str, Any]:
     return _normalize_private_key(creds)
 
 @st.cache_resource(show_spinner=False)
-def _get_gspread_client() -> gspread.Client:
+def _get_gspread_client() -> Client:
     creds = _load_google_credentials_dict()
+    gspread = _gspread()
     try:
         client = gspread.service_account_from_dict(creds)
     except Exception as e:
@@ -87,7 +118,272 @@ def get_spreadsheet() -> Spreadsheet:
             last_err = e
             time.sleep(delay)
             delay = min(8.0, delay * 1.8)
-    raise RuntimeError(f"Kunde inte öppna kalkylarket efter flera försök: {last_err}")
+    raise SheetsUnavailable(f"Kunde inte öppna kalkylarket efter flera försök: {last_err}") from last_err
+
+# =============================
+# Offline-läge
+# =============================
+
+class SheetsUnavailable(RuntimeError):
+    """Google Sheets går inte att nå just nu (offline, kvot slut, nätverksfel)."""
+
+_OFFLINE_COOLDOWN_S = 60.0  # hur länge vi litar på lokal cache efter ett nätverksfel
+_OFFLINE: Dict[str, Any] = {"forced": False, "until": 0.0, "reason": ""}
+_SYNC_LOCK = threading.Lock()
+_SYNC_THREAD: Dict[str, Any] = {"thread": None}
+
+def set_offline_mode(on: bool) -> None:
+    """Tvinga offline-läge (allt läses/skrivs lokalt, skrivningar köas)."""
+    _OFFLINE["forced"] = bool(on)
+    if not on:
+        _OFFLINE["until"] = 0.0
+        _OFFLINE["reason"] = ""
+
+def is_offline() -> bool:
+    return bool(_OFFLINE["forced"]) or time.time() < float(_OFFLINE["until"])
+
+def offline_reason() -> str:
+    return "tvingat" if _OFFLINE["forced"] else str(_OFFLINE["reason"])
+
+def _mark_unreachable(err: Exception) -> None:
+    _OFFLINE["until"] = time.time() + _OFFLINE_COOLDOWN_S
+    _OFFLINE["reason"] = str(err)[:200]
+
+def _is_transient(err: BaseException) -> bool:
+    """Nätverks-/kvotfel (värt att falla tillbaka på lokal cache), inte logikfel."""
+    import requests
+
+    e: Optional[BaseException] = err
+    seen = 0
+    while e is not None and seen < 5:
+        if isinstance(e, SheetsUnavailable):
+            return True
+        if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        if isinstance(e, APIError):
+            code = getattr(getattr(e, "response", None), "status_code", None)
+            if code in (429, 500, 502, 503, 504):
+                return True
+        msg = str(e)
+        if "429" in msg or "RATE_LIMIT" in msg or "RESOURCE_EXHAUSTED" in msg:
+            return True
+        e = e.__cause__ or e.__context__
+        seen += 1
+    return False
+
+def _spreadsheet() -> Spreadsheet:
+    """get_spreadsheet() men failar direkt i offline-läge (ingen 30 s backoff)."""
+    if is_offline():
+        raise SheetsUnavailable(f"Offline-läge ({offline_reason()}).")
+    try:
+        return get_spreadsheet()
+    except SheetsUnavailable as e:
+        _mark_unreachable(e)
+        raise
+
+# =============================
+# Delad cache (alla sessioner i processen)
+# =============================
+
+_CACHE_KIND = {"settings": "settings", "rows": "data"}
+
+def _sheet_key() -> str:
+    """Kalkylarkets identitet utan API-anrop (SHEET_URL)."""
+    try:
+        return str(st.secrets.get("SHEET_URL", ""))
+    except Exception:
+        return ""
+
+def _invalidate(profile: str, kind: str) -> None:
+    """Efter skrivning: alla sessioners cachade kopior för profilen blir inaktuella."""
+    SC.bump(_sheet_key(), profile, _CACHE_KIND.get(kind, kind))
+    _PROBE["at"] = 0.0  # nästa läsning probar på nytt
+
+# =============================
+# Ändringsdetektering (ett metadata-anrop)
+# =============================
+# I stället för fasta TTL:er eller fulla läsningar revalideras alla cacher mot
+# en probe: spreadsheets.get med includeGridData för små intervall ger per blad
+#   - rad-/kolumnantal (databladen växer med varje append, se INSERT_ROWS)
+#   - headern (rad 1) för 'Data - …', hela innehållet för små blad (Profil/Settings)
+# i ETT anrop. Resultatet delas av alla sessioner under _PROBE_MIN_INTERVAL_S
+# så att en omkörning (flera läsningar) bara kostar en probe.
+
+_PROBE_MIN_INTERVAL_S = 2.0
+_PROBE_SMALL_RANGE = "A1:B500"
+_PROBE_FIELDS = "sheets(properties(title,gridProperties(rowCount,columnCount)),data(rowData(values(formattedValue))))"
+_PROBE_LOCK = threading.Lock()
+_PROBE: Dict[str, Any] = {"at": 0.0, "titles": None, "fp": {}}
+
+def _probe_range(title: str) -> str:
+    q = "'" + title.replace("'", "''") + "'"
+    return f"{q}!1:1" if title.startswith("Data - ") else f"{q}!{_PROBE_SMALL_RANGE}"
+
+def _fingerprints(meta: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for sh in meta.get("sheets", []):
+        props = sh.get("properties", {})
+        grid = props.get("gridProperties", {})
+        content = json.dumps(sh.get("data", []), sort_keys=True, ensure_ascii=False)
+        out[props.get("title", "")] = {
+            "rows": grid.get("rowCount"),
+            "cols": grid.get("columnCount"),
+            "head": hashlib.sha1(content.encode("utf-8")).hexdigest(),
+        }
+    return out
+
+def probe_sheets(force: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Fingeravtryck per blad: {titel: {"rows", "cols", "head"}}.
+    Ett metadata-anrop per probe (plus ett billigt för bladlistan första gången
+    och när ett blad tillkommit/försvunnit).
+    """
+    with _PROBE_LOCK:
+        if not force and _PROBE["titles"] is not None and time.time() - _PROBE["at"] < _PROBE_MIN_INTERVAL_S:
+            return _PROBE["fp"]
+        ss = _spreadsheet()
+        titles = _PROBE["titles"]
+        if titles is None:
+            meta = ss.fetch_sheet_metadata(params={"fields": "sheets(properties(title))"})
+            titles = [sh["properties"]["title"] for sh in meta.get("sheets", [])]
+        fp: Dict[str, Dict[str, Any]] = {}
+        if titles:
+            try:
+                meta = ss.fetch_sheet_metadata(params={
+                    "includeGridData": "true",
+                    "ranges": [_probe_range(t) for t in titles],
+                    "fields": _PROBE_FIELDS,
+                })
+            except APIError:
+                _PROBE["titles"] = None  # blad borttaget/omdöpt -> läs om listan nästa gång
+                raise
+            fp = _fingerprints(meta)
+        _PROBE.update(at=time.time(), titles=titles, fp=fp)
+        return fp
+
+def _sheet_token(titles: List[str]) -> Optional[str]:
+    """Sammanslaget fingeravtryck för bladen (None om inget av dem finns i proben)."""
+    fp = probe_sheets()
+    parts = [fp.get(t) for t in titles]
+    if not any(parts):
+        _PROBE["titles"] = None  # kan vara nytt blad -> läs om bladlistan vid nästa probe
+        return None
+    return json.dumps(parts, sort_keys=True)
+
+def _cached(profile: str, kind: str, titles: List[str], loader):
+    """Delad kopia (shared_cache) så länge bladens fingeravtryck är oförändrade."""
+    token = _sheet_token(titles)
+    if token is None:
+        return loader()
+    return SC.get_or_load(_sheet_key(), profile, kind, loader, token=token)
+
+def _probe_head(title: str) -> Optional[str]:
+    try:
+        return (probe_sheets().get(title) or {}).get("head")
+    except Exception:
+        return None
+
+def _online_or_local(online, local, profile: Optional[str] = None):
+    """
+    Kör online-läsning; vid nätverks-/kvotfel (eller offline) används lokal cache.
+    profile: läsningen gäller den profilen (eller det bladet) – har den egna
+    köade skrivningar är Sheets inte komplett ännu och den lokala kopian läses.
+    """
+    # Kön synkas inte här (bakgrundstråden / "Synka nu") – en läsning ska aldrig vänta på den
+    if is_offline() or (profile is not None and LS.pending_count(profile) > 0):
+        return local()
+    try:
+        return online()
+    except Exception as e:
+        if not _is_transient(e):
+            raise
+        _mark_unreachable(e)
+        return local()
+
+def pending_writes() -> int:
+    """Antal skrivningar som väntar på att synkas till Sheets."""
+    return LS.pending_count()
+
+# Ett icke-transient fel (felaktig payload, borttaget blad …) försöks så här
+# många gånger innan skrivningen flyttas till LS:s dead-letter-tabell.
+_MAX_SYNC_ATTEMPTS = 5
+
+def failed_writes() -> List[Dict[str, Any]]:
+    """Skrivningar som gett upp efter _MAX_SYNC_ATTEMPTS försök (visas i appen)."""
+    return LS.dead_letters()
+
+def retry_failed_writes(entry_id: Optional[int] = None) -> None:
+    """Lägg tillbaka en (eller alla) misslyckade skrivningar i kön."""
+    LS.requeue_dead(entry_id)
+
+def discard_failed_writes(entry_id: Optional[int] = None) -> None:
+    """Släng en (eller alla) misslyckade skrivningar."""
+    LS.drop_dead(entry_id)
+
+def sync_pending_writes(max_items: int = 500) -> int:
+    """
+    Töm skrivkön mot Sheets i ordning. Efter varje skriven chunk krymps
+    köposten till raderna som återstår, så ett avbrott mitt i en batch aldrig
+    skriver samma rader två gånger. Vid nätverks-/kvotfel avbryts synken
+    och offline markeras. Vid andra fel hoppas resten av den profilens
+    skrivningar över (ordningen per profil bevaras) men övriga profiler synkas;
+    efter _MAX_SYNC_ATTEMPTS försök flyttas skrivningen till failed_writes().
+    Returnerar antal synkade.
+    """
+    if not _SYNC_LOCK.acquire(blocking=False):
+        return 0  # en annan tråd synkar redan
+    done = 0
+    blocked = set()
+    try:
+        for entry_id, kind, profile, payload in LS.pending(max_items):
+            if is_offline():
+                break
+            if profile in blocked:
+                continue
+            def _progress(n: int, entry_id=entry_id, payload=payload) -> None:
+                LS.shrink_entry(entry_id, payload[n:])
+                _invalidate(profile, kind)
+
+            try:
+                if kind == "settings":
+                    _online_save_settings(profile, payload)
+                elif kind == "rows":
+                    _online_append_rows_batch(profile, payload, progress=_progress)
+                elif kind == "shared":
+                    _online_append_shared(profile, payload, progress=_progress)
+                LS.mark_done(entry_id)
+                _invalidate(profile, kind)
+                done += 1
+            except Exception as e:
+                attempts = LS.mark_failed(entry_id, str(e))
+                if _is_transient(e):
+                    _mark_unreachable(e)
+                    break
+                if attempts >= _MAX_SYNC_ATTEMPTS:
+                    LS.move_to_dead(entry_id)
+                blocked.add(profile)
+    finally:
+        _SYNC_LOCK.release()
+    return done
+
+def start_background_sync(interval_s: float = 30.0) -> None:
+    """Starta (en gång per process) en bakgrundstråd som synkar skrivkön."""
+    t = _SYNC_THREAD["thread"]
+    if t is not None and t.is_alive():
+        return
+
+    def _loop():
+        while True:
+            time.sleep(interval_s)
+            try:
+                if LS.pending_count() > 0 and not is_offline():
+                    sync_pending_writes()
+            except Exception:
+                pass
+
+    t = threading.Thread(target=_loop, name="sheets-sync", daemon=True)
+    _SYNC_THREAD["thread"] = t
+    t.start()
 
 def _get_ws_by_title(ss: Spreadsheet, title: str) -> Optional[Worksheet]:
     try:
@@ -112,6 +408,7 @@ def _get_or_create_primary_data_ws(ss: Spreadsheet, profile: str) -> Worksheet:
     ws = _get_ws_by_title(ss, title)
     if ws is not None:
         return ws
+    _PROBE["titles"] = None  # nytt blad -> proben läser om bladlistan
     return ss.add_worksheet(title=title, rows=1, cols=1)
 
 
@@ -119,25 +416,30 @@ def _get_or_create_primary_data_ws(ss: Spreadsheet, profile: str) -> Worksheet:
 # Profiler
 # =============================
 
-@st.cache_data(show_spinner=False, ttl=5)
-def list_profiles() -> List[str]:
-    """
-    Läs profilnamn från bladet 'Profil', kolumn A. Cacheas i 5 sek.
-    Kastar inte vidare läsfel — returnerar [] istället, hanteras i app.py.
-    """
-    ss = get_spreadsheet()
+def _online_list_profiles() -> List[str]:
+    ss = _spreadsheet()
     ws = _get_ws_by_title(ss, "Profil")
     if ws is None:
         return []
-    try:
-        col = ws.col_values(1)  # 1 läsning (snålt)
-    except APIError:
-        return []
+    col = ws.col_values(1)  # 1 läsning (snålt)
     names = [x.strip() for x in col if x and x.strip()]
     if names and names[0].lower() in ("profil", "namn", "profiles", "name"):
         names = names[1:]
+    LS.put_profiles(names)
     return names
 
+def list_profiles() -> List[str]:
+    """
+    Läs profilnamn från bladet 'Profil', kolumn A. Delas mellan sessioner och
+    läses om först när proben visar att bladet ändrats.
+    Offline/kvot slut: senast kända lista från lokal cache.
+    Kastar inte vidare läsfel — returnerar [] istället, hanteras i app.py.
+    """
+    try:
+        return _online_or_local(lambda: _cached("", "profiles", ["Profil"], _online_list_profiles), LS.get_profiles)
+    except APIError:
+        return []
+
 
 # =============================
 # Inställningar (key/value)
@@ -147,6 +449,7 @@ def _coerce_setting(key: str, val: Any) -> Any:
     if val is None:
         return None
     s = str(val).strip()
+    import pandas as pd
 
     def _to_date(x: str):
         try:
@@ -177,8 +480,11 @@ def _coerce_setting(key: str, val: Any) -> Any:
     try:
         if "." in s or "," in s:
             s2 = s.replace(",", ".")
-            return float(s2)
-        return int(s)
+            f = float(s2)
+            # BONUS_RATE får lagras som procent (1–100) eller andel (0–1)
+            return f / 100.0 if key == "BONUS_RATE" and f > 1.0 else f
+        i = int(s)
+        return i / 100.0 if key == "BONUS_RATE" and i > 1 else i
     except Exception:
         return val
 
@@ -196,7 +502,7 @@ def _read_kv_sheet(ws: Worksheet) -> Dict[str, Any]:
             if not r:
                 continue
             key = (r[0] or "").strip()
-            if not key:
+            if not key or key.lower() in ("key", "nyckel"):
                 continue
             val = r[1] if len(r) > 1 else ""
             out[key] = _coerce_setting(key, val)
@@ -215,8 +521,19 @@ def _read_kv_sheet(ws: Worksheet) -> Dict[str, Any]:
 def _settings_candidates(profile: str) -> List[str]:
     return [f"Settings - {profile}", f"{profile}__settings", profile]
 
-def read_profile_settings(profile: str) -> Dict[str, Any]:
-    ss = get_spreadsheet()
+def _setting_to_writable(v: Any) -> Any:
+    """date -> 'YYYY-MM-DD', time -> 'HH:MM:SS' (samma form som i bladet)."""
+    import datetime as _dt
+    if isinstance(v, _dt.datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, _dt.date):
+        return v.isoformat()
+    if isinstance(v, _dt.time):
+        return v.strftime("%H:%M:%S")
+    return v
+
+def _online_read_settings(profile: str) -> Dict[str, Any]:
+    ss = _spreadsheet()
     ws = None
     for title in _settings_candidates(profile):
         ws = _get_ws_by_title(ss, title)
@@ -225,33 +542,77 @@ def read_profile_settings(profile: str) -> Dict[str, Any]:
     if ws is None:
         return {}
     try:
-        return _read_kv_sheet(ws)
+        cfg = _read_kv_sheet(ws)
     except APIError as e:
         raise RuntimeError(f"Kunde inte läsa inställningar för '{profile}': {e}")
+    LS.put_settings(profile, {k: _setting_to_writable(v) for k, v in cfg.items()})
+    return cfg
 
-def save_profile_settings(profile: str, cfg: Dict[str, Any]) -> None:
-    ss = get_spreadsheet()
+def _local_read_settings(profile: str) -> Dict[str, Any]:
+    raw = LS.get_settings(profile) or {}
+    return {k: _coerce_setting(k, v) for k, v in raw.items()}
+
+def read_profile_settings(profile: str) -> Dict[str, Any]:
+    """
+    Läs profilens inställningar; lokal cache vid offline/kvot slut.
+    Online-läsningen delas mellan sessioner (shared_cache) tills någon skriver.
+    """
+    def _online() -> Dict[str, Any]:
+        return _cached(profile, "settings", _settings_candidates(profile), lambda: _online_read_settings(profile))
+
+    return _online_or_local(_online, lambda: _local_read_settings(profile), profile)
+
+def _online_save_settings(profile: str, cfg: Dict[str, Any]) -> None:
+    ss = _spreadsheet()
     title = _settings_candidates(profile)[0]  # 'Settings - {profile}'
     ws = _get_ws_by_title(ss, title)
     if ws is None:
         ws = ss.add_worksheet(title=title, rows=2, cols=2)
+        _PROBE["titles"] = None
 
-    def _to_writable(v: Any) -> Any:
-        try:
-            import datetime as _dt
-            if isinstance(v, _dt.date) and not isinstance(v, _dt.datetime):
-                return v.isoformat()
-            if isinstance(v, _dt.time):
-                return v.strftime("%H:%M:%S")
-        except Exception:
-            pass
-        return v
-
-    rows = [[k, _to_writable(v)] for k, v in cfg.items()]
+    rows = [[k, _setting_to_writable(v)] for k, v in cfg.items()]
     ws.clear()
     if rows:
         ws.update("A1", rows)
 
+def save_profile_settings(profile: str, cfg: Dict[str, Any]) -> None:
+    """
+    Spara inställningar. Lokala cachen uppdateras alltid; når vi inte Sheets
+    (eller det finns köade skrivningar före) läggs skrivningen i kön.
+    """
+    writable = {k: _setting_to_writable(v) for k, v in cfg.items()}
+    LS.put_settings(profile, writable)
+    _write_or_enqueue("settings", profile, writable, lambda progress: _online_save_settings(profile, cfg))
+
+def _write_or_enqueue(kind: str, profile: str, payload: Any, online) -> bool:
+    """
+    True om skrivningen gick direkt till Sheets, False om den (eller resten av
+    den) köades. online(progress): progress(n) anropas efter varje skriven
+    chunk med antalet payload-rader som hittills skrivits – vid nätverks-/kvotfel
+    mitt i en batch köas bara raderna efter dem. Kön synkas av bakgrundstråden.
+    """
+    if not is_offline() and LS.pending_count(profile) == 0:
+        written = [0]
+
+        def _progress(n: int) -> None:
+            written[0] = n
+
+        try:
+            online(_progress)
+            _invalidate(profile, kind)
+            return True
+        except Exception as e:
+            if not _is_transient(e):
+                raise
+            _mark_unreachable(e)
+        if written[0]:
+            _invalidate(profile, kind)
+            payload = payload[written[0]:]
+            if not payload:
+                return True
+    LS.enqueue(kind, profile, payload)
+    return False
+
 
 # =============================
 # Data – läsa & skriva
@@ -262,37 +623,360 @@ def _records_to_dataframe(records: List[Dict[str, Any]]) -> pd.DataFrame:
     Viktigt: vi gör **ingen** numerisk tvångskonvertering här.
     Allt lämnas som object/str för att undvika NaN→int-fel i app-logiken.
     """
+    import pandas as pd
+
     if not records:
         return pd.DataFrame()
     normed = [{k: ("" if v is None else v) for k, v in rec.items()} for rec in records]
     return pd.DataFrame(normed, dtype=object)
 
+def _online_read_data(profile: str) -> List[Dict[str, Any]]:
+    ss = _spreadsheet()
+    ws = _get_or_create_primary_data_ws(ss, profile)
+
+    try:
+        records = ws.get_all_records(default_blank="")
+    except APIError as e:
+        raise RuntimeError(f"Kunde inte läsa data för '{profile}': {e}")
+
+    LS.replace_rows(profile, records)
+    return records
+
+def _local_rows(profile: str, tail: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Lokal kopia (inkl. köade rader); SheetsUnavailable om profilen saknar båda."""
+    if not LS.has_rows(profile) and LS.pending_count(profile, kind="rows") == 0:
+        raise SheetsUnavailable(f"Offline och ingen lokal kopia av data för '{profile}'.")
+    return LS.get_rows(profile, tail=tail)
+
 def read_profile_data(profile: str) -> pd.DataFrame:
     """
     Läs alla rader för profil från **endast** 'Data - {profile}'.
     Skapa bladet om det saknas. Inga andra blad används.
+    Offline/kvot slut: lokal kopia (inkl. köade rader).
+    Den tolkade DataFrame:n delas mellan sessioner (shared_cache) tills någon
+    skriver till profilen – behandla den som skrivskyddad.
+    """
+    def _online():
+        return _cached(profile, "data", [_primary_data_title(profile)], lambda: _records_to_dataframe(_online_read_data(profile)))
+
+    return _online_or_local(_online, lambda: _records_to_dataframe(_local_rows(profile)), profile)
+
+def _col_letter(col: int) -> str:
+    """1 -> 'A', 27 -> 'AA'."""
+    from gspread.utils import rowcol_to_a1
+
+    return rowcol_to_a1(1, col)[:-1]
+
+def _is_blank_row(r: List[Any]) -> bool:
+    return not any(str(c).strip() for c in r)
+
+def _values_to_records(headers: List[str], values: List[List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Samma form som get_all_records(default_blank=""): rader paddas till
+    headerns längd och numeriska strängar görs om till tal.
+    """
+    from gspread.utils import numericise_all
+
+    width = len(headers)
+    out: List[Dict[str, Any]] = []
+    for r in values:
+        r = list(r[:width]) + [""] * max(0, width - len(r))
+        out.append(dict(zip(headers, numericise_all(r, default_blank=""))))
+    return out
+
+# Header-cache per (kalkylark, blad) -> (probens header-avtryck, header).
+# Skrivvägarna läser alltid färsk header (kolumnpositioner får inte vara
+# inaktuella); läsvägarna revaliderar mot proben.
+_HEADER_CACHE: Dict[tuple, tuple] = {}
+
+def _remember_headers(ws: Worksheet, headers: List[str], head: Optional[str] = None) -> None:
+    _HEADER_CACHE[(ws.spreadsheet.id, ws.title)] = (head, [str(h) for h in headers])
+
+def _get_headers(ws: Worksheet, refresh: bool = False) -> List[str]:
+    key = (ws.spreadsheet.id, ws.title)
+    head = None if refresh else _probe_head(ws.title)
+    hit = _HEADER_CACHE.get(key)
+    if refresh or hit is None or hit[0] is None or hit[0] != head:
+        _remember_headers(ws, ws.row_values(1), head)
+    return _HEADER_CACHE[key][1]
+
+def _typed_projection(raw: Dict[str, List[Any]], columns: List[str], text_columns: tuple) -> pd.DataFrame:
+    import pandas as pd
+
+    n = max((len(v) for v in raw.values()), default=0)
+    data: Dict[str, Any] = {}
+    for c in columns:
+        vals = raw.get(c, [])
+        vals = vals + [""] * (n - len(vals))
+        if c in text_columns:
+            data[c] = pd.Series(vals, dtype=object).astype(str)
+        else:
+            data[c] = pd.to_numeric(pd.Series(vals, dtype=object), errors="coerce").astype(float)
+    return pd.DataFrame(data, columns=list(columns))
+
+def read_profile_columns(profile: str, columns: List[str], text_columns: tuple = ("Datum", "Veckodag", "Typ", "Profil")) -> pd.DataFrame:
     """
-    ss = get_spreadsheet()
+    Läs **endast** angivna kolumner från 'Data - {profile}'.
+    Kolumnnamnen slås upp mot cachead header och varje kolumn hämtas som
+    eget intervall (t.ex. 'C2:C') i ett enda batch_get-anrop.
+
+    Returnerar en typad DataFrame i begärd ordning: numeriska kolumner som
+    float (NaN där cellen är tom/ogiltig), text_columns som str.
+    Kolumner som saknas i bladet blir helt NaN/"".
+    """
+    def _local() -> pd.DataFrame:
+        recs = _local_rows(profile)
+        return _typed_projection({c: [r.get(c, "") for r in recs] for c in columns}, columns, text_columns)
+
+    return _online_or_local(lambda: _online_read_columns(profile, columns, text_columns), _local, profile)
+
+def _online_read_columns(profile: str, columns: List[str], text_columns: tuple) -> pd.DataFrame:
+    ss = _spreadsheet()
     ws = _get_or_create_primary_data_ws(ss, profile)
 
     try:
-        records = ws.get_all_records(default_blank="")
+        headers = _get_headers(ws)
+        missing = [c for c in columns if c not in headers]
+        if missing:
+            # Headern kan ha utökats av en annan session – läs om en gång
+            headers = _get_headers(ws, refresh=True)
+        found = [c for c in columns if c in headers]
+        ranges = []
+        for c in found:
+            letter = _col_letter(headers.index(c) + 1)
+            ranges.append(f"{letter}2:{letter}")
+        value_ranges = ws.batch_get(ranges, major_dimension="COLUMNS") if ranges else []
     except APIError as e:
-        raise RuntimeError(f"Kunde inte läsa data för '{profile}': {e}")
+        raise RuntimeError(f"Kunde inte läsa kolumner för '{profile}': {e}")
 
+    raw: Dict[str, List[Any]] = {}
+    for c, vr in zip(found, value_ranges):
+        raw[c] = list(vr[0]) if vr else []
+    return _typed_projection(raw, columns, text_columns)
+
+def read_profile_tail(profile: str, n: int) -> pd.DataFrame:
+    """
+    Läs header + endast de **sista n** raderna från 'Data - {profile}'.
+    Radantalet tas från bladets metadata (row_count) och raderna hämtas med
+    A1-intervall i ett batch_get-anrop – inte hela bladet.
+    Tomma rader i slutet av rutnätet hoppas över (fönstret vidgas vid behov).
+    """
+    n = max(0, int(n))
+    if n == 0:
+        return _records_to_dataframe([])
+    records = _online_or_local(lambda: _online_read_tail(profile, n), lambda: _local_rows(profile, tail=n), profile)
     return _records_to_dataframe(records)
 
+def _online_read_tail(profile: str, n: int) -> List[Dict[str, Any]]:
+    ss = _spreadsheet()
+    ws = _get_or_create_primary_data_ws(ss, profile)
+
+    last_row = int(ws.row_count or 0)
+    if last_row < 2:
+        return []
+
+    want = n
+    while True:
+        first = max(2, last_row - want + 1)
+        try:
+            header_vr, body_vr = ws.batch_get(["1:1", f"{first}:{last_row}"])
+        except APIError as e:
+            raise RuntimeError(f"Kunde inte läsa data för '{profile}': {e}")
+
+        headers = [str(h) for h in (header_vr[0] if header_vr else [])]
+        if not headers:
+            return []
+        _remember_headers(ws, headers)
+
+        body = [r for r in body_vr if not _is_blank_row(r)]
+
+        # Fönstret räckte, eller vi har redan läst ända ned till rad 2
+        if len(body) >= n or first == 2:
+            break
+        want *= 2
+
+    return _values_to_records(headers, body[-n:])
+
+# =============================
+# Delat datablad ('Data' med kolumnen Profil) – äldre layout
+# =============================
+
+SHARED_DATA_TITLE = "Data"
+
+def _read_segments(ws: Worksheet, headers: List[str], segs: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """Läs radintervallen i ett batch_get-anrop."""
+    if not segs:
+        return []
+    last = _col_letter(len(headers))
+    try:
+        value_ranges = ws.batch_get([f"A{a}:{last}{b}" for a, b in segs])
+    except APIError as e:
+        raise RuntimeError(f"Kunde inte läsa rader från '{ws.title}': {e}")
+    return _values_to_records(headers, [r for vr in value_ranges for r in vr])
+
+# Radintervall-index (local_store): profil -> [(start, stop)] i det delade bladet.
+# Vid varje läsning skannas Profil-kolumnen efter senast skannade rad ända ned
+# till rutnätets slut (ett litet batch_get) – nya rader kan ha skrivits i
+# befintliga tomma rutnätsrader utan att radantalet ändrats. Krymper bladet
+# byggs indexet om. Våra egna append:ar (append_rows_to_shared_data) läggs in direkt.
+
+def _scan_profile_column(ws: Worksheet, headers: List[str], first: int, last: int) -> Tuple[List[Tuple[int, str]], int]:
+    """(rad, profil) för raderna first..last + sista icke-tomma raden."""
+    if first > last:
+        return [], first - 1
+    letter = _col_letter(headers.index("Profil") + 1)
+    col = ws.batch_get([f"{letter}{first}:{letter}{last}"], major_dimension="COLUMNS")[0]
+    vals = list(col[0]) if col else []
+    pairs = [(first + i, str(v).strip()) for i, v in enumerate(vals) if str(v).strip()]
+    return pairs, first + len(vals) - 1
+
+def _profile_segments(ws: Worksheet, headers: List[str], profile: str) -> List[Tuple[int, int]]:
+    sheet = _sheet_key()
+    grid = int(ws.row_count or 0)
+    meta = LS.get_row_index_meta(sheet, ws.title)
+    if meta is None or grid < meta[1]:
+        pairs, scanned = _scan_profile_column(ws, headers, 2, grid)
+        LS.update_row_index(sheet, ws.title, pairs, scanned, grid, replace=True)
+    elif meta[0] < grid:
+        pairs, scanned = _scan_profile_column(ws, headers, meta[0] + 1, grid)
+        if pairs or grid != meta[1]:
+            LS.update_row_index(sheet, ws.title, pairs, max(meta[0], scanned), grid)
+    return LS.get_row_segments(sheet, ws.title, profile)
+
+def rebuild_shared_index(title: str = SHARED_DATA_TITLE) -> None:
+    """Släng indexet (t.ex. efter manuell sortering/ändring av Profil-celler)."""
+    LS.drop_row_index(_sheet_key(), title)
+
+def _shared_local_key(title: str, profile: str) -> str:
+    """Nyckel för profilens lokala kopia av raderna i ett delat blad."""
+    return f"shared:{title}:{profile}"
+
+def _online_read_shared_rows(profile: str, title: str) -> pd.DataFrame:
+    ss = _spreadsheet()
+    ws = _get_ws_by_title(ss, title)
+    if ws is None:
+        return _records_to_dataframe([])
+    try:
+        headers = _get_headers(ws)
+        if "Profil" not in headers:
+            # Ingen Profil-kolumn -> bladet tillhör i praktiken alla profiler
+            segs = None
+        else:
+            segs = _profile_segments(ws, headers, profile)
+    except APIError as e:
+        raise RuntimeError(f"Kunde inte läsa '{title}': {e}")
+
+    def _load() -> pd.DataFrame:
+        try:
+            # Bara profilens radintervall hämtas (ett batch_get)
+            records = ws.get_all_records(default_blank="") if segs is None else _read_segments(ws, headers, segs)
+        except APIError as e:
+            raise RuntimeError(f"Kunde inte läsa '{title}': {e}")
+        LS.replace_rows(_shared_local_key(title, profile), records)
+        return _records_to_dataframe(records)
+
+    token = _sheet_token([title])
+    if token is None:
+        return _load()
+    # Intervallen ingår i token: rader som skrivits i tomma rutnätsrader syns
+    # inte i proben men väl i indexet
+    return SC.get_or_load(_sheet_key(), profile, f"shared:{title}", _load, token=json.dumps([token, segs]))
+
+def _local_shared_rows(profile: str, title: str) -> pd.DataFrame:
+    """Senast lästa kopia + profilens köade rader för bladet."""
+    key = _shared_local_key(title, profile)
+    queued = [r for _, kind, dest, payload in LS.pending(100000) if kind == "shared" and dest == title
+              for r in payload if str(r.get("Profil", "")).strip() == profile]
+    if not LS.has_rows(key) and not queued:
+        raise SheetsUnavailable(f"Offline och ingen lokal kopia av '{title}' för '{profile}'.")
+    return _records_to_dataframe(LS.get_rows(key) + queued)
+
+def _online_append_shared(title: str, rows: List[Dict[str, Any]], chunk_size: int = 200, progress=None) -> int:
+    ss = _spreadsheet()
+    ws = _get_ws_by_title(ss, title)
+    if ws is None:
+        ws = ss.add_worksheet(title=title, rows=1, cols=1)
+        _PROBE["titles"] = None
+    sheet = _sheet_key()
+    meta = LS.get_row_index_meta(sheet, title)
+    written = _append_rows_to_ws(ws, rows, chunk_size, progress)
+    if meta is not None:
+        pairs = [(first + i, str(r.get("Profil", "")).strip())
+                 for first, chunk in written if first is not None
+                 for i, r in enumerate(chunk) if str(r.get("Profil", "")).strip()]
+        added = sum(len(chunk) for _, chunk in written)
+        contiguous = all(first is not None for first, _ in written) and written and written[0][0] == meta[0] + 1
+        # Skrev någon annan emellan lämnas 'scanned' orört så att glappet skannas vid nästa läsning
+        scanned = meta[0] + added if contiguous else meta[0]
+        LS.update_row_index(sheet, title, pairs, scanned, meta[1] + (added if contiguous else 0))
+    return sum(len(chunk) for _, chunk in written)
+
+def append_rows_to_shared_data(rows: List[Dict[str, Any]], title: str = SHARED_DATA_TITLE, chunk_size: int = 200) -> int:
+    """
+    Append:a rader (med kolumnen 'Profil') till det delade databladet och håll
+    radintervall-indexet aktuellt. Offline/kvot slut: raderna köas.
+    """
+    if not rows:
+        return 0
+    payload = [{k: _to_cell(v) for k, v in r.items()} for r in rows]
+    _write_or_enqueue("shared", title, payload, lambda progress: _online_append_shared(title, payload, chunk_size, progress))
+    return len(rows)
+
+def read_shared_profile_rows(profile: str, title: str = SHARED_DATA_TITLE) -> pd.DataFrame:
+    """
+    Profilens rader ur det delade databladet (alla profiler i samma blad,
+    kolumnen 'Profil' avgör). Radintervallen kommer ur det lokala indexet
+    (bara nya rader skannas) och endast de intervallen hämtas (batch_get).
+    Delas mellan sessioner tills proben eller indexet visar att bladet ändrats.
+    Offline/kvot slut (eller köade rader till bladet): senast lästa kopia plus
+    profilens köade rader.
+    Obs: ändrade Profil-celler mitt i bladet syns inte förrän
+    rebuild_shared_index() körts.
+    """
+    return _online_or_local(lambda: _online_read_shared_rows(profile, title),
+                            lambda: _local_shared_rows(profile, title), title)
+
+def clear_profile_data(profile: str) -> None:
+    """Töm 'Data - {profile}' (header + rader). Används vid import med ersätt."""
+    ss = _spreadsheet()
+    ws = _get_or_create_primary_data_ws(ss, profile)
+    try:
+        ws.clear()
+    except APIError as e:
+        raise RuntimeError(f"Kunde inte tömma '{ws.title}': {e}")
+    _HEADER_CACHE.pop((ws.spreadsheet.id, ws.title), None)
+    LS.replace_rows(profile, [])
+    _invalidate(profile, "rows")
+
+def _local_append(profile: str, rows: List[Dict[str, Any]], queued: bool) -> None:
+    """Spegla skrivna rader lokalt (köade rader alltid, annars bara om full kopia finns)."""
+    if queued or LS.has_rows(profile):
+        LS.append_rows(profile, [{k: _to_cell(v) for k, v in r.items()} for r in rows])
+        try:
+            import rollup
+            rollup.fold(profile)
+        except Exception:
+            pass  # dagsaggregaten ikapp-räknas vid nästa läsning (rollup.daily)
+
 def append_row_to_profile_data(profile: str, row: Dict[str, Any]) -> None:
     """
     Lägg till en rad i **primärbladet** 'Data - {profile}'.
+    Offline/kvot slut: raden köas och synkas senare.
+    """
+    payload = [{k: _to_cell(v) for k, v in row.items()}]
+    sent = _write_or_enqueue("rows", profile, payload, lambda progress: _online_append_row(profile, row))
+    _local_append(profile, [row], queued=not sent)
+
+def _online_append_row(profile: str, row: Dict[str, Any]) -> None:
+    """
     Optimerad: läser ENDAST header-raden (rad 1) – INTE hela bladet.
     Uppdaterar header vid behov, och appender sedan raden.
     """
-    ss = get_spreadsheet()
+    ss = _spreadsheet()
     ws = _get_or_create_primary_data_ws(ss, profile)
 
     try:
-        headers = ws.row_values(1)  # billig läsning av endast rad 1
+        headers = _get_headers(ws, refresh=True)  # billig läsning av endast rad 1
     except APIError as e:
         raise RuntimeError(f"Kunde inte läsa header för '{ws.title}': {e}")
 
@@ -300,17 +984,19 @@ def append_row_to_profile_data(profile: str, row: Dict[str, Any]) -> None:
         headers = list(row.keys())
         values = [row.get(h, "") for h in headers]
         ws.update("A1", [headers])
-        ws.append_row(values, value_input_option="USER_ENTERED")
+        _remember_headers(ws, headers)
+        ws.append_row(values, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS")
         return
 
     new_cols = [k for k in row.keys() if k not in headers]
     if new_cols:
         headers_extended = headers + new_cols
         ws.update("A1", [headers_extended])
+        _remember_headers(ws, headers_extended)
         headers = headers_extended
 
     values = [row.get(h, "") for h in headers]
-    ws.append_row(values, value_input_option="USER_ENTERED")
+    ws.append_row(values, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS")
 
 
 # =============================
@@ -319,25 +1005,67 @@ def append_row_to_profile_data(profile: str, row: Dict[str, Any]) -> None:
 
 from datetime import date as _dt_date, time as _dt_time, datetime as _dt_datetime
 
+def _to_cell(v: Any) -> Any:
+    """Normalisera cellvärden (datum/tid -> sträng, None -> "")."""
+    if v is None:
+        return ""
+    if isinstance(v, _dt_datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, _dt_date):
+        return v.isoformat()
+    if isinstance(v, _dt_time):
+        return v.strftime("%H:%M:%S")
+    return v
+
 def append_rows_to_profile_data_batch(profile: str, rows: List[Dict[str, Any]], chunk_size: int = 200) -> int:
+    """
+    Append:ar många rader till 'Data - {profile}'. Offline/kvot slut: raderna
+    köas (i samma ordning) och synkas senare. Returnerar antal skrivna/köade rader.
+    """
+    if not rows:
+        return 0
+    payload = [{k: _to_cell(v) for k, v in r.items()} for r in rows]
+    sent = _write_or_enqueue("rows", profile, payload, lambda progress: _online_append_rows_batch(profile, rows, chunk_size, progress))
+    _local_append(profile, rows, queued=not sent)
+    return len(rows)
+
+def _online_append_rows_batch(profile: str, rows: List[Dict[str, Any]], chunk_size: int = 200, progress=None) -> int:
     """
     Append:ar många rader till primärbladet 'Data - {profile}' i få API-anrop.
     - Skapar bladet vid behov
     - Läser endast header-raden
     - Utökar header om nya kolumner dyker upp
     - Skrivning i chunkar (chunk_size) med exponential backoff vid 429
+    - progress(n) efter varje chunk (n = antal rader skrivna hittills)
 
     Returnerar antal skrivna rader.
     """
     if not rows:
         return 0
 
-    ss = get_spreadsheet()
+    ss = _spreadsheet()
     ws = _get_or_create_primary_data_ws(ss, profile)
+    return sum(len(chunk) for _, chunk in _append_rows_to_ws(ws, rows, chunk_size, progress))
 
+def _first_updated_row(resp: Any) -> Optional[int]:
+    """Första radnumret ur append-svarets updatedRange ('Data'!A12:K20 -> 12)."""
+    try:
+        m = re.search(r"!\$?[A-Z]+\$?(\d+)", str(resp["updates"]["updatedRange"]))
+        return int(m.group(1)) if m else None
+    except Exception:
+        return None
+
+def _append_rows_to_ws(ws: Worksheet, rows: List[Dict[str, Any]], chunk_size: int = 200,
+                       progress=None) -> List[Tuple[Optional[int], List[Dict[str, Any]]]]:
+    """
+    Header-hantering + chunkad append med backoff (se _online_append_rows_batch).
+    progress(n) anropas efter varje skriven chunk med antal rader hittills, så
+    att anroparen vet vilka rader som redan finns i bladet om en senare chunk
+    misslyckas. Returnerar [(första radnummer, chunk)] per skriven chunk.
+    """
     # 1) Läs befintlig header (billigt)
     try:
-        headers = ws.row_values(1)
+        headers = _get_headers(ws, refresh=True)
     except APIError as e:
         raise RuntimeError(f"Kunde inte läsa header för '{ws.title}': {e}")
 
@@ -354,6 +1082,7 @@ def append_rows_to_profile_data_batch(profile: str, rows: List[Dict[str, Any]],
             ws.update("A1", [headers])
         except APIError as e:
             raise RuntimeError(f"Kunde inte skriva header till '{ws.title}': {e}")
+        _remember_headers(ws, headers)
     else:
         seen = set(headers)
         new_cols = []
@@ -368,21 +1097,10 @@ def append_rows_to_profile_data_batch(profile: str, rows: List[Dict[str, Any]],
                 ws.update("A1", [headers_extended])
             except APIError as e:
                 raise RuntimeError(f"Kunde inte uppdatera header för '{ws.title}': {e}")
+            _remember_headers(ws, headers_extended)
             headers = headers_extended
 
-    # 3) Normalisera cellvärden (datum/tid -> sträng, None -> "")
-    def _to_cell(v: Any) -> Any:
-        if v is None:
-            return ""
-        if isinstance(v, _dt_datetime):
-            return v.strftime("%Y-%m-%d %H:%M:%S")
-        if isinstance(v, _dt_date):
-            return v.isoformat()
-        if isinstance(v, _dt_time):
-            return v.strftime("%H:%M:%S")
-        return v
-
-    total_written = 0
+    written: List[Tuple[Optional[int], List[Dict[str, Any]]]] = []
 
     # 4) Skriv i chunkar med backoff
     i = 0
@@ -396,8 +1114,10 @@ def append_rows_to_profile_data_batch(profile: str, rows: List[Dict[str, Any]],
         while True:
             try:
                 # Ett API-anrop per chunk
-                ws.append_rows(values_2d, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS")
-                total_written += len(values_2d)
+                resp = ws.append_rows(values_2d, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS")
+                written.append((_first_updated_row(resp), chunk))
+                if progress is not None:
+                    progress(i + len(chunk))
                 break
             except APIError as e:
                 msg = str(e)
@@ -415,4 +1135,4 @@ def append_rows_to_profile_data_batch(profile: str, rows: List[Dict[str, Any]],
         time.sleep(1.0)
         i += len(chunk)
 
-    return total_written
+    return written
@@ -0,0 +1,182 @@
+# simulering.py — Monte Carlo av framtida scener (headless, vektoriserat)
+#
+# Reglerna är desamma som i appen:
+#   - scenario-fill (scenario_gen.fill_scenes, samma som apply_scenario_fill)
+#   - tider/summor (berakningar.calc_row_values)
+#   - ekonomi (ekonomi.py)
+#   - tvingad schemaläggning (_compute_end_and_next)
+#   - bonus/superbonus-ackumulering (_after_save_housekeeping)
+# Alla simuleringar stegas parallellt som arrayer (en position per simulering),
+# och stora körningar delas upp på en processpool.
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ekonomi import economy_arrays
+from scenario_gen import DEFAULT_MIX, SCENARIOS, VILA_HEMMA, fill_scenes
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY = 86400
+_SEVEN = 7 * 3600
+
+
+# =============================
+# Vektoriserade beräkningar (tider) + schema
+# =============================
+
+def _calc_arrays(f: Dict[str, np.ndarray], cfg: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Delmängden av calc_row_values som ekonomi och schema behöver."""
+    L = [cfg.get("LBL_PAPPAN", "Pappans vänner"), cfg.get("LBL_GRANNAR", "Grannar"),
+         cfg.get("LBL_NILS_VANNER", "Nils vänner"), cfg.get("LBL_NILS_FAMILJ", "Nils familj")]
+    bek = f[cfg.get("LBL_BEKANTA", "Bekanta")]
+    esk = f[cfg.get("LBL_ESK", "Eskilstuna killar")]
+    kanner = f[L[0]] + f[L[1]] + f[L[2]] + f[L[3]]
+    tot = f["Män"] + f["Svarta"] + kanner + bek + esk + f["Bonus deltagit"] + f["Personal deltagit"]
+
+    summa_s = (f["Fitta"] + f["Rumpa"]) * f["Tid S"]
+    summa_d = (f["DP"] + f["DPP"] + f["DAP"]) * f["Tid D"]
+    summa_tp = f["TAP"] * f["Tid D"]
+    dt_tid = tot * f["DT tid (sek/kille)"]
+    summa_vila = (f["Fitta"] + f["Rumpa"] + f["DP"] + f["DPP"] + f["DAP"] + f["TAP"]) * f["Vila"] + tot * f["DT vila (sek/kille)"]
+    return {
+        "Totalt Män": tot.astype(np.float64),
+        "Känner": kanner.astype(np.float64),
+        "Summa tid (sek)": (summa_s + summa_d + summa_tp + dt_tid + summa_vila).astype(np.float64),
+        "Bekanta": bek.astype(np.float64),
+        "Esk": esk.astype(np.float64),
+    }
+
+
+def _next_start(start: np.ndarray, summa_sec: np.ndarray, alskar: np.ndarray, sover: np.ndarray, sleep_h: float) -> np.ndarray:
+    """_compute_end_and_next på sekunder sedan epoch (naiva datum)."""
+    end_sleep = start + np.floor(summa_sec).astype(np.int64) + 3600 + 10800 + (alskar + sover) * 20 * 60 + int(round(sleep_h * 3600))
+    start_day = start // _DAY
+    end_day = end_sleep // _DAY
+    tod = end_sleep % _DAY
+    ceil_hour = np.where(end_sleep % 3600 == 0, end_sleep, (end_sleep // 3600 + 1) * 3600)
+    later_day = np.where(tod <= _SEVEN, end_day * _DAY + _SEVEN, ceil_hour)
+    same_day = (start_day + 1) * _DAY + _SEVEN
+    return np.where(end_day > start_day, later_day, same_day)
+
+
+# =============================
+# Simulering
+# =============================
+
+def _simulate_chunk(args: Tuple) -> Dict[str, np.ndarray]:
+    hist, cfg, start_s, n_sims, n_scenes, mix, force_after, days_since_vila, seed = args
+    rng = np.random.default_rng(seed)
+    names = np.array(list(mix.keys()))
+    probs = np.array(list(mix.values()), dtype=np.float64)
+    probs = probs / probs.sum()
+
+    start = np.full(n_sims, int(start_s), dtype=np.int64)
+    day0 = start // _DAY
+    last_vila_day = day0 - int(days_since_vila)
+    bonus_left = np.full(n_sims, int(cfg.get("BONUS_AVAILABLE", 0)), dtype=np.int64)
+    super_acc = np.full(n_sims, int(cfg.get("SUPER_BONUS_ACC", 0)), dtype=np.int64)
+    bonus_pct = float(cfg.get("BONUS_PCT", 1.0)) / 100.0
+    sb_pct = float(cfg.get("SUPER_BONUS_PCT", 0.1)) / 100.0
+    sleep_h = float(cfg.get("EXTRA_SLEEP_H", 7))
+
+    vinst = np.zeros(n_sims)
+    pren_sum = np.zeros(n_sims)
+    lon_sum = np.zeros(n_sims)
+    first_vila = np.full(n_sims, np.nan)
+
+    for _ in range(int(n_scenes)):
+        types = rng.choice(names, size=n_sims, p=probs)
+        cur_day = start // _DAY
+        if force_after:
+            types = np.where(cur_day - last_vila_day >= int(force_after), VILA_HEMMA, types)
+
+        f = fill_scenes(types, hist, cfg, super_acc, rng)
+        c = _calc_arrays(f, cfg)
+        econ_in = {k: f[k].astype(np.float64) for k in ("DP", "DPP", "DAP", "TAP", "Män", "Svarta")}
+        econ_in.update(c)
+        is_vila = np.char.find(types.astype(str), "Vila") >= 0
+        e = economy_arrays(econ_in, is_vila, cfg, rng)
+
+        vinst += e["Vinst"]
+        pren_sum += e["Prenumeranter"]
+        lon_sum += e["Lön Malin"]
+
+        # _after_save_housekeeping
+        is_sb = types == "Super bonus"
+        no_bonus = is_vila | is_sb
+        add_bonus = np.where(no_bonus, 0, np.floor(e["Prenumeranter"] * bonus_pct)).astype(np.int64)
+        add_super = np.where(no_bonus, 0, np.floor(e["Prenumeranter"] * sb_pct)).astype(np.int64)
+        bonus_left = np.maximum(0, bonus_left - f["Bonus deltagit"] + add_bonus)
+        super_acc = np.maximum(0, super_acc + add_super)
+
+        hemma = types == VILA_HEMMA
+        first_vila = np.where(np.isnan(first_vila) & hemma, (cur_day - day0).astype(np.float64), first_vila)
+        last_vila_day = np.where(hemma, cur_day, last_vila_day)
+
+        start = _next_start(start, c["Summa tid (sek)"], f["Älskar"], f["Sover med"], sleep_h)
+
+    return {
+        "Vinst": vinst, "Prenumeranter": pren_sum, "Lön Malin": lon_sum,
+        "Dagar till Vila i hemmet": first_vila,
+        "Dagar simulerade": ((start // _DAY) - day0).astype(np.float64),
+        "Bonus kvar": bonus_left.astype(np.float64), "Super bonus ack": super_acc.astype(np.float64),
+    }
+
+
+def simulate(
+    hist: Dict[str, Any],
+    cfg: Dict[str, Any],
+    start_dt: datetime,
+    n_sims: int = 1000,
+    n_scenes: int = 30,
+    mix: Optional[Dict[str, float]] = None,
+    force_vila_after_days: Optional[int] = 21,
+    days_since_vila: int = 0,
+    seed: int = 0,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Kör n_sims oberoende scensekvenser om n_scenes scener var, med start i start_dt.
+    mix: sannolikhet per scenario (DEFAULT_MIX). force_vila_after_days: tvinga
+    'Vila i hemmet' när så många dagar gått sedan senaste (None = aldrig).
+    Returnerar en rad per simulering (summa Vinst/Prenumeranter/Lön, dagar till
+    Vila i hemmet, bonus-/superbonusläge vid slutet). Samma seed -> samma resultat.
+    """
+    mix = dict(mix or DEFAULT_MIX)
+    bad = [k for k in mix if k not in SCENARIOS]
+    if bad:
+        raise ValueError(f"Okända scenarion: {', '.join(bad)}")
+    start_s = int((start_dt - _EPOCH).total_seconds())
+
+    # Uppdelningen beror bara på n_sims (inte antal kärnor) -> samma seed ger samma resultat
+    workers = max_workers or 1
+    chunks = max(1, min(64, int(n_sims) // 250))
+    sizes = [len(a) for a in np.array_split(np.arange(int(n_sims)), chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(hist, cfg, start_s, sz, n_scenes, mix, force_vila_after_days, days_since_vila, s) for sz, s in zip(sizes, seeds)]
+
+    if len(jobs) == 1 or workers <= 1:
+        parts = [_simulate_chunk(j) for j in jobs]
+    else:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                parts = list(ex.map(_simulate_chunk, jobs))
+        except Exception:
+            # Processpool ej tillgänglig (t.ex. begränsad miljö) -> sekventiellt
+            parts = [_simulate_chunk(j) for j in jobs]
+
+    return pd.DataFrame({k: np.concatenate([p[k] for p in parts]) for k in parts[0]})
+
+
+def summarize(per_sim: pd.DataFrame) -> pd.DataFrame:
+    """Fördelning per mått: medel + percentiler (5/25/50/75/95)."""
+    q = per_sim.quantile([0.05, 0.25, 0.5, 0.75, 0.95]).T
+    q.columns = ["p5", "p25", "p50", "p75", "p95"]
+    q.insert(0, "medel", per_sim.mean())
+    q["andel saknas"] = per_sim.isna().mean()
+    return q
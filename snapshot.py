@@ -0,0 +1,190 @@
+# snapshot.py — kompakt binär export/import av en profil (inställningar + Data)
+#
+# Format:
+#   *.arrow / *.feather  -> Arrow IPC-fil (zstd), läses memory-mappat
+#   *.parquet            -> Parquet (zstd), läses memory-mappat
+# Inställningarna ligger som JSON i schemats metadata, så en fil = en profil.
+#
+# CLI:
+#   python snapshot.py export <profil> <fil>
+#   python snapshot.py import <fil> [--profil NAMN] [--ersatt] [--chunk 200]
+
+from __future__ import annotations
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import sheets_utils as SU
+
+_META_SETTINGS = b"malin.settings"
+_META_PROFILE = b"malin.profile"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except Exception as e:
+        raise RuntimeError("pyarrow saknas – installera med 'pip install pyarrow'.") from e
+    return pa
+
+
+def _is_parquet(path: str) -> bool:
+    return str(path).lower().endswith(".parquet")
+
+
+# =============================
+# Konvertering DataFrame <-> kolumnformat
+# =============================
+
+def _to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sheets-data kommer som object/str. Kolumner där alla icke-tomma celler är
+    tal lagras som int64/float64, övriga som str – det är det som gör filen liten.
+    """
+    out = {}
+    for c in df.columns:
+        col = df[c]
+        blank = col.isna() | (col.astype(str).str.strip() == "")
+        num = pd.to_numeric(col.where(~blank), errors="coerce")
+        if int(num.notna().sum()) == int((~blank).sum()):
+            if not blank.any() and (num % 1 == 0).all():
+                out[str(c)] = num.astype("int64")
+            else:
+                out[str(c)] = num.astype("float64")
+        else:
+            out[str(c)] = col.where(~blank, "").astype(str)
+    return pd.DataFrame(out, index=df.index)
+
+
+def _settings_to_json(cfg: Dict[str, Any]) -> bytes:
+    d = {k: SU._setting_to_writable(v) for k, v in cfg.items()}
+    return json.dumps(d, ensure_ascii=False).encode("utf-8")
+
+
+def _settings_from_json(raw: Optional[bytes]) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    d = json.loads(raw.decode("utf-8"))
+    return {k: SU._coerce_setting(k, v) for k, v in d.items()}
+
+
+def _frame_to_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Tillbaka till Sheets-celler: NaN -> "", heltalsfloat -> int."""
+    rows = []
+    for rec in df.to_dict(orient="records"):
+        r = {}
+        for k, v in rec.items():
+            if v is None or (isinstance(v, float) and v != v):
+                r[k] = ""
+            elif isinstance(v, float) and v.is_integer():
+                r[k] = int(v)
+            else:
+                r[k] = v
+        rows.append(r)
+    return rows
+
+
+# =============================
+# Skriva / läsa fil
+# =============================
+
+def write_snapshot(path: str, profile: str, cfg: Dict[str, Any], df: pd.DataFrame) -> int:
+    """Skriv inställningar + rader till fil. Returnerar antal rader."""
+    pa = _require_pyarrow()
+    frame = _to_columnar(df if df is not None else pd.DataFrame())
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[_META_SETTINGS] = _settings_to_json(cfg or {})
+    meta[_META_PROFILE] = str(profile).encode("utf-8")
+    table = table.replace_schema_metadata(meta)
+
+    if _is_parquet(path):
+        pa.parquet.write_table(table, path, compression="zstd")
+    else:
+        opts = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema, options=opts) as writer:
+                writer.write_table(table)
+    return int(table.num_rows)
+
+
+def read_snapshot(path: str) -> Tuple[str, Dict[str, Any], pd.DataFrame]:
+    """
+    Läs en snapshot memory-mappat. Returnerar (profil, inställningar, DataFrame).
+    DataFrame:n är typad (tal som tal) och kan gå direkt till statistik.compute_stats.
+    """
+    pa = _require_pyarrow()
+    if _is_parquet(path):
+        table = pa.parquet.read_table(path, memory_map=True)
+    else:
+        with pa.memory_map(str(path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+    meta = table.schema.metadata or {}
+    profile = (meta.get(_META_PROFILE) or b"").decode("utf-8")
+    cfg = _settings_from_json(meta.get(_META_SETTINGS))
+    return profile, cfg, table.to_pandas()
+
+
+# =============================
+# Export / import mot Sheets
+# =============================
+
+def export_profile_snapshot(profile: str, path: str) -> int:
+    """Läs profilens inställningar + Data från Sheets och skriv till fil."""
+    cfg = SU.read_profile_settings(profile)
+    df = SU.read_profile_data(profile)
+    return write_snapshot(path, profile, cfg, df)
+
+
+def import_profile_snapshot(path: str, profile: Optional[str] = None, replace: bool = False, chunk_size: int = 200) -> int:
+    """
+    Återställ en snapshot till Sheets (till filens profil om ingen anges).
+    Rader skrivs i chunkar via append_rows_to_profile_data_batch.
+    replace=True tömmer profilens datablad först.
+    Returnerar antal skrivna rader.
+    """
+    src_profile, cfg, df = read_snapshot(path)
+    target = profile or src_profile
+    if not target:
+        raise RuntimeError("Snapshot saknar profilnamn – ange profil.")
+
+    if cfg:
+        SU.save_profile_settings(target, cfg)
+    if replace:
+        SU.clear_profile_data(target)
+    if df is None or df.empty:
+        return 0
+    return SU.append_rows_to_profile_data_batch(target, _frame_to_rows(df), chunk_size=chunk_size)
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    p = argparse.ArgumentParser(description="Export/import av profil-snapshot (Arrow IPC / Parquet).")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    pe = sub.add_parser("export", help="Sheets -> fil")
+    pe.add_argument("profil")
+    pe.add_argument("fil")
+
+    pi = sub.add_parser("import", help="fil -> Sheets")
+    pi.add_argument("fil")
+    pi.add_argument("--profil", default=None)
+    pi.add_argument("--ersatt", action="store_true", help="Töm databladet innan import")
+    pi.add_argument("--chunk", type=int, default=200)
+
+    a = p.parse_args(argv)
+    if a.cmd == "export":
+        n = export_profile_snapshot(a.profil, a.fil)
+        print(f"Exporterade {n} rader för '{a.profil}' till {a.fil}")
+    else:
+        n = import_profile_snapshot(a.fil, profile=a.profil, replace=a.ersatt, chunk_size=a.chunk)
+        print(f"Importerade {n} rader från {a.fil}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -1,103 +1,270 @@
-# statistik.py — lägger till "Dagar i databasen (från startdatum)" under Privat GB
-
+# statistik.py — statistik över profilens rader: totalt, per kalenderperiod och rullande
+#
+# Alla mått byggs av radvisa termer (_row_terms) som bara summeras: antal rader,
+# kolumnsummor, maskräkningar (t.ex. antal GB) och maskade summor (t.ex. tid för
+# GB-rader). Medelvärden blir summa/antal. Därför kan samma måttkatalog räknas
+#   - totalt           compute_stats()     (summa över alla rader)
+#   - per period       stats_by_period()   (groupby på Datum: dag/vecka/månad/år)
+#   - rullande fönster rolling_stats() / window_stats()
+# i ett enda vektoriserat svep. Periodsummor för avslutade perioder cachas, så
+# bara innevarande period (och perioder med nya rader) räknas om.
+# Sektionerna (GB, Nöjdhet, …, Ekonomi) registreras som mått i statistik_register.
+#
+# Måtten är råa tal (float; heltal för räknade dagar, "" för rubriker) så att de
+# kan cachas, jämföras och räknas vidare på. Svensk formatering ("1 234,56")
+# görs först vid visning med format_value/format_stats/format_frame.
+
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import date
+from functools import lru_cache, reduce
+from typing import Dict, Mapping, Optional
+
+import numpy as np
 import pandas as pd
 
-def compute_stats(rows_df: pd.DataFrame, cfg: dict) -> dict:
+import statistik_register as SR
+from settings import Settings
+
+_FREQS = {"D": "D", "W": "W", "M": "M", "Y": "Y"}
+
+# (kolumner, etiketter, freq, periodordinal, antal, första, sista, fingeravtryck) -> termsummor
+_BUCKETS: "OrderedDict[tuple, Dict[str, float]]" = OrderedDict()
+_BUCKETS_MAX = 4096
+
+# CFG-nycklar som statistiken läser (allt annat i CFG påverkar inte måtten)
+LBL_KEYS = ("LBL_PAPPAN", "LBL_GRANNAR", "LBL_NILS_VANNER", "LBL_NILS_FAMILJ", "LBL_BEKANTA", "LBL_ESK")
+MAX_KEYS = ("MAX_PAPPAN", "MAX_GRANNAR", "MAX_NILS_VANNER", "MAX_NILS_FAMILJ", "MAX_BEKANTA")
+CFG_KEYS = LBL_KEYS + MAX_KEYS + ("startdatum",)
+
+# (typ, argument, dataversion, CFG-hash, dag) -> resultat (delas, får inte muteras)
+_RESULTS: "OrderedDict[tuple, object]" = OrderedDict()
+_RESULTS_MAX = 128
+_RESULTS_LOCK = threading.Lock()
+
+
+# ===== Hjälpare =====
+@lru_cache(maxsize=65536)
+def _fmt2_cached(v: float) -> str:
+    # svensk gruppvisning med mellanrum + komma
+    return f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
+
+def _fmt2(x) -> str:
+    try:
+        return _fmt2_cached(float(x))
+    except Exception:
+        return "0,00"
+
+def _div(a: float, b: float) -> float:
+    return float(a) / float(b) if float(b) != 0.0 else 0.0
+
+def _sec_to_hours_days_weeks(sec: float):
+    hours = sec / 3600.0
+    days  = hours / 24.0
+    weeks = days / 7.0
+    return hours, days, weeks
+
+def _labels(cfg: dict) -> Mapping[str, str]:
+    if isinstance(cfg, Settings):
+        return cfg.label_map
+    return {
+        "P":  cfg.get("LBL_PAPPAN", "Pappans vänner"),
+        "G":  cfg.get("LBL_GRANNAR", "Grannar"),
+        "NV": cfg.get("LBL_NILS_VANNER", "Nils vänner"),
+        "NF": cfg.get("LBL_NILS_FAMILJ", "Nils familj"),
+        "BE": cfg.get("LBL_BEKANTA", "Bekanta"),
+        "ES": cfg.get("LBL_ESK", "Eskilstuna killar"),
+    }
+
+
+# ===== Radvisa termer (kärna) =====
+# Indatakolumnerna tvingas till tal en gång (statistik_register.coerce_columns,
+# en float64-matris). Varje term är en summa av delar (värde, mask): värde×mask,
+# bara värde eller bara mask (= antal). Värden och masker räknas vid behov och
+# återanvänds inom en körning. Totalerna blir en summa per värde, en
+# count_nonzero per mask och en skalärprodukt per maskat par. Per rad (för
+# gruppering på dag/period) byggs termerna som rader i en matris T.
+
+_SOURCES = ("Män", "Svarta", "Bonus deltagit", "Personal deltagit", "P", "G", "NV", "NF", "BE", "ES")
+_OTHER = ("Älskar", "Sover med", "Summa tid (sek)", "Tid D", "Tid per kille (sek)",
+          "Händer per kille (sek)", "Hångel (sek/kille)", "Händer aktiv", "Nils", "Totalt Män")
+_SUMMED = ("DP", "DPP", "DAP", "TAP", "Prenumeranter", "Intäkter", "Kostnad män",
+           "Intäkt Känner", "Intäkt företag", "Lön Malin", "Vinst")
+_INPUTS = _SOURCES + _OTHER + _SUMMED
+_PER_SOURCE = {"BD": "Bonus deltagit", "PD": "Personal deltagit", "P": "P", "G": "G",
+               "NV": "NV", "NF": "NF", "BE": "BE", "ES": "ES"}  # summa + antal > 0
+
+# Härledda värden: namn -> (indata, funktion)
+_DERIVED = {
+    "man_all": (_SOURCES, lambda v, cols: reduce(np.add, (v[c] for c in _SOURCES))),
+    "tot": (("Totalt Män",) + _SOURCES,
+            lambda v, cols: v["Totalt Män"] if v.label("Totalt Män") in cols.present else v["man_all"]),
+}
+
+# Masker: namn -> (indata, funktion)
+_MASK_FNS = {
+    "all":     ((), lambda v, cols: np.ones(cols.n, dtype=bool)),
+    "gb_any":  (("Män", "Svarta"), lambda v, cols: (v["Män"] > 0) | (v["Svarta"] > 0)),
+    "privat":  (("Män", "P", "G", "NV", "NF"),
+                lambda v, cols: (v["Män"] == 0) & ((v["P"] > 0) | (v["G"] > 0) | (v["NV"] > 0) | (v["NF"] > 0))),
+    "vita":    (("Män", "Svarta"), lambda v, cols: (v["Män"] > 0) & (v["Svarta"] == 0)),
+    "svarta":  (("Män", "Svarta"), lambda v, cols: (v["Svarta"] > 0) & (v["Män"] == 0)),
+    "blandat": (("Män", "Svarta"), lambda v, cols: (v["Män"] > 0) & (v["Svarta"] > 0)),
+    "scen":    (("tot",), lambda v, cols: v["tot"] > 0),
+    # Saknas kolumnen räknas raderna varken som aktiva eller inaktiva
+    "ha_on":   (("Händer aktiv",), lambda v, cols: (v["Händer aktiv"] > 0) if v.label("Händer aktiv") in cols.present
+                else np.zeros(cols.n, dtype=bool)),
+    "ha_off":  (("Händer aktiv",), lambda v, cols: (v["Händer aktiv"] <= 0) if v.label("Händer aktiv") in cols.present
+                else np.zeros(cols.n, dtype=bool)),
+}
+_MASK_FNS.update({f"pos:{c}": ((c,), lambda v, cols, c=c: v[c] > 0) for c in _SOURCES})
+
+# term -> delar (värde, mask); None = 1
+_TERM_SPEC = {
+    "n":              [(None, "all")],
+    "man_all":        [("man_all", None)],
+    "tot":            [("tot", None)],
+    "cnt_gb":         [(None, "gb_any")],
+    "cnt_privat":     [(None, "privat")],
+    "cnt_gb_vita":    [(None, "vita")],
+    "cnt_gb_svarta":  [(None, "svarta")],
+    "cnt_gb_blandat": [(None, "blandat")],
+    "cnt_m":          [(None, "pos:Män")],
+    "cnt_scen":       [(None, "scen")],
+    "sum_S":          [("Svarta", None)],
+    "black_extra":    [("ES", "pos:Svarta"), ("Bonus deltagit", "pos:Svarta")],
+    "alskar":         [("Älskar", None)],
+    "sover":          [("Sover med", None)],
+    "nils":           [("Nils", None)],
+    "ha_on":          [(None, "ha_on")],
+    "ha_off":         [(None, "ha_off")],
+    "tid":            [("Summa tid (sek)", None)],
+    "tid_d":          [("Tid D", None)],
+    "tpk":            [("Tid per kille (sek)", None)],
+    "tpk_incl":       [("Tid per kille (sek)", None), ("Händer per kille (sek)", "ha_on")],
+    "hak":            [("Hångel (sek/kille)", None)],
+    "tot_gb":         [("tot", "pos:Män")],
+    "tot_privat":     [("tot", "privat")],
+    "tid_gb":         [("Summa tid (sek)", "pos:Män")],
+    "tid_privat":     [("Summa tid (sek)", "privat")],
+}
+_TERM_SPEC.update({f"sum_{k}": [(c, None)] for k, c in _PER_SOURCE.items()})
+_TERM_SPEC.update({f"cnt_{k}": [(None, f"pos:{c}")] for k, c in _PER_SOURCE.items()})
+_TERM_SPEC.update({f"sum_{c}": [(c, None)] for c in _SUMMED})
+TERMS = tuple(_TERM_SPEC)
+
+
+class _Values(dict):
+    """Termernas värden (indata via etiketter, härledda vid behov), memoiserade."""
+
+    def __init__(self, cols: SR.Columns, cfg: dict):
+        super().__init__()
+        self.cols = cols
+        self.L = _labels(cfg)
+
+    def label(self, name: str) -> str:
+        return self.L.get(name, name)
+
+    def __missing__(self, name: str) -> np.ndarray:
+        val = _DERIVED[name][1](self, self.cols) if name in _DERIVED else self.cols[self.label(name)]
+        self[name] = val
+        return val
+
+
+class _Masks(dict):
+    def __init__(self, values: _Values):
+        super().__init__()
+        self.v = values
+
+    def __missing__(self, name: str) -> np.ndarray:
+        val = self[name] = _MASK_FNS[name][1](self.v, self.v.cols)
+        return val
+
+
+def _inputs_of(name: str) -> tuple:
+    """Indatakolumner (interna namn) bakom ett värde eller en mask."""
+    deps = _DERIVED[name][0] if name in _DERIVED else _MASK_FNS[name][0] if name in _MASK_FNS else (name,)
+    return tuple(d for dep in deps for d in (_inputs_of(dep) if dep in _DERIVED else (dep,)))
+
+def term_columns(terms, cfg: dict) -> tuple:
+    """Datakolumnerna (med CFG-etiketter) som termerna behöver."""
+    L = _labels(cfg)
+    need = []
+    for term in terms:
+        for val, mask in _TERM_SPEC[term]:
+            for part in (val, mask):
+                if part is not None:
+                    need.extend(_inputs_of(part))
+    return tuple(dict.fromkeys(L.get(c, c) for c in need))
+
+def _totals_from(cols: SR.Columns, cfg: dict, terms=TERMS) -> Dict[str, float]:
+    """Termsummorna för `terms` ur tvingade kolumner (utan att bygga T)."""
+    v = _Values(cols, cfg)
+    m = _Masks(v)
+    out: Dict[str, float] = {}
+    for term in terms:
+        tot = 0.0
+        for val, mask in _TERM_SPEC[term]:
+            if val is None:
+                tot += np.count_nonzero(m[mask])
+            elif mask is None:
+                tot += float(v[val].sum())
+            else:
+                tot += float(np.dot(v[val], m[mask]))
+        out[term] = float(tot)
+    return out
+
+def _term_matrix(cols: SR.Columns, cfg: dict) -> np.ndarray:
+    """(len(TERMS), n): en rad per summerbar term, en kolumn per datarad."""
+    v = _Values(cols, cfg)
+    m = _Masks(v)
+    T = np.zeros((len(TERMS), cols.n), dtype=np.float64)
+    for i, parts in enumerate(_TERM_SPEC.values()):
+        for val, mask in parts:
+            if val is None:
+                T[i] += m[mask]
+            elif mask is None:
+                T[i] += v[val]
+            else:
+                T[i] += v[val] * m[mask]
+    return T
+
+def _row_terms(rows_df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     """
-    Returnerar en dict {etikett: värde(str)} för visning i appen.
-    Allt numeriskt formatteras med 2 decimaler. Tider summeras i sekunder
-    och visas som timmar/dagar/veckor (decimalt).
+    En kolumn per summerbar term (float), en rad per datarad. Saknade kolumner
+    räknas som 0. Används för gruppering (period/dag); totaler tar _totals().
     """
-    out = {}
+    if rows_df is None or not len(rows_df):
+        return pd.DataFrame(columns=list(TERMS), dtype=float)
+    cols = SR.coerce_columns(rows_df, term_columns(TERMS, cfg))
+    return pd.DataFrame(_term_matrix(cols, cfg).T, index=rows_df.index, columns=list(TERMS))
 
-    # ===== Hjälpare =====
-    def _fmt2(x) -> str:
-        try:
-            # svensk gruppvisning med mellanrum + komma
-            v = float(x)
-            s = f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
-            return s
-        except Exception:
-            return "0,00"
-
-    def _col(name: str) -> pd.Series:
-        if rows_df is None or rows_df.empty or name not in rows_df.columns:
-            return pd.Series([], dtype=float)
-        return pd.to_numeric(rows_df[name].fillna(0), errors="coerce").fillna(0)
-
-    def _sum(name: str) -> float:
-        return float(_col(name).sum())
-
-    def _count_rows(mask: pd.Series) -> int:
-        try:
-            return int(mask.sum())
-        except Exception:
-            return 0
-
-    def _div(a: float, b: float) -> float:
-        return float(a) / float(b) if float(b) != 0.0 else 0.0
-
-    def _sec_to_hours_days_weeks(sec: float):
-        hours = sec / 3600.0
-        days  = hours / 24.0
-        weeks = days / 7.0
-        return _fmt2(hours), _fmt2(days), _fmt2(weeks)
-
-    # Dynamiska etiketter
-    LBL_PAPPAN   = cfg.get("LBL_PAPPAN", "Pappans vänner")
-    LBL_GRANNAR  = cfg.get("LBL_GRANNAR", "Grannar")
-    LBL_NV       = cfg.get("LBL_NILS_VANNER", "Nils vänner")
-    LBL_NF       = cfg.get("LBL_NILS_FAMILJ", "Nils familj")
-    LBL_BEK      = cfg.get("LBL_BEKANTA", "Bekanta")
-    LBL_ESK      = cfg.get("LBL_ESK", "Eskilstuna killar")
-
-    MAX_PAPPAN   = float(cfg.get("MAX_PAPPAN", 0) or 0)
-    MAX_GRANNAR  = float(cfg.get("MAX_GRANNAR", 0) or 0)
-    MAX_NV       = float(cfg.get("MAX_NILS_VANNER", 0) or 0)
-    MAX_NF       = float(cfg.get("MAX_NILS_FAMILJ", 0) or 0)
-
-    # ===== Utgångskolumner =====
-    M  = _col("Män"); S = _col("Svarta")
-    BD = _col("Bonus deltagit"); PD = _col("Personal deltagit")
-    P  = _col(LBL_PAPPAN); G = _col(LBL_GRANNAR); NV = _col(LBL_NV); NF = _col(LBL_NF)
-    BE = _col(LBL_BEK); ES = _col(LBL_ESK)
-
-    ALSKAR = _col("Älskar"); SOVER = _col("Sover med")
-
-    SUMMA_TID_SEK = _col("Summa tid (sek)")
-    TID_D_SEK     = _col("Tid D")  # i appen sparas "Tid D (sek)" som "Tid D"
-    TPK_SEK       = _col("Tid per kille (sek)")
-    HAND_SEK      = _col("Händer per kille (sek)")
-    HAK_SEK       = _col("Hångel (sek/kille)")
-
-    HANDER_AKTIV  = _col("Händer aktiv")
-
-    if "Totalt Män" in (rows_df.columns if rows_df is not None else []):
-        TOT_MAN = _col("Totalt Män")
-    else:
-        TOT_MAN = (M + S + BD + ES + PD + P + G + NV + NF + BE)
+def _totals(rows_df: pd.DataFrame, cfg: dict) -> Dict[str, float]:
+    if rows_df is None or not len(rows_df):
+        return {}
+    return _totals_from(SR.coerce_columns(rows_df, term_columns(TERMS, cfg)), cfg)
 
-    # ===== GB-sektion =====
-    mask_gb         = (M > 0) | (S > 0)
-    mask_privat     = (M == 0) & ((P > 0) | (G > 0) | (NV > 0) | (NF > 0))
-    mask_gb_vita    = (M > 0) & (S == 0)
-    mask_gb_svarta  = (S > 0) & (M == 0)
-    mask_gb_blandat = (M > 0) & (S > 0)
-
-    cnt_gb         = _count_rows(mask_gb)
-    cnt_privat     = _count_rows(mask_privat)
-    cnt_gb_vita    = _count_rows(mask_gb_vita)
-    cnt_gb_svarta  = _count_rows(mask_gb_svarta)
-    cnt_gb_blandat = _count_rows(mask_gb_blandat)
 
+# ===== Sektioner (mått ur termsummor) =====
+# Varje sektion läser bara sina termer och registreras som ett eget mått i
+# statistik_register (kolumnberoenden = termernas indata).
+
+def _max_sources(cfg: dict):
+    if isinstance(cfg, Settings):
+        return cfg.source_max
+    return (float(cfg.get("MAX_PAPPAN", 0) or 0), float(cfg.get("MAX_GRANNAR", 0) or 0),
+            float(cfg.get("MAX_NILS_VANNER", 0) or 0), float(cfg.get("MAX_NILS_FAMILJ", 0) or 0))
+
+def _sec_gb(t: Dict[str, float], cfg: dict, out: dict) -> None:
+    # ===== GB-sektion =====
     out["— Översikt —"] = ""
-    out["Antal rader"] = _fmt2(len(rows_df) if rows_df is not None else 0)
-    out["Totalt antal män (alla fält)"] = _fmt2(float((M + S + BD + ES + PD + P + G + NV + NF + BE).sum()))
+    out["Antal rader"] = float(int(t.get("n", 0)))
+    out["Totalt antal män (alla fält)"] = float(t.get("man_all", 0.0))
 
     out["— GB —"] = ""
-    out["Antal GB"]         = _fmt2(cnt_gb)
-    out["Privat GB"]        = _fmt2(cnt_privat)
+    out["Antal GB"]         = float(t.get("cnt_gb", 0.0))
+    out["Privat GB"]        = float(t.get("cnt_privat", 0.0))
 
     # >>> NYTT: dagar i databasen direkt under "Privat GB"
     try:
@@ -108,154 +275,334 @@ def compute_stats(rows_df: pd.DataFrame, cfg: dict) -> dict:
         days_passed = max(0, int(days_passed))
     except Exception:
         days_passed = 0
-    out["Dagar i databasen (från startdatum)"] = f"{days_passed}"
+    out["Dagar i databasen (från startdatum)"] = days_passed
 
-    out["Antal GB vita"]    = _fmt2(cnt_gb_vita)
-    out["Antal GB svarta"]  = _fmt2(cnt_gb_svarta)
-    out["Antal GB blandat"] = _fmt2(cnt_gb_blandat)
+    out["Antal GB vita"]    = float(t.get("cnt_gb_vita", 0.0))
+    out["Antal GB svarta"]  = float(t.get("cnt_gb_svarta", 0.0))
+    out["Antal GB blandat"] = float(t.get("cnt_gb_blandat", 0.0))
 
-    # ===== Nöjdhet (efter GB) =====
-    sum_pappan  = float(P.sum()); sum_grannar = float(G.sum())
-    sum_nv      = float(NV.sum()); sum_nf      = float(NF.sum())
-    sum_sover   = float(SOVER.sum()); sum_nils = float(_col("Nils").sum())
-    sum_alskar  = float(ALSKAR.sum())
-
-    denom_kanner = MAX_PAPPAN + MAX_GRANNAR + MAX_NV + MAX_NF
-    alskar_snitt_kanner = _div(sum_alskar, denom_kanner)
-
-    def _antal_tillfallen(total, mx):
-        return _div(total, mx)
-
-    tillf_pappan  = _antal_tillfallen(sum_pappan,  MAX_PAPPAN)
-    tillf_grannar = _antal_tillfallen(sum_grannar, MAX_GRANNAR)
-    tillf_nv      = _antal_tillfallen(sum_nv,      MAX_NV)
-    tillf_nf      = _antal_tillfallen(sum_nf,      MAX_NF)
-    sover_div_max_nf = _div(sum_sover, MAX_NF)
+def _sec_nojdhet(t: Dict[str, float], cfg: dict, out: dict) -> None:
+    L = _labels(cfg)
+    MAX_PAPPAN, MAX_GRANNAR, MAX_NV, MAX_NF = _max_sources(cfg)
+    alskar_snitt_kanner = _div(t.get("alskar", 0.0), MAX_PAPPAN + MAX_GRANNAR + MAX_NV + MAX_NF)
 
     out["— Nöjdhet —"] = ""
-    out[f"Nöjdhet – {LBL_PAPPAN}"]  = _fmt2(alskar_snitt_kanner + tillf_pappan)
-    out[f"Nöjdhet – {LBL_GRANNAR}"] = _fmt2(alskar_snitt_kanner + tillf_grannar)
-    out[f"Nöjdhet – {LBL_NV}"]      = _fmt2(alskar_snitt_kanner + tillf_nv)
-    out[f"Nöjdhet – {LBL_NF}"]      = _fmt2(alskar_snitt_kanner + tillf_nf + sover_div_max_nf)
-    out["Nöjdhet – Nils (summa)"]   = _fmt2(sum_nils)
+    out[f"Nöjdhet – {L['P']}"]  = float(alskar_snitt_kanner + _div(t.get("sum_P", 0.0), MAX_PAPPAN))
+    out[f"Nöjdhet – {L['G']}"]  = float(alskar_snitt_kanner + _div(t.get("sum_G", 0.0), MAX_GRANNAR))
+    out[f"Nöjdhet – {L['NV']}"] = float(alskar_snitt_kanner + _div(t.get("sum_NV", 0.0), MAX_NV))
+    out[f"Nöjdhet – {L['NF']}"] = float(alskar_snitt_kanner + _div(t.get("sum_NF", 0.0), MAX_NF) + _div(t.get("sover", 0.0), MAX_NF))
+    out["Nöjdhet – Nils (summa)"] = float(t.get("nils", 0.0))
 
+def _sec_totalt(t: Dict[str, float], cfg: dict, out: dict) -> None:
     # ===== Totalt antal män (global totalsumma) =====
-    total_man_sum = float((M + S + BD + ES + PD + P + G + NV + NF + BE).sum())
+    total_man_sum = float(t.get("man_all", 0.0))
     out["— Totalt —"] = ""
-    out["Totalt antal män (alla fält)"] = _fmt2(total_man_sum)
+    out["Totalt antal män (alla fält)"] = float(total_man_sum)
 
     # Svarta – summa + andel
-    sum_black = float(S.sum())
-    mask_rows_black = (S > 0)
-    sum_black += float(ES[mask_rows_black].sum())
-    sum_black += float(BD[mask_rows_black].sum())
-    out["Summa Svarta (inkl. regler)"] = _fmt2(sum_black)
-    out["Andel Svarta (%)"] = _fmt2(100.0 * _div(sum_black, total_man_sum))
+    sum_black = float(t.get("sum_S", 0.0)) + float(t.get("black_extra", 0.0))
+    out["Summa Svarta (inkl. regler)"] = float(sum_black)
+    out["Andel Svarta (%)"] = float(100.0 * _div(sum_black, total_man_sum))
 
     # ===== DP / DPP / DAP / TAP =====
     for col_name in ["DP", "DPP", "DAP", "TAP"]:
-        ssum = _sum(col_name)
-        mask_scen = (TOT_MAN > 0)
-        denom = _count_rows(mask_scen)
-        avg   = _div(ssum, denom)
-        out[f"{col_name} – summa"] = _fmt2(ssum)
-        out[f"{col_name} – snitt per scen"] = _fmt2(avg)
+        ssum = t.get(f"sum_{col_name}", 0.0)
+        out[f"{col_name} – summa"] = float(ssum)
+        out[f"{col_name} – snitt per scen"] = float(_div(ssum, t.get("cnt_scen", 0.0)))
 
     # ===== Älskar / Sover med =====
-    out["Älskar – summa"]    = _fmt2(float(ALSKAR.sum()))
-    out["Sover med – summa"] = _fmt2(float(SOVER.sum()))
+    out["Älskar – summa"]    = float(t.get("alskar", 0.0))
+    out["Sover med – summa"] = float(t.get("sover", 0.0))
 
-    # ===== Källor =====
+def _sec_kallor(t: Dict[str, float], cfg: dict, out: dict) -> None:
+    L = _labels(cfg)
+    MAX_PAPPAN, MAX_GRANNAR, MAX_NV, MAX_NF = _max_sources(cfg)
     out["— Källor —"] = ""
-    def _sum_snitt_tillfallen(label: str, ser: pd.Series, maxv: float):
-        ssum = float(ser.sum())
-        cnt  = _count_rows(ser > 0)
-        avg  = _div(ssum, cnt)
-        out[f"{label} – summa"] = _fmt2(ssum)
-        out[f"{label} – snitt per scen"] = _fmt2(avg)
-        out[f"{label} – antal tillfällen (summa/max)"] = _fmt2(_div(ssum, maxv) if maxv else 0.0)
-
-    _sum_snitt_tillfallen("Bonus deltagit", BD, 1.0)
-    _sum_snitt_tillfallen("Personal deltagit", PD, float(cfg.get("MAX_BEKANTA", 1)) or 1.0)  # eller 1.0 om du vill låsa
-    _sum_snitt_tillfallen(LBL_PAPPAN,  P,  MAX_PAPPAN)
-    _sum_snitt_tillfallen(LBL_GRANNAR, G,  MAX_GRANNAR)
-    _sum_snitt_tillfallen(LBL_NV,      NV, MAX_NV)
-    _sum_snitt_tillfallen(LBL_NF,      NF, MAX_NF)
-    _sum_snitt_tillfallen(LBL_BEK,     BE, float(cfg.get("MAX_BEKANTA", 1)) or 1.0)
-    _sum_snitt_tillfallen(LBL_ESK,     ES, 1.0)
-
-    out["Summa MAX (källor, inställningar)"] = _fmt2(MAX_PAPPAN + MAX_GRANNAR + MAX_NV + MAX_NF)
-
-    # ===== Händer =====
-    total_rows = int(len(rows_df)) if rows_df is not None else 0
-    aktiva  = _count_rows(HANDER_AKTIV > 0)
-    inakt   = _count_rows(HANDER_AKTIV <= 0)
+    def _sum_snitt_tillfallen(label: str, key: str, maxv: float):
+        ssum = float(t.get(f"sum_{key}", 0.0))
+        out[f"{label} – summa"] = float(ssum)
+        out[f"{label} – snitt per scen"] = float(_div(ssum, t.get(f"cnt_{key}", 0.0)))
+        out[f"{label} – antal tillfällen (summa/max)"] = float(_div(ssum, maxv) if maxv else 0.0)
+
+    _sum_snitt_tillfallen("Bonus deltagit", "BD", 1.0)
+    _sum_snitt_tillfallen("Personal deltagit", "PD", float(cfg.get("MAX_BEKANTA", 1)) or 1.0)  # eller 1.0 om du vill låsa
+    _sum_snitt_tillfallen(L["P"],  "P",  MAX_PAPPAN)
+    _sum_snitt_tillfallen(L["G"],  "G",  MAX_GRANNAR)
+    _sum_snitt_tillfallen(L["NV"], "NV", MAX_NV)
+    _sum_snitt_tillfallen(L["NF"], "NF", MAX_NF)
+    _sum_snitt_tillfallen(L["BE"], "BE", float(cfg.get("MAX_BEKANTA", 1)) or 1.0)
+    _sum_snitt_tillfallen(L["ES"], "ES", 1.0)
+
+    out["Summa MAX (källor, inställningar)"] = float(MAX_PAPPAN + MAX_GRANNAR + MAX_NV + MAX_NF)
+
+def _sec_hander(t: Dict[str, float], cfg: dict, out: dict) -> None:
+    total_rows = int(t.get("n", 0))
+    aktiva = t.get("ha_on", 0.0)
+    inakt  = t.get("ha_off", 0.0)
     out["— Händer —"] = ""
-    out["Händer aktiva (antal)"]   = _fmt2(aktiva)
-    out["Händer aktiva (%)"]       = _fmt2(100.0 * _div(aktiva, total_rows))
-    out["Händer inaktiva (antal)"] = _fmt2(inakt)
-    out["Händer inaktiva (%)"]     = _fmt2(100.0 * _div(inakt, total_rows))
-
-    # ===== Tider =====
-    sum_tid_sec = float(SUMMA_TID_SEK.sum())
-    sum_tidD_sec = float(TID_D_SEK.sum())
-    sum_tpk_sec  = float(TPK_SEK.sum())
+    out["Händer aktiva (antal)"]   = float(aktiva)
+    out["Händer aktiva (%)"]       = float(100.0 * _div(aktiva, total_rows))
+    out["Händer inaktiva (antal)"] = float(inakt)
+    out["Händer inaktiva (%)"]     = float(100.0 * _div(inakt, total_rows))
 
+def _sec_tider(t: Dict[str, float], cfg: dict, out: dict) -> None:
     out["— Tider —"] = ""
-    h, d, w = _sec_to_hours_days_weeks(sum_tid_sec)
+    h, d, w = _sec_to_hours_days_weeks(t.get("tid", 0.0))
     out["Summa tid (sek) – timmar"] = h
     out["Summa tid (sek) – dagar"]  = d
     out["Summa tid (sek) – veckor"] = w
 
-    h, d, w = _sec_to_hours_days_weeks(sum_tidD_sec)
+    h, d, w = _sec_to_hours_days_weeks(t.get("tid_d", 0.0))
     out["Summa D (sek) – timmar"] = h
     out["Summa D (sek) – dagar"]  = d
     out["Summa D (sek) – veckor"] = w
 
-    h, d, w = _sec_to_hours_days_weeks(sum_tpk_sec)
+    h, d, w = _sec_to_hours_days_weeks(t.get("tpk", 0.0))
     out["Summa TP (sek) – timmar"] = h
     out["Summa TP (sek) – dagar"]  = d
     out["Summa TP (sek) – veckor"] = w
 
-    # ===== Snitt =====
+def _sec_snitt(t: Dict[str, float], cfg: dict, out: dict) -> None:
+    total_rows = int(t.get("n", 0))
+    cnt_privat = t.get("cnt_privat", 0.0)
+    denom_gb = t.get("cnt_m", 0.0)
     out["— Snitt —"] = ""
-    sum_tot_man_gb = float(TOT_MAN[ M > 0 ].sum())
-    denom_gb = _count_rows(M > 0)
-    out["Snitt GB (Totalt män / antal GB)"] = _fmt2(_div(sum_tot_man_gb, denom_gb))
+    out["Snitt GB (Totalt män / antal GB)"] = float(_div(t.get("tot_gb", 0.0), denom_gb))
+    out["Snitt Privat GB (Totalt män / antal Privat GB)"] = float(_div(t.get("tot_privat", 0.0), cnt_privat))
+
+    out["Snitt tid GB (h)"] = float(_div(_div(t.get("tid_gb", 0.0), denom_gb), 3600.0))
+    out["Snitt tid Privat GB (h)"] = float(_div(_div(t.get("tid_privat", 0.0), cnt_privat), 3600.0))
 
-    sum_tot_man_privat = float(TOT_MAN[mask_privat].sum())
-    out["Snitt Privat GB (Totalt män / antal Privat GB)"] = _fmt2(_div(sum_tot_man_privat, cnt_privat))
+    out["Snitt tid/kille ex händer (sek)"] = float(_div(t.get("tpk", 0.0), total_rows))
+    out["Snitt tid/kille inkl händer (sek)"] = float(_div(t.get("tpk_incl", 0.0), total_rows))
 
-    mean_tid_gb_h = _div(float(SUMMA_TID_SEK[M > 0].mean()), 3600.0) if denom_gb>0 else 0.0
-    mean_tid_priv_h = _div(float(SUMMA_TID_SEK[mask_privat].mean()), 3600.0) if cnt_privat>0 else 0.0
-    out["Snitt tid GB (h)"] = _fmt2(mean_tid_gb_h)
-    out["Snitt tid Privat GB (h)"] = _fmt2(mean_tid_priv_h)
+    out["Snitt Hångel (sek/kille)"] = float(_div(t.get("hak", 0.0), total_rows))
 
-    avg_tpk_ex = float(TPK_SEK.mean()) if total_rows>0 else 0.0
-    tpk_incl_series = TPK_SEK + (HAND_SEK.where(HANDER_AKTIV > 0, other=0))
-    avg_tpk_incl = float(tpk_incl_series.mean()) if total_rows>0 else 0.0
-    out["Snitt tid/kille ex händer (sek)"] = _fmt2(avg_tpk_ex)
-    out["Snitt tid/kille inkl händer (sek)"] = _fmt2(avg_tpk_incl)
+def _sec_ekonomi(t: Dict[str, float], cfg: dict, out: dict) -> None:
+    total_man_sum = float(t.get("man_all", 0.0))
+    LM = float(t.get("sum_Lön Malin", 0.0))
+    out["— Ekonomi —"] = ""
+    out["Prenumeranter – summa"] = float(t.get("sum_Prenumeranter", 0.0))
+    out["Intäkter – summa"]      = float(t.get("sum_Intäkter", 0.0))
+    out["Kostnad män – summa"]   = float(t.get("sum_Kostnad män", 0.0))
+    out["Intäkt Känner – summa"] = float(t.get("sum_Intäkt Känner", 0.0))
+    out["Intäkt företag – summa"]= float(t.get("sum_Intäkt företag", 0.0))
+    out["Lön Malin – summa"]     = float(LM)
+    out["Vinst – summa"]         = float(t.get("sum_Vinst", 0.0))
+
+    out["Lön Malin / Per scen"] = float(_div(LM, t.get("cnt_m", 0.0)))
+    out["Lön Malin / Totalt antal män"] = float(_div(LM, total_man_sum))
+    total_tillfallen = total_man_sum + float(t.get("alskar", 0.0)) + float(t.get("sover", 0.0))
+    out["Lön Malin / Totalt antal tillfällen"] = float(_div(LM, total_tillfallen))
+
+# namn -> (rubrik, termer, funktion, CFG-nycklar utöver etiketterna); ordningen = visningsordningen
+SECTIONS = OrderedDict([
+    ("gb",      ("GB", ("n", "man_all", "cnt_gb", "cnt_privat", "cnt_gb_vita", "cnt_gb_svarta", "cnt_gb_blandat"),
+                 _sec_gb, ("startdatum",))),
+    ("nojdhet", ("Nöjdhet", ("alskar", "sover", "nils", "sum_P", "sum_G", "sum_NV", "sum_NF"), _sec_nojdhet, MAX_KEYS)),
+    ("totalt",  ("Totalt", ("man_all", "sum_S", "black_extra", "cnt_scen", "alskar", "sover",
+                            "sum_DP", "sum_DPP", "sum_DAP", "sum_TAP"), _sec_totalt, ())),
+    ("kallor",  ("Källor", tuple(f"{p}_{k}" for k in _PER_SOURCE for p in ("sum", "cnt")), _sec_kallor, MAX_KEYS)),
+    ("hander",  ("Händer", ("n", "ha_on", "ha_off"), _sec_hander, ())),
+    ("tider",   ("Tider", ("tid", "tid_d", "tpk"), _sec_tider, ())),
+    ("snitt",   ("Snitt", ("n", "cnt_m", "cnt_privat", "tot_gb", "tot_privat", "tid_gb", "tid_privat",
+                           "tpk", "tpk_incl", "hak"), _sec_snitt, ())),
+    ("ekonomi", ("Ekonomi", ("man_all", "alskar", "sover", "cnt_m") + tuple(f"sum_{c}" for c in _SUMMED[4:]),
+                 _sec_ekonomi, ())),
+])
+
+def _stats_from_totals(t: Dict[str, float], cfg: dict) -> dict:
+    """Måttkatalogen (etikett -> rått värde) ur summerade termer."""
+    out = {}
+    for _, _, fn, _ in SECTIONS.values():
+        fn(t, cfg, out)
+    return out
 
-    out["Snitt Hångel (sek/kille)"] = _fmt2(float(HAK_SEK.mean()) if total_rows>0 else 0.0)
+def _register_sections() -> None:
+    for name, (title, terms, fn, keys) in SECTIONS.items():
+        def run(cols: SR.Columns, cfg: dict, terms=terms, fn=fn) -> dict:
+            out: dict = {}
+            fn(_totals_from(cols, cfg, terms), cfg, out)
+            return out
+        SR.register(f"statistik.{name}", lambda cfg, terms=terms: term_columns(terms, cfg), run,
+                    group="statistik", title=title, cfg_keys=LBL_KEYS + keys)
 
-    # ===== Ekonomi =====
-    PREN = _col("Prenumeranter"); INT = _col("Intäkter")
-    KM   = _col("Kostnad män");   IK  = _col("Intäkt Känner")
-    IF   = _col("Intäkt företag"); LM  = _col("Lön Malin"); V = _col("Vinst")
+_register_sections()
 
-    out["— Ekonomi —"] = ""
-    out["Prenumeranter – summa"] = _fmt2(float(PREN.sum()))
-    out["Intäkter – summa"]      = _fmt2(float(INT.sum()))
-    out["Kostnad män – summa"]   = _fmt2(float(KM.sum()))
-    out["Intäkt Känner – summa"] = _fmt2(float(IK.sum()))
-    out["Intäkt företag – summa"]= _fmt2(float(IF.sum()))
-    out["Lön Malin – summa"]     = _fmt2(float(LM.sum()))
-    out["Vinst – summa"]         = _fmt2(float(V.sum()))
-
-    out["Lön Malin / Per scen"] = _fmt2(_div(float(LM.sum()), denom_gb))
-    out["Lön Malin / Totalt antal män"] = _fmt2(_div(float(LM.sum()), float((M + S + BD + ES + PD + P + G + NV + NF + BE).sum())))
-    total_tillfallen = float((M + S + ALSKAR + SOVER + BD + PD + P + G + NV + NF + BE + ES).sum())
-    out["Lön Malin / Totalt antal tillfällen"] = _fmt2(_div(float(LM.sum()), total_tillfallen))
 
+def compute_stats(rows_df: pd.DataFrame, cfg: dict, version=None, max_workers: Optional[int] = None,
+                  processes: bool = False) -> dict:
+    """
+    Returnerar en dict {etikett: värde} med råa tal (format_stats() ger
+    visningssträngar med 2 decimaler). Tider summeras i sekunder och anges
+    som timmar/dagar/veckor (decimalt).
+    version: dataversion -> resultatet cachas (se cached()), sektionerna
+    dessutom var för sig i statistik_register.
+    max_workers/processes: sektionerna parallellt (se statistik_register.run).
+    """
+    if rows_df is None or not len(rows_df):
+        return _stats_from_totals({}, cfg)
+    return cached(("totalt",), version, cfg, lambda: SR.flat(SR.run(
+        rows_df, cfg, group="statistik", version=version, max_workers=max_workers, processes=processes)))
+
+
+# ===== Resultatcache =====
+
+def cached(kind: tuple, version, cfg: dict, fn):
+    """
+    fn() cachad per (typ, dataversion, hash av CFG_KEYS, dagens datum).
+    version=None: ingen cache. Dataversionen ska ändras vid varje ändring av
+    raderna och vara unik i hela processen – cachen delas av alla sessioner,
+    så appen använder (sessions-id, profil, versionsräknare, antal rader).
+    En omritning utan nya rader eller ändrade statistikinställningar kostar
+    då bara en uppslagning. Resultaten delas och får inte muteras.
+    """
+    if version is None:
+        return fn()
+    key = (kind, version, SR.cfg_key(cfg, CFG_KEYS), date.today())
+    with _RESULTS_LOCK:
+        hit = _RESULTS.get(key)
+        if hit is not None:
+            _RESULTS.move_to_end(key)
+            return hit
+    res = fn()
+    with _RESULTS_LOCK:
+        _RESULTS[key] = res
+        while len(_RESULTS) > _RESULTS_MAX:
+            _RESULTS.popitem(last=False)
+    return res
+
+
+# ===== Per period / rullande fönster =====
+def _bucket_prefix(rows_df: pd.DataFrame, cfg: dict, freq: str) -> tuple:
+    return (tuple(map(str, rows_df.columns)), tuple(_labels(cfg).values()), freq)
+
+def _period_fingerprints(rows_df: pd.DataFrame, cfg: dict, pos: np.ndarray, per: np.ndarray, wanted) -> Dict[int, str]:
+    """
+    Hash av varje rad i perioden (de kolumner termerna läser), per period i
+    `wanted`. En omräknad eller ändrad rad mitt i en period ger ny hash.
+    """
+    wanted = np.asarray(list(wanted), dtype=np.int64)
+    sel = np.isin(per, wanted)
+    if not sel.any():
+        return {}
+    cols = [c for c in term_columns(TERMS, cfg) if c in rows_df.columns]
+    sub = rows_df.iloc[pos[sel]][cols].astype(str)
+    h = pd.util.hash_pandas_object(sub, index=False).to_numpy()
+    p = per[sel]
+    order = np.argsort(p, kind="stable")
+    bounds = np.flatnonzero(np.diff(p[order])) + 1
+    out: Dict[int, str] = {}
+    for chunk in np.split(order, bounds):
+        out[int(p[chunk[0]])] = hashlib.sha1(h[chunk].tobytes()).hexdigest()
+    return out
+
+def _period_totals(rows_df: pd.DataFrame, cfg: dict, freq: str = "M") -> pd.DataFrame:
+    """
+    Termsummor per period (index = pandas Period, sorterat). Rader utan
+    giltigt Datum räknas inte. Avslutade perioder hämtas ur cachen om deras
+    rader är oförändrade (hash av varje rad i perioden).
+    """
+    if freq not in _FREQS:
+        raise ValueError(f"Okänd period: {freq} (välj bland {', '.join(_FREQS)})")
+    if rows_df is None or rows_df.empty or "Datum" not in rows_df.columns:
+        return pd.DataFrame()
+
+    # Perioderna som heltal (ordinaler) – snabbare att gruppera än Period-objekt
+    periods = pd.to_datetime(rows_df["Datum"], errors="coerce").dt.to_period(_FREQS[freq])
+    valid = periods.notna().to_numpy()
+    if not valid.any():
+        return pd.DataFrame()
+    pos = np.flatnonzero(valid)
+    per = periods.array.asi8[valid]
+    spans = pd.Series(pos).groupby(per).agg(["min", "max", "count"])
+    current = spans.index.max()
+
+    prefix = _bucket_prefix(rows_df, cfg, freq)
+    found: Dict[int, Dict[str, float]] = {}
+    keys: Dict[int, tuple] = {}
+    closed = spans[spans.index != current]
+    fps = _period_fingerprints(rows_df, cfg, pos, per, closed.index) if len(closed) else {}
+    for p, first, last, count in zip(closed.index, closed["min"], closed["max"], closed["count"]):
+        key = prefix + (int(p), int(count), int(first), int(last), fps[int(p)])
+        keys[p] = key
+        hit = _BUCKETS.get(key)
+        if hit is not None:
+            _BUCKETS.move_to_end(key)
+            found[p] = hit
+
+    todo = ~np.isin(per, list(found))
+    if todo.any():
+        fresh = _row_terms(rows_df.iloc[pos[todo]], cfg).groupby(per[todo]).sum()
+        for p, sums in zip(fresh.index, fresh.to_dict(orient="records")):
+            found[p] = sums
+            if p in keys:
+                _BUCKETS[keys[p]] = sums
+        while len(_BUCKETS) > _BUCKETS_MAX:
+            _BUCKETS.popitem(last=False)
+
+    out = pd.DataFrame.from_dict(found, orient="index").sort_index().fillna(0.0)
+    out.index = pd.PeriodIndex(pd.arrays.PeriodArray(out.index.to_numpy(dtype=np.int64), dtype=pd.PeriodDtype(_FREQS[freq])))
     return out
+
+def _frame_of_stats(totals: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    rows = [_stats_from_totals(r, cfg) for r in totals.to_dict(orient="records")]
+    return pd.DataFrame(rows, index=[str(p) for p in totals.index])
+
+def stats_by_period(rows_df: pd.DataFrame, cfg: dict, freq: str = "M", version=None) -> pd.DataFrame:
+    """
+    Samma mått som compute_stats, en rad per kalenderperiod (på Datum).
+    freq: "D" (dag), "W" (vecka), "M" (månad) eller "Y" (år).
+    Kolumner = etiketterna ur compute_stats, råa värden (format_frame() för visning).
+    version: dataversion -> resultatet cachas (se cached()).
+    """
+    def _run() -> pd.DataFrame:
+        totals = _period_totals(rows_df, cfg, freq)
+        return _frame_of_stats(totals, cfg) if not totals.empty else pd.DataFrame()
+    return cached(("period", freq), version, cfg, _run)
+
+def _rolling_totals(rows_df: pd.DataFrame, cfg: dict, days: int) -> pd.DataFrame:
+    daily = _period_totals(rows_df, cfg, "D")
+    if daily.empty:
+        return daily
+    full = pd.period_range(daily.index.min(), daily.index.max(), freq="D")
+    return daily.reindex(full, fill_value=0.0).rolling(int(days), min_periods=1).sum()
+
+def rolling_stats(rows_df: pd.DataFrame, cfg: dict, days: int = 30, last: Optional[int] = None,
+                  version=None) -> pd.DataFrame:
+    """
+    Rullande fönster: för varje dag måtten över de senaste `days` dagarna
+    (kalenderdagar, dagar utan rader räknas som tomma). last: bara de sista N dagarna.
+    """
+    def _run() -> pd.DataFrame:
+        totals = _rolling_totals(rows_df, cfg, days)
+        if totals.empty:
+            return pd.DataFrame()
+        return _frame_of_stats(totals.iloc[-int(last):] if last else totals, cfg)
+    return cached(("rullande", int(days), last), version, cfg, _run)
+
+def window_stats(rows_df: pd.DataFrame, cfg: dict, days: int = 30, version=None) -> dict:
+    """compute_stats för de senaste `days` dagarna (räknat från sista Datum)."""
+    def _run() -> dict:
+        totals = _rolling_totals(rows_df, cfg, days)
+        return _stats_from_totals(totals.iloc[-1].to_dict() if not totals.empty else {}, cfg)
+    return cached(("fönster", int(days)), version, cfg, _run)
+
+
+# ===== Visning =====
+
+def format_value(v) -> str:
+    """Visningssträng för ett mått: heltal som de är, tal med 2 decimaler, text orörd."""
+    if isinstance(v, str):
+        return v
+    if isinstance(v, (int, np.integer)) and not isinstance(v, bool):
+        return str(int(v))
+    return _fmt2(v)
+
+def format_stats(stats: dict) -> dict:
+    """{etikett: visningssträng} för ett resultat från compute_stats/window_stats."""
+    return {k: format_value(v) for k, v in stats.items()}
+
+def format_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """stats_by_period/rolling_stats med visningssträngar."""
+    return frame.apply(lambda col: col.map(format_value))
@@ -1,14 +1,20 @@
 # statistik_affar.py  (valfri – placeholder)
+# Måtten registreras i statistik_register och körs via dess gemensamma körning.
 import pandas as pd
 
+import statistik_register as SR
+
+
+def _affar(cols: SR.Columns, cfg: dict) -> dict:
+    return {
+        "Snitt vinst per scen (USD)": round(cols.mean("Vinst"), 2) if "Vinst" in cols.present else 0.0,
+        "Max intäkt företag (USD)": round(float(cols["Intäkt företag"].max()), 2) if "Intäkt företag" in cols.present else 0.0,
+    }
+
+SR.register("affar", ("Vinst", "Intäkt företag"), _affar, group="affar", title="Affär", cfg_keys=())
+
+
 def compute(rows: pd.DataFrame, cfg: dict) -> dict:
     if rows is None or len(rows) == 0:
         return {}
-    df = rows.copy()
-    for c in ["Intäkt företag","Vinst","Lön Malin","Intäkter","Kostnad män","Intäkt Känner"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-    return {
-        "Snitt vinst per scen (USD)": round(df.get("Vinst", 0).mean(), 2) if "Vinst" in df else 0.0,
-        "Max intäkt företag (USD)": round(df.get("Intäkt företag", 0).max(), 2) if "Intäkt företag" in df else 0.0,
-    }
+    return SR.flat(SR.run(rows, cfg, group="affar"))
@@ -0,0 +1,267 @@
+# statistik_register.py — register över statistikmått + gemensam körning
+#
+# Statistikmodulerna (statistik, statistik_affar, statistik_relation) registrerar
+# sina mått med register(): namn, kolumnberoenden och en funktion som får de
+# redan tvingade kolumnerna. run() läser och tvingar unionen av de kolumner som
+# behövs EN gång (en float64-matris), kör varje mått och cachar varje måtts
+# resultat per dataversion – så en omkörning med samma data räknar ingenting.
+# Ett mått kan ange vilka CFG-nycklar det beror på (cfg_keys); cachenyckeln
+# hashar då bara dem, så ändringar i andra inställningar inte räknar om måttet.
+#
+# Måtten är oberoende av varandra och kan köras parallellt: i en trådpool
+# (NumPy-reduktionerna släpper GIL) eller i en processpool där arbetarna läser
+# kolumnmatrisen ur delat minne (multiprocessing.shared_memory) i stället för
+# att få den picklad. Resultaten slås alltid ihop i registreringsordning, så
+# utdata är desamma oavsett körsätt.
+
+from __future__ import annotations
+import hashlib
+import importlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from settings import Settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_MODULES = ("statistik", "statistik_affar", "statistik_relation")
+
+# namn -> {"columns", "fn", "group", "title", "cfg_keys"}
+_METRICS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# (version, mått, cfg-nyckel, dag) -> resultat
+_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_CACHE_MAX = 512
+_LOCK = threading.RLock()
+
+# Automatiskt parallellt (max_workers=None) först från så här många rader
+_PARALLEL_ROWS = int(os.environ.get("MALIN_STATS_PARALLEL_ROWS", "200000"))
+
+# Per arbetsprocess: kolumnerna (vy över delat minne) + CFG via initializer
+_WORKER: Dict[str, Any] = {}
+
+
+class Columns(dict):
+    """
+    Tvingade kolumner: namn -> float64-array (rad i en gemensam matris).
+    Saknade kolumner och tomma/icke-numeriska celler är 0.
+      n        antal rader
+      present  kolumnerna som fanns i datat
+      count    antal celler med ett tal per kolumn (för medelvärden som pandas .mean())
+    """
+
+    def __init__(self, matrix: np.ndarray, names: Sequence[str], present: Iterable[str], count: Dict[str, int]):
+        super().__init__(zip(names, matrix))
+        self.matrix = matrix
+        self.n = int(matrix.shape[1])
+        self.present = frozenset(present)
+        self.count = count
+
+    def mean(self, name: str) -> float:
+        """Medel över cellerna som har ett tal (som pandas .mean()); 0 om inga."""
+        c = self.count.get(name, 0)
+        return float(self[name].sum()) / c if c else 0.0
+
+
+def coerce_columns(rows_df: "pd.DataFrame", names: Iterable[str]) -> Columns:
+    """
+    Tvinga varje kolumn till tal exakt en gång, in i en (len(names), n)
+    float64-matris i C-ordning. Samma tvång som
+    pd.to_numeric(col.fillna(0), errors="coerce").fillna(0).
+    """
+    import pandas as pd
+
+    names = list(dict.fromkeys(names))
+    n = 0 if rows_df is None else len(rows_df)
+    X = np.zeros((len(names), n), dtype=np.float64)
+    present, count = [], {}
+    for i, name in enumerate(names):
+        if not n or name not in rows_df.columns:
+            count[name] = 0
+            continue
+        present.append(name)
+        ser = rows_df[name]
+        if ser.dtype.kind not in "biuf":
+            ser = pd.to_numeric(ser, errors="coerce")
+        if isinstance(ser.dtype, np.dtype):
+            X[i] = ser.to_numpy()      # numpy-typad: kopieras/castas direkt in i raden
+        else:
+            X[i] = ser.to_numpy(dtype=np.float64, na_value=np.nan)  # nullable (Int64, Float64 …)
+        if ser.dtype.kind in "biu":
+            count[name] = n
+        else:
+            nan = np.isnan(X[i])
+            X[i, nan] = 0.0
+            count[name] = n - int(np.count_nonzero(nan))
+    return Columns(X, names, present, count)
+
+
+# =============================
+# Register
+# =============================
+
+def register(name: str, columns: Union[Sequence[str], Callable[[Dict[str, Any]], Sequence[str]]],
+             fn: Callable[[Columns, Dict[str, Any]], Dict[str, Any]], group: str = "", title: str = "",
+             cfg_keys: Optional[Sequence[str]] = None) -> None:
+    """
+    Registrera ett mått. columns: kolumnnamn, eller funktion cfg -> kolumnnamn
+    (när namnen beror på etiketter i CFG). fn(kolumner, cfg) -> {etikett: värde}.
+    cfg_keys: CFG-nycklarna måttet läser (None = hela CFG) – styr cachen.
+    Samma namn igen ersätter måttet (t.ex. vid omladdning av modulen).
+    """
+    with _LOCK:
+        _METRICS[name] = {"columns": columns, "fn": fn, "group": group or name, "title": title or name,
+                          "cfg_keys": None if cfg_keys is None else tuple(cfg_keys)}
+
+
+def _load() -> None:
+    for mod in _MODULES:
+        importlib.import_module(mod)
+
+
+def metrics(group: Optional[str] = None) -> List[str]:
+    _load()
+    return [k for k, m in _METRICS.items() if group is None or m["group"] == group]
+
+
+def title(name: str) -> str:
+    _load()
+    return _METRICS[name]["title"]
+
+
+def _columns_of(metric: Dict[str, Any], cfg: Dict[str, Any]) -> Sequence[str]:
+    cols = metric["columns"]
+    return cols(cfg) if callable(cols) else cols
+
+
+def cfg_key(cfg: Dict[str, Any], keys: Optional[Sequence[str]] = None) -> str:
+    """Hash av CFG (eller bara `keys`); saknade nycklar räknas som None."""
+    if keys is None:
+        if isinstance(cfg, Settings):
+            return cfg.content_hash
+        sub = cfg
+    else:
+        sub = {k: cfg.get(k) for k in keys}
+    return hashlib.sha1(json.dumps(sub, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# =============================
+# Körning
+# =============================
+
+def run(rows_df: "pd.DataFrame", cfg: Dict[str, Any], names: Optional[Sequence[str]] = None,
+        group: Optional[str] = None, version: Any = None, max_workers: Optional[int] = None,
+        processes: bool = False) -> "OrderedDict[str, Dict[str, Any]]":
+    """
+    Kör måtten (alla, en grupp eller en namnlista) över raderna.
+    version: dataversion (hashbar); med version cachas varje måtts resultat
+    per (version, mått, måttets CFG-nycklar, dagens datum) och bara måtten som
+    saknas räknas – och bara deras kolumner tvingas. Returnerar {mått: resultat}
+    i registreringsordning.
+    max_workers: 1 = sekventiellt; None = trådpool när raderna är fler än
+    MALIN_STATS_PARALLEL_ROWS. processes=True: processpool över delat minne.
+    """
+    todo_names = list(names) if names is not None else metrics(group)
+    _load()
+    results: Dict[str, Dict[str, Any]] = {}
+    todo: List[str] = []
+    keys: Dict[str, tuple] = {}
+    if version is not None:
+        ckeys: Dict[Optional[tuple], str] = {}
+        today = date.today()  # mått kan bero på dagens datum (t.ex. dagar sedan start)
+        for name in todo_names:
+            ck = _METRICS[name]["cfg_keys"]
+            if ck not in ckeys:
+                ckeys[ck] = cfg_key(cfg, ck)
+            keys[name] = (version, name, ckeys[ck], today)
+    with _LOCK:
+        for name in todo_names:
+            hit = _CACHE.get(keys[name]) if version is not None else None
+            if hit is not None:
+                _CACHE.move_to_end(keys[name])
+                results[name] = hit
+            else:
+                todo.append(name)
+
+    if todo:
+        union: List[str] = []
+        for name in todo:
+            union.extend(_columns_of(_METRICS[name], cfg))
+        cols = coerce_columns(rows_df, union)
+        results.update(zip(todo, _execute(todo, cols, cfg, max_workers, processes)))
+        if version is not None:
+            with _LOCK:
+                for name in todo:
+                    _CACHE[keys[name]] = results[name]
+                while len(_CACHE) > _CACHE_MAX:
+                    _CACHE.popitem(last=False)
+
+    return OrderedDict((name, results[name]) for name in todo_names)
+
+
+def _execute(todo: List[str], cols: Columns, cfg: Dict[str, Any],
+             max_workers: Optional[int], processes: bool) -> List[Dict[str, Any]]:
+    """Resultaten för todo (samma ordning), sekventiellt eller i en pool."""
+    if max_workers is None and not processes:
+        max_workers = None if cols.n >= _PARALLEL_ROWS and (os.cpu_count() or 1) > 1 else 1
+    if max_workers == 1 or len(todo) == 1:
+        return [_METRICS[name]["fn"](cols, cfg) for name in todo]
+    if processes:
+        try:
+            return _execute_processes(todo, cols, cfg, max_workers)
+        except Exception:
+            pass  # Processpool/delat minne ej tillgängligt -> trådar
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(todo), os.cpu_count() or 1)) as ex:
+        return list(ex.map(lambda name: _METRICS[name]["fn"](cols, cfg), todo))
+
+
+def _execute_processes(todo: List[str], cols: Columns, cfg: Dict[str, Any],
+                       max_workers: Optional[int]) -> List[Dict[str, Any]]:
+    from multiprocessing import shared_memory
+
+    X = cols.matrix
+    shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        meta = (shm.name, X.shape, list(cols), sorted(cols.present), cols.count)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(meta, cfg)) as ex:
+            return list(ex.map(_worker_run, todo))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _init_worker(meta: tuple, cfg: Dict[str, Any]) -> None:
+    from multiprocessing import shared_memory
+
+    name, shape, names, present, count = meta
+    shm = shared_memory.SharedMemory(name=name)
+    X = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    X.flags.writeable = False
+    _load()
+    _WORKER.update(shm=shm, cols=Columns(X, names, present, count), cfg=cfg)
+
+
+def _worker_run(name: str) -> Dict[str, Any]:
+    return _METRICS[name]["fn"](_WORKER["cols"], _WORKER["cfg"])
+
+
+def flat(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Slå ihop måttens resultat i ordning (senare etikett skriver över, första plats behålls)."""
+    out: Dict[str, Any] = {}
+    for res in results.values():
+        out.update(res)
+    return out
+
+
+def clear_cache() -> None:
+    with _LOCK:
+        _CACHE.clear()
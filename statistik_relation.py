@@ -1,16 +1,23 @@
 # statistik_relation.py  (valfri – placeholder)
+# Måtten registreras i statistik_register och körs via dess gemensamma körning.
 import pandas as pd
 
+import statistik_register as SR
+
+
+def _relation(cols: SR.Columns, cfg: dict) -> dict:
+    out = {}
+    if "Män" in cols.present and "Svarta" in cols.present:
+        svarta = float(cols["Svarta"].sum())
+        tot = float(cols["Män"].sum()) + svarta
+        out["Svarta/(Män+Svarta) (%)"] = round(100.0 * svarta / tot, 2) if tot > 0 else 0.0
+    out["Snitt prenumeranter per scen"] = round(cols.mean("Prenumeranter"), 2) if "Prenumeranter" in cols.present else 0.0
+    return out
+
+SR.register("relation", ("Män", "Svarta", "Prenumeranter"), _relation, group="relation", title="Relation", cfg_keys=())
+
+
 def compute(rows: pd.DataFrame, cfg: dict) -> dict:
     if rows is None or len(rows) == 0:
         return {}
-    df = rows.copy()
-    for c in ["Män","Svarta","Känner","Prenumeranter"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-    out = {}
-    if "Män" in df and "Svarta" in df:
-        tot = float(df["Män"].sum() + df["Svarta"].sum())
-        out["Svarta/(Män+Svarta) (%)"] = round(100.0 * float(df["Svarta"].sum())/tot, 2) if tot > 0 else 0.0
-    out["Snitt prenumeranter per scen"] = round(float(df.get("Prenumeranter", 0).mean()), 2) if "Prenumeranter" in df else 0.0
-    return out
+    return SR.flat(SR.run(rows, cfg, group="relation"))
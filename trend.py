@@ -0,0 +1,119 @@
+# trend.py — tidsserier för trenddiagram, nedsamplade till en fast punktbudget
+#
+# Serierna ritas aldrig ur råa rader. Grunden är dagssummorna av statistikens
+# termer (rollup.daily när lokala kopian är aktuell, annars
+# statistik._period_totals(..., "D")). De fylls ut till en sammanhängande
+# dagsaxel, summeras valfritt per vecka/månad, och är de fortfarande fler än
+# budgeten nedsamplas de med LTTB (Largest-Triangle-Three-Buckets), som behåller
+# toppar och dalar. Diagrammet får alltså högst `budget` punkter oavsett hur
+# lång historiken är. Dagssummor och varje (serie, fönster, upplösning, budget)
+# cachas per dataversion via statistik.cached().
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+import statistik as S
+
+# visningsnamn -> (term i dagssummorna, skalfaktor)
+SERIES: "OrderedDict[str, tuple]" = OrderedDict([
+    ("Vinst (USD)",         ("sum_Vinst", 1.0)),
+    ("Intäkter (USD)",      ("sum_Intäkter", 1.0)),
+    ("Lön Malin (USD)",     ("sum_Lön Malin", 1.0)),
+    ("Prenumeranter",       ("sum_Prenumeranter", 1.0)),
+    ("Summa tid (h)",       ("tid", 1.0 / 3600.0)),
+    ("Totalt antal män",    ("man_all", 1.0)),
+    ("Antal rader",         ("n", 1.0)),
+])
+
+_FREQS = ("D", "W", "M")
+
+DEFAULT_BUDGET = 500
+
+
+def lttb(x: np.ndarray, y: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Index för de `budget` punkter som LTTB behåller (första och sista alltid
+    med). Övriga punkter delas i budget-2 hinkar; ur varje hink väljs punkten
+    som bildar störst triangel med föregående vald punkt och nästa hinks medel.
+    """
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.append(np.linspace(1, n - 1, budget - 1).astype(np.int64), n)
+    idx = np.empty(budget, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nx = x[edges[i + 1]:edges[i + 2]].mean()
+        ny = y[edges[i + 1]:edges[i + 2]].mean()
+        area = np.abs((x[a] - nx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ny - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def daily_totals(rows_df: Callable[[], pd.DataFrame], cfg: Dict[str, Any], profile: str = "",
+                 use_rollup: bool = False, version: Any = None) -> pd.DataFrame:
+    """
+    Termsummor per kalenderdag (DatetimeIndex, dagar utan rader = 0).
+    rows_df: funktion som ger radernas DataFrame (anropas bara om dagssummorna
+    inte kan tas ur rollup eller cachen).
+    """
+    def _run() -> pd.DataFrame:
+        frame = None
+        if use_rollup:
+            import rollup
+            got = rollup.daily(profile, cfg)
+            if got is not None:
+                got = got[got.index != ""]
+                frame = got[[c for c in got.columns if not c.startswith(("min:", "max:"))]]
+                frame.index = pd.to_datetime(frame.index)
+        if frame is None:
+            frame = S._period_totals(rows_df(), cfg, "D")
+            if not frame.empty:
+                frame.index = frame.index.to_timestamp()
+        if frame.empty:
+            return pd.DataFrame(columns=list(S.TERMS), dtype=float)
+        full = pd.date_range(frame.index.min(), frame.index.max(), freq="D")
+        return frame.reindex(full, fill_value=0.0)
+    return S.cached(("trend", "dagar", profile, use_rollup), version, cfg, _run)
+
+
+def series(daily: pd.DataFrame, name: str, days: Optional[int] = None, freq: str = "D",
+           budget: int = DEFAULT_BUDGET) -> pd.Series:
+    """
+    En serie ur dagssummorna: senaste `days` dagarna (None = allt), summerad
+    per D/W/M och nedsamplad med LTTB till högst `budget` punkter.
+    """
+    if name not in SERIES:
+        raise ValueError(f"Okänd serie: {name} (välj bland {', '.join(SERIES)})")
+    if freq not in _FREQS:
+        raise ValueError(f"Okänd upplösning: {freq} (välj bland {', '.join(_FREQS)})")
+    term, scale = SERIES[name]
+    if daily.empty or term not in daily.columns:
+        return pd.Series(dtype=float, name=name)
+    s = daily[term]
+    if days:
+        s = s[s.index > s.index.max() - pd.Timedelta(days=int(days))]
+    if freq != "D":
+        s = s.groupby(s.index.to_period(freq)).sum()
+        s.index = s.index.to_timestamp()
+    s = s * scale
+    keep = lttb(s.index.asi8 / 86_400e9, s.to_numpy(dtype=np.float64), int(budget))
+    return s.iloc[keep].rename(name)
+
+
+def chart_series(rows_df: Callable[[], pd.DataFrame], cfg: Dict[str, Any], name: str,
+                 days: Optional[int] = None, freq: str = "D", budget: int = DEFAULT_BUDGET,
+                 profile: str = "", use_rollup: bool = False, version: Any = None) -> pd.Series:
+    """series() ur daily_totals(), cachad per (serie, fönster, upplösning, budget) och dataversion."""
+    return S.cached(("trend", name, days, freq, int(budget), profile, use_rollup), version, cfg,
+                    lambda: series(daily_totals(rows_df, cfg, profile, use_rollup, version),
+                                   name, days, freq, budget))
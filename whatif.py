@@ -0,0 +1,181 @@
+# whatif.py — "vad hade det blivit om …": omprissättning av historiken för ett rutnät av CFG-värden
+#
+# Varje scenario = nuvarande CFG + överstyrningar (ekonomi-/bonusnycklar).
+# Historiken räknas om med ekonomi.reprice_history och Ekonomi-sektionen ur
+# statistik.compute_stats jämförs i en tabell. Scenarierna körs parallellt i en
+# processpool och resultaten memoiseras per (data, seed, scenario).
+
+from __future__ import annotations
+import hashlib
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ekonomi import reprice_history
+from settings import Settings, snapshot
+from statistik import compute_stats
+
+# Nycklar som får överstyras i ett svep
+SWEEP_KEYS = (
+    "avgift_usd", "ECON_COST_PER_HOUR", "ECON_REVENUE_PER_KANNER",
+    "ECON_WAGE_SHARE_PCT", "ECON_WAGE_MIN", "ECON_WAGE_MAX",
+    "PROD_STAFF", "HET_BETYG", "BONUS_PCT", "SUPER_BONUS_PCT",
+)
+
+_CACHE: "OrderedDict[tuple, Dict[str, float]]" = OrderedDict()
+_CACHE_MAX = 256
+_CACHE_LOCK = threading.Lock()
+
+# Per arbetsprocess: historik + bas-CFG skickas en gång via initializer
+_WORKER: Dict[str, Any] = {}
+
+
+def expand_grid(grid: Dict[str, Iterable[Any]]) -> List[Dict[str, Any]]:
+    """{'ECON_WAGE_SHARE_PCT': [8, 10], 'avgift_usd': [30, 35]} -> 4 överstyrningar."""
+    bad = [k for k in grid if k not in SWEEP_KEYS]
+    if bad:
+        raise ValueError(f"Okända svep-nycklar: {', '.join(bad)}")
+    keys = list(grid)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(list(grid[k]) for k in keys))]
+
+
+def parse_grid(text: str) -> Dict[str, List[float]]:
+    """'ECON_WAGE_SHARE_PCT=8, 10; avgift_usd=30 35' -> grid-dict (för UI). Decimalpunkt."""
+    grid: Dict[str, List[float]] = {}
+    for line in text.replace(";", "\n").splitlines():
+        if "=" not in line:
+            continue
+        k, vals = line.split("=", 1)
+        grid[k.strip()] = [float(v) for v in vals.replace(",", " ").split()]
+    return grid
+
+
+def _ekonomi_section(stats: Dict[str, Any]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    inside = False
+    for k, v in stats.items():
+        if k.startswith("— "):
+            inside = (k == "— Ekonomi —")
+            continue
+        if inside:
+            out[k] = float(v)
+    return out
+
+
+def _bonus_totals(df: pd.DataFrame, cfg: Dict[str, Any]) -> Dict[str, float]:
+    """Bonus-/superbonustillskott enligt _after_save_housekeeping (int per rad, ej Vila/Super bonus)."""
+    pren = pd.to_numeric(df.get("Prenumeranter", 0), errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    typ = df["Typ"].astype(str) if "Typ" in df.columns else pd.Series([""] * len(df))
+    skip = (typ.str.contains("Vila", regex=False) | typ.str.contains("Super bonus", regex=False)).to_numpy()
+    bonus_pct = float(cfg.get("BONUS_PCT", 1.0)) / 100.0
+    sb_pct = float(cfg.get("SUPER_BONUS_PCT", 0.1)) / 100.0
+    return {
+        "Bonus tillskott – summa": float(np.where(skip, 0, np.floor(pren * bonus_pct)).sum()),
+        "Super bonus tillskott – summa": float(np.where(skip, 0, np.floor(pren * sb_pct)).sum()),
+    }
+
+
+def _evaluate(rows_df: pd.DataFrame, base_cfg: Dict[str, Any], overrides: Dict[str, Any], seed: int) -> Dict[str, float]:
+    cfg = snapshot(dict(base_cfg, **overrides))  # typad + validerad en gång per scenario
+    repriced = reprice_history(rows_df, cfg, seed=seed)
+    res = _ekonomi_section(compute_stats(repriced, cfg))
+    res.update(_bonus_totals(repriced, cfg))
+    return res
+
+
+def _init_worker(rows_df: pd.DataFrame, base_cfg: Dict[str, Any], seed: int) -> None:
+    _WORKER["rows"] = rows_df
+    _WORKER["cfg"] = base_cfg
+    _WORKER["seed"] = seed
+
+
+def _worker_eval(overrides: Dict[str, Any]) -> Dict[str, float]:
+    return _evaluate(_WORKER["rows"], _WORKER["cfg"], overrides, _WORKER["seed"])
+
+
+def _frame_key(df: pd.DataFrame) -> str:
+    if df is None or df.empty:
+        return "empty"
+    h = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    return hashlib.sha1(h.tobytes()).hexdigest()
+
+
+def _cfg_key(cfg: Dict[str, Any]) -> str:
+    if isinstance(cfg, Settings):
+        return cfg.content_hash
+    return hashlib.sha1(json.dumps(cfg, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _label(overrides: Dict[str, Any]) -> str:
+    return ", ".join(f"{k}={v:g}" if isinstance(v, (int, float)) else f"{k}={v}" for k, v in overrides.items()) or "(nuvarande)"
+
+
+def _window(rows_df: pd.DataFrame, last_days: Optional[int]) -> pd.DataFrame:
+    if not last_days or rows_df is None or rows_df.empty or "Datum" not in rows_df.columns:
+        return rows_df
+    d = pd.to_datetime(rows_df["Datum"], errors="coerce")
+    if d.notna().sum() == 0:
+        return rows_df
+    return rows_df[d >= d.max() - timedelta(days=int(last_days) - 1)]
+
+
+def sweep(
+    rows_df: pd.DataFrame,
+    cfg: Dict[str, Any],
+    scenarios: List[Dict[str, Any]],
+    seed: int = 0,
+    last_days: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Utvärdera varje överstyrning (lista från expand_grid) över historiken.
+    Returnerar en tabell: en rad per scenario, kolumner = Ekonomi-sektionens
+    värden + bonustillskott. Samma seed ger samma hårdhetsslump i alla scenarier,
+    så skillnaderna beror enbart på parametrarna.
+    last_days: begränsa till de sista N dagarna (på Datum).
+    """
+    df = _window(rows_df, last_days)
+    data_key = (_frame_key(df), _cfg_key(cfg), int(seed))
+
+    keys: List[tuple] = []
+    todo: List[Tuple[int, Dict[str, Any]]] = []
+    found: Dict[tuple, Dict[str, float]] = {}
+    # Träffar kopieras under låset – en annan session kan trimma cachen innan vi läser dem
+    with _CACHE_LOCK:
+        for i, ov in enumerate(scenarios):
+            key = data_key + (_cfg_key(ov),)
+            keys.append(key)
+            hit = _CACHE.get(key)
+            if hit is None:
+                todo.append((i, ov))
+            else:
+                found[key] = hit
+
+    if todo:
+        results: List[Dict[str, float]]
+        if (max_workers or 0) == 1 or len(todo) == 1:
+            results = [_evaluate(df, cfg, ov, seed) for _, ov in todo]
+        else:
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(df, cfg, seed)) as ex:
+                    results = list(ex.map(_worker_eval, [ov for _, ov in todo]))
+            except Exception:
+                # Processpool ej tillgänglig (t.ex. begränsad miljö) -> sekventiellt
+                results = [_evaluate(df, cfg, ov, seed) for _, ov in todo]
+        found.update({keys[i]: res for (i, _), res in zip(todo, results)})
+
+    rows = [dict(found[key]) for key in keys]
+    with _CACHE_LOCK:
+        for key in keys:
+            _CACHE[key] = found[key]
+            _CACHE.move_to_end(key)
+        while len(_CACHE) > _CACHE_MAX:
+            _CACHE.popitem(last=False)
+    return pd.DataFrame(rows, index=[_label(ov) for ov in scenarios])